@@ -1,9 +1,42 @@
+import io
+import os
 import re
+import mmap
+import sys
+import csv
+import copy
 import json
-from typing import List, Dict, Set, Tuple
-from dataclasses import dataclass
+import math
+import random
+import heapq
+import time
+import pickle
+import hashlib
+import platform
+import operator
+import sqlite3
+import tempfile
+import asyncio
+import argparse
+import threading
+import multiprocessing
+import multiprocessing.pool
+from concurrent.futures import ThreadPoolExecutor
+from bisect import bisect_left, bisect_right
+from collections import deque, OrderedDict
+from functools import lru_cache
+from itertools import chain, islice
+from types import MappingProxyType
+from typing import List, Dict, Set, Tuple, Iterable, Iterator, Mapping, Union, TextIO, Callable
+from dataclasses import dataclass, astuple, asdict, replace
 from enum import Enum
 
+try:
+    from re import _parser as sre_parse, _compiler as sre_compile
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_compile
+
 @dataclass
 class CPTCode:
     code: str
@@ -11,6 +44,61 @@ class CPTCode:
     category: str
     confidence: float
 
+# Characters the cleaned text keeps besides word characters and whitespace;
+# the others become spaces (through a translate table for ASCII text)
+_DROPPED_CHARACTERS = re.compile(r'[^\w\s\-\.\,\:\;\(\)\/]')
+_DROPPED_ASCII = str.maketrans({chr(code): ' ' for code in range(128) if _DROPPED_CHARACTERS.match(chr(code))})
+
+def _spaced(collapsed: str) -> str:
+    """Replace the characters dropped from cleaned text by spaces"""
+    return collapsed.translate(_DROPPED_ASCII) if collapsed.isascii() else _DROPPED_CHARACTERS.sub(' ', collapsed)
+
+@dataclass(frozen=True)
+class NormalizedNote:
+    """
+    A raw note normalized once and shared by extraction and note analysis.
+
+    text is the cleaned note every matcher runs on: lowercase, whitespace
+    runs collapsed to one space, characters other than word characters and
+    -.,:;()/ replaced by spaces, and stripped. word_count is the number of
+    whitespace-separated words of the raw note.
+    """
+    raw: str
+    text: str
+    word_count: int
+
+    @classmethod
+    def of(cls, raw: str) -> 'NormalizedNote':
+        """Normalize a raw note: one lowercase copy, split once for both the word count and the collapse"""
+        words = raw.lower().split()
+        return cls(raw=raw, text=_spaced(' '.join(words)).strip(), word_count=len(words))
+
+    def offsets(self) -> List[int]:
+        """Offset in raw of each character of text, computed on demand"""
+        lowered = self.raw.lower()
+        if len(lowered) == len(self.raw):
+            origin = range(len(lowered))
+        else:
+            # Some characters lowercase to several (e.g. 'İ')
+            origin = [offset for offset, char in enumerate(self.raw) for _ in char.lower()]
+        
+        # Offsets of ' '.join(lowered.split()), whose spaces map to the start of their whitespace run
+        offsets = []
+        in_space = True
+        for position, char in enumerate(lowered):
+            if not char.isspace():
+                offsets.append(origin[position])
+                in_space = False
+            elif not in_space:
+                offsets.append(origin[position])
+                in_space = True
+        if in_space and offsets:
+            offsets.pop()
+        
+        spaced = _spaced(' '.join(lowered.split()))
+        start = len(spaced) - len(spaced.lstrip())
+        return offsets[start:start + len(self.text)]
+
 class ProcedureCategory(Enum):
     EVALUATION = "Evaluation and Management"
     PROCEDURES = "Procedures"
@@ -19,515 +107,2773 @@ class ProcedureCategory(Enum):
     INJECTIONS = "Injections"
     WOUND_CARE = "Wound Care"
 
-class EDCPTExtractor:
-    def __init__(self):
-        # CPT codes in ranges [10000-69999] and [99100-99199]
-        self.cpt_mapping = {
-            
-            # Wound Repair (12000-12057)
-            "12001": {
-                "description": "Simple repair of superficial wounds of scalp, neck, axillae, external genitalia, trunk and/or extremities (including hands and feet); 2.5 cm or less",
-                "category": ProcedureCategory.WOUND_CARE,
-                "keywords": ["simple repair", "superficial wound", "suture", "laceration repair"],
-                "patterns": [r"(?i)simple\s+(?:repair|suture)", r"(?i)superficial\s+(?:wound|laceration)", r"(?i)sutur(?:e|ed|ing)"]
-            },
-            "12002": {
-                "description": "Simple repair of superficial wounds; 2.6 cm to 7.5 cm",
-                "category": ProcedureCategory.WOUND_CARE,
-                "keywords": ["simple repair", "2.6", "7.5", "cm", "suture"],
-                "patterns": [r"(?i)simple\s+repair.*(?:[2-7]\.\d+|[3-7])\s*cm", r"(?i)sutur(?:e|ed|ing).*(?:[2-7]\.\d+|[3-7])\s*cm"]
-            },
-            "12004": {
-                "description": "Simple repair of superficial wounds; 7.6 cm to 12.5 cm",
-                "category": ProcedureCategory.WOUND_CARE,
-                "keywords": ["simple repair", "7.6", "12.5", "cm", "large laceration"],
-                "patterns": [r"(?i)simple\s+repair.*(?:[7-9]\.\d+|1[0-2]\.\d+)\s*cm", r"(?i)large.*(?:laceration|wound).*repair"]
-            },
-            "12011": {
-                "description": "Simple repair of superficial wounds of face, ears, eyelids, nose, lips and/or mucous membranes; 2.5 cm or less",
-                "category": ProcedureCategory.WOUND_CARE,
-                "keywords": ["face", "facial", "lip", "nose", "ear", "simple repair"],
-                "patterns": [r"(?i)(?:face|facial|lip|nose|ear).*(?:repair|suture)", r"(?i)simple\s+repair.*(?:face|facial)"]
-            },
-            "12013": {
-                "description": "Simple repair of superficial wounds of face; 2.6 cm to 5.0 cm",
-                "category": ProcedureCategory.WOUND_CARE,
-                "keywords": ["face", "facial", "2.6", "5.0", "cm", "repair"],
-                "patterns": [r"(?i)(?:face|facial).*repair.*(?:[2-5]\.\d+)\s*cm", r"(?i)simple\s+repair.*face.*(?:[2-5])\s*cm"]
-            },
-            "12031": {
-                "description": "Intermediate repair of wounds of scalp, axillae, trunk and/or extremities; 2.5 cm or less",
-                "category": ProcedureCategory.WOUND_CARE,
-                "keywords": ["intermediate repair", "layered closure", "subcutaneous suture"],
-                "patterns": [r"(?i)intermediate\s+repair", r"(?i)layered\s+(?:closure|repair)", r"(?i)subcutaneous.*sutur"]
-            },
-            "12032": {
-                "description": "Intermediate repair of wounds; 2.6 cm to 7.5 cm",
-                "category": ProcedureCategory.WOUND_CARE,
-                "keywords": ["intermediate repair", "layered", "2.6", "7.5", "cm"],
-                "patterns": [r"(?i)intermediate\s+repair.*(?:[2-7]\.\d+)\s*cm", r"(?i)layered.*repair.*(?:[2-7])\s*cm"]
-            },
-            
-            # Excision/Debridement (11000-11047)
-            "11000": {
-                "description": "Debridement of extensive eczematous or infected skin; up to 10% of body surface",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["debridement", "infected skin", "eczematous", "wound cleaning"],
-                "patterns": [r"(?i)debridement", r"(?i)wound\s+(?:cleaning|debridement)", r"(?i)infected\s+skin.*(?:clean|debride)"]
-            },
-            "11042": {
-                "description": "Debridement, subcutaneous tissue; first 20 sq cm or less",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["debridement", "subcutaneous", "tissue", "20 sq cm"],
-                "patterns": [r"(?i)debridement.*subcutaneous", r"(?i)subcutaneous.*debridement", r"(?i)tissue\s+debridement"]
-            },
-            "11043": {
-                "description": "Debridement, muscle and/or fascia; first 20 sq cm or less",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["debridement", "muscle", "fascia", "deep debridement"],
-                "patterns": [r"(?i)debridement.*(?:muscle|fascia)", r"(?i)(?:muscle|fascia).*debridement", r"(?i)deep\s+debridement"]
-            },
-            
-            # Incision and Drainage (10060-10180)
-            "10060": {
-                "description": "Incision and drainage of abscess; simple or single",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["incision and drainage", "i&d", "abscess", "drainage"],
-                "patterns": [r"(?i)incision\s+and\s+drainage", r"(?i)i\s*&\s*d", r"(?i)abscess.*drain", r"(?i)drain.*abscess"]
-            },
-            "10061": {
-                "description": "Incision and drainage of abscess; complicated or multiple",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["incision and drainage", "complicated", "multiple abscess", "complex i&d"],
-                "patterns": [r"(?i)(?:complicated|complex).*(?:i\s*&\s*d|incision.*drainage)", r"(?i)multiple.*abscess.*drain"]
-            },
-            "10120": {
-                "description": "Incision and removal of foreign body, subcutaneous tissues; simple",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["foreign body removal", "subcutaneous", "incision", "removal"],
-                "patterns": [r"(?i)foreign\s+body.*remov", r"(?i)subcutaneous.*foreign", r"(?i)incision.*foreign\s+body"]
-            },
-            "10140": {
-                "description": "Incision and drainage of hematoma, seroma or fluid collection",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["hematoma", "seroma", "fluid collection", "drainage"],
-                "patterns": [r"(?i)(?:hematoma|seroma).*drain", r"(?i)fluid\s+collection.*drain", r"(?i)drain.*(?:hematoma|seroma)"]
-            },
-            
-            # Fracture Care (25500-25695)
-            "25500": {
-                "description": "Closed treatment of radial shaft fracture; without manipulation",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["radial shaft fracture", "closed treatment", "without manipulation"],
-                "patterns": [r"(?i)radial\s+shaft.*fracture.*closed", r"(?i)closed.*radial\s+shaft", r"(?i)radius.*shaft.*fracture"]
-            },
-            "25505": {
-                "description": "Closed treatment of radial shaft fracture; with manipulation",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["radial shaft", "manipulation", "closed reduction"],
-                "patterns": [r"(?i)radial\s+shaft.*manipulation", r"(?i)closed\s+reduction.*radial\s+shaft"]
-            },
-            "25600": {
-                "description": "Closed treatment of distal radial fracture; without manipulation",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["distal radial fracture", "colles fracture", "closed treatment"],
-                "patterns": [r"(?i)distal\s+(?:radial|radius).*fracture", r"(?i)colles.*fracture", r"(?i)wrist.*fracture.*closed"]
-            },
-            "25605": {
-                "description": "Closed treatment of distal radial fracture; with manipulation",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["distal radial", "manipulation", "reduction", "closed reduction"],
-                "patterns": [r"(?i)distal\s+(?:radial|radius).*manipulation", r"(?i)closed\s+reduction.*(?:radial|radius)", r"(?i)wrist.*reduction"]
-            },
-            "27750": {
-                "description": "Closed treatment of tibial shaft fracture; without manipulation",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["tibial shaft fracture", "tibia fracture", "leg fracture"],
-                "patterns": [r"(?i)tibial?\s+(?:shaft\s+)?fracture", r"(?i)tibia.*fracture.*closed", r"(?i)leg.*fracture.*closed"]
-            },
-            "27752": {
-                "description": "Closed treatment of tibial shaft fracture; with manipulation",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["tibial fracture", "manipulation", "reduction"],
-                "patterns": [r"(?i)tibial?.*fracture.*manipulation", r"(?i)tibia.*reduction", r"(?i)leg.*fracture.*reduction"]
-            },
-            
-            # Joint Injections/Aspirations (20600-20615)
-            "20600": {
-                "description": "Arthrocentesis, aspiration and/or injection; small joint or bursa",
-                "category": ProcedureCategory.INJECTIONS,
-                "keywords": ["arthrocentesis", "small joint", "injection", "aspiration"],
-                "patterns": [r"(?i)arthrocentesis.*small", r"(?i)small\s+joint.*(?:injection|aspiration)", r"(?i)finger.*joint.*inject"]
-            },
-            "20605": {
-                "description": "Arthrocentesis, aspiration and/or injection; intermediate joint or bursa",
-                "category": ProcedureCategory.INJECTIONS,
-                "keywords": ["arthrocentesis", "intermediate joint", "wrist", "ankle", "elbow"],
-                "patterns": [r"(?i)arthrocentesis.*(?:intermediate|wrist|ankle|elbow)", r"(?i)(?:wrist|ankle|elbow).*(?:injection|aspiration)"]
-            },
-            "20610": {
-                "description": "Arthrocentesis, aspiration and/or injection; major joint or bursa",
-                "category": ProcedureCategory.INJECTIONS,
-                "keywords": ["arthrocentesis", "major joint", "knee", "shoulder", "hip"],
-                "patterns": [r"(?i)arthrocentesis.*(?:major|knee|shoulder|hip)", r"(?i)(?:knee|shoulder|hip).*(?:injection|aspiration)"]
-            },
-            
-            # Casting/Splinting (29000-29590)
-            "29105": {
-                "description": "Application of long arm splint",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["long arm splint", "splint", "arm splint"],
-                "patterns": [r"(?i)long\s+arm\s+splint", r"(?i)arm.*splint.*applied", r"(?i)splint.*long\s+arm"]
-            },
-            "29125": {
-                "description": "Application of short arm splint; static",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["short arm splint", "wrist splint", "forearm splint"],
-                "patterns": [r"(?i)short\s+arm\s+splint", r"(?i)wrist.*splint", r"(?i)forearm.*splint"]
-            },
-            "29130": {
-                "description": "Application of finger splint; static",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["finger splint", "digit splint", "finger immobilization"],
-                "patterns": [r"(?i)finger.*splint", r"(?i)digit.*splint", r"(?i)splint.*finger"]
-            },
-            "29505": {
-                "description": "Application of long leg splint",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["long leg splint", "leg splint", "lower extremity splint"],
-                "patterns": [r"(?i)long\s+leg\s+splint", r"(?i)leg.*splint.*applied", r"(?i)lower.*extremity.*splint"]
-            },
-            "29515": {
-                "description": "Application of short leg splint",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["short leg splint", "ankle splint", "foot splint"],
-                "patterns": [r"(?i)short\s+leg\s+splint", r"(?i)ankle.*splint", r"(?i)foot.*splint"]
-            },
-            
-            # Cardiovascular Procedures (36000-36598)
-            "36000": {
-                "description": "Introduction of needle or intracatheter, vein",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["venipuncture", "needle", "vein", "blood draw", "iv access"],
-                "patterns": [r"(?i)venipuncture", r"(?i)needle.*vein", r"(?i)blood\s+draw", r"(?i)iv.*access"]
-            },
-            "36400": {
-                "description": "Venipuncture, younger than age 3 years, necessitating physician's skill",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["venipuncture", "pediatric", "infant", "child", "younger than 3"],
-                "patterns": [r"(?i)venipuncture.*(?:pediatric|infant|child)", r"(?i)(?:infant|child).*venipuncture", r"(?i)younger.*3.*venipuncture"]
-            },
-            "36415": {
-                "description": "Collection of venous blood by venipuncture",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["venous blood", "collection", "venipuncture", "blood collection"],
-                "patterns": [r"(?i)venous\s+blood.*collection", r"(?i)blood.*collection.*venipuncture", r"(?i)venipuncture.*blood"]
-            },
-            "36556": {
-                "description": "Insertion of non-tunneled centrally inserted central venous catheter; age 5 years or older",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["central line", "central venous catheter", "cvc", "central access"],
-                "patterns": [r"(?i)central\s+(?:line|venous\s+catheter|access)", r"(?i)cvc.*insert", r"(?i)central.*catheter.*insert"]
-            },
-            "36558": {
-                "description": "Insertion of non-tunneled centrally inserted central venous catheter; younger than 5 years",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["central line", "pediatric", "younger than 5", "central venous catheter"],
-                "patterns": [r"(?i)central.*catheter.*(?:pediatric|child)", r"(?i)(?:pediatric|child).*central.*line", r"(?i)younger.*5.*central"]
-            },
-            
-            # Respiratory Procedures (31500-31899)
-            "31500": {
-                "description": "Intubation, endotracheal, emergency procedure",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["intubation", "endotracheal", "emergency intubation", "ett"],
-                "patterns": [r"(?i)intubat", r"(?i)endotracheal", r"(?i)ett.*placed", r"(?i)emergency.*intubation"]
-            },
-            "31505": {
-                "description": "Laryngoscopy, indirect; diagnostic",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["laryngoscopy", "indirect laryngoscopy", "larynx examination"],
-                "patterns": [r"(?i)laryngoscopy", r"(?i)larynx.*exam", r"(?i)indirect.*laryngoscopy"]
-            },
-            "31515": {
-                "description": "Laryngoscopy direct, with or without tracheoscopy; for aspiration",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["direct laryngoscopy", "aspiration", "foreign body removal"],
-                "patterns": [r"(?i)direct\s+laryngoscopy", r"(?i)laryngoscopy.*aspiration", r"(?i)foreign\s+body.*larynx"]
-            },
-            
-            # Gastrointestinal Procedures (43235-43259)
-            "43235": {
-                "description": "Esophagogastroduodenoscopy, flexible, transoral; diagnostic",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["egd", "endoscopy", "esophagogastroduodenoscopy", "upper endoscopy"],
-                "patterns": [r"(?i)egd", r"(?i)esophagogastroduodenoscopy", r"(?i)upper\s+endoscopy", r"(?i)flexible.*endoscopy"]
-            },
-            "43239": {
-                "description": "Esophagogastroduodenoscopy, flexible, transoral; with biopsy",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["egd", "biopsy", "endoscopy with biopsy"],
-                "patterns": [r"(?i)egd.*biopsy", r"(?i)endoscopy.*biopsy", r"(?i)biopsy.*(?:egd|endoscopy)"]
-            },
-            
-            # Genitourinary Procedures (51701-51798)
-            "51701": {
-                "description": "Insertion of non-indwelling bladder catheter",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["straight catheter", "bladder catheter", "urinary catheter", "straight cath"],
-                "patterns": [r"(?i)straight\s+(?:catheter|cath)", r"(?i)bladder.*catheter.*(?:insert|plac)", r"(?i)urinary.*catheter.*straight"]
-            },
-            "51702": {
-                "description": "Insertion of temporary indwelling bladder catheter; simple",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["foley catheter", "indwelling catheter", "bladder catheter", "foley"],
-                "patterns": [r"(?i)foley.*(?:catheter|insert|plac)", r"(?i)indwelling.*catheter", r"(?i)bladder.*catheter.*indwelling"]
-            },
-            "51705": {
-                "description": "Change of cystostomy tube; simple",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["cystostomy", "suprapubic catheter", "tube change"],
-                "patterns": [r"(?i)cystostomy", r"(?i)suprapubic.*(?:catheter|tube)", r"(?i)tube.*change.*cystostomy"]
-            },
-            
-            # Nervous System Procedures (61000-64999)
-            "61050": {
-                "description": "Cisternal or lateral cervical (C1-C2) puncture; without injection",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["cisternal puncture", "cervical puncture", "spinal tap"],
-                "patterns": [r"(?i)cisternal\s+puncture", r"(?i)cervical.*puncture", r"(?i)c1.*c2.*puncture"]
-            },
-            "62270": {
-                "description": "Spinal puncture, lumbar, diagnostic",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["lumbar puncture", "spinal tap", "lp", "csf"],
-                "patterns": [r"(?i)lumbar\s+puncture", r"(?i)spinal\s+tap", r"(?i)\blp\b", r"(?i)csf.*obtain"]
-            },
-            "64400": {
-                "description": "Injection, anesthetic agent; trigeminal nerve",
-                "category": ProcedureCategory.INJECTIONS,
-                "keywords": ["trigeminal nerve", "nerve block", "facial nerve", "anesthetic injection"],
-                "patterns": [r"(?i)trigeminal.*(?:nerve|block|injection)", r"(?i)facial.*nerve.*block", r"(?i)nerve\s+block.*trigeminal"]
-            },
-            "64450": {
-                "description": "Injection, anesthetic agent; other peripheral nerve or branch",
-                "category": ProcedureCategory.INJECTIONS,
-                "keywords": ["peripheral nerve", "nerve block", "anesthetic injection"],
-                "patterns": [r"(?i)peripheral\s+nerve.*(?:block|injection)", r"(?i)nerve\s+block.*peripheral", r"(?i)anesthetic.*nerve"]
-            },
-            
-            # Musculoskeletal Procedures (20000-29999)
-            "20550": {
-                "description": "Injection; single tendon sheath, or ligament, aponeurosis",
-                "category": ProcedureCategory.INJECTIONS,
-                "keywords": ["tendon injection", "sheath injection", "ligament injection"],
-                "patterns": [r"(?i)tendon.*injection", r"(?i)sheath.*injection", r"(?i)ligament.*injection"]
-            },
-            "20551": {
-                "description": "Injection; single tendon origin/insertion",
-                "category": ProcedureCategory.INJECTIONS,
-                "keywords": ["tendon origin", "tendon insertion", "trigger point"],
-                "patterns": [r"(?i)tendon.*(?:origin|insertion).*injection", r"(?i)trigger\s+point.*injection"]
-            },
-            "20553": {
-                "description": "Injection; single or multiple trigger points, 1 or 2 muscle(s)",
-                "category": ProcedureCategory.INJECTIONS,
-                "keywords": ["trigger point", "muscle injection", "trigger point injection"],
-                "patterns": [r"(?i)trigger\s+point.*injection", r"(?i)muscle.*trigger.*point", r"(?i)injection.*trigger\s+point"]
-            },
-            
-            # Anesthesia Modifiers (99100-99199)
-            "99100": {
-                "description": "Anesthesia for patient of extreme age, younger than 1 year and older than 70",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["extreme age", "anesthesia", "younger than 1", "older than 70"],
-                "patterns": [r"(?i)anesthesia.*extreme\s+age", r"(?i)(?:younger.*1|older.*70).*anesthesia"]
-            },
-            "99116": {
-                "description": "Anesthesia complicated by utilization of total body hypothermia",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["hypothermia", "total body hypothermia", "anesthesia"],
-                "patterns": [r"(?i)anesthesia.*hypothermia", r"(?i)total\s+body\s+hypothermia", r"(?i)hypothermia.*anesthesia"]
-            },
-            "99135": {
-                "description": "Anesthesia complicated by utilization of controlled hypotension",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["controlled hypotension", "hypotensive anesthesia", "anesthesia"],
-                "patterns": [r"(?i)controlled\s+hypotension", r"(?i)hypotensive.*anesthesia", r"(?i)anesthesia.*hypotension"]
-            },
-            "99140": {
-                "description": "Anesthesia complicated by emergency conditions",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["emergency anesthesia", "emergency conditions", "emergent"],
-                "patterns": [r"(?i)emergency.*anesthesia", r"(?i)anesthesia.*emergency", r"(?i)emergent.*anesthesia"]
-            },         
-            # Eye/Ear Procedures (65000-69999)
-            "65205": {
-                "description": "Removal of foreign body, external eye; conjunctival superficial",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["foreign body", "eye", "conjunctival", "removal"],
-                "patterns": [r"(?i)foreign\s+body.*eye", r"(?i)eye.*foreign\s+body", r"(?i)conjunctival.*foreign"]
-            },
-            "65210": {
-                "description": "Removal of foreign body, external eye; conjunctival embedded",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["foreign body", "embedded", "conjunctival", "eye"],
-                "patterns": [r"(?i)embedded.*foreign.*eye", r"(?i)conjunctival.*embedded", r"(?i)foreign.*embedded.*eye"]
-            },
-            "65220": {
-                "description": "Removal of foreign body, external eye; corneal, without slit lamp",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["corneal foreign body", "cornea", "foreign body removal"],
-                "patterns": [r"(?i)corneal.*foreign", r"(?i)foreign.*cornea", r"(?i)cornea.*foreign\s+body"]
-            },
-            "65222": {
-                "description": "Removal of foreign body, external eye; corneal, with slit lamp",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["corneal foreign body", "slit lamp", "cornea"],
-                "patterns": [r"(?i)slit\s+lamp.*foreign", r"(?i)corneal.*slit\s+lamp", r"(?i)foreign.*slit\s+lamp"]
-            },
-            "69200": {
-                "description": "Removal of foreign body from external auditory canal; without general anesthesia",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["ear foreign body", "auditory canal", "ear canal"],
-                "patterns": [r"(?i)ear.*foreign\s+body", r"(?i)auditory\s+canal.*foreign", r"(?i)foreign.*ear\s+canal"]
-            },
-            "69210": {
-                "description": "Removal of impacted cerumen, external auditory canal, 1 or both ears",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["cerumen", "ear wax", "impacted", "ear cleaning"],
-                "patterns": [r"(?i)cerumen.*remov", r"(?i)ear\s+wax.*remov", r"(?i)impacted.*(?:cerumen|wax)", r"(?i)ear.*clean.*wax"]
-            },
+def _trie_regex(words: List[str]) -> str:
+    """Emit a regex equivalent to the trie of words, preferring longer words"""
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def emit(node: Dict) -> str:
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return '(?:' + body + ')?' if '' in node else body
+
+    return emit(trie)
+
+class KeywordAutomaton:
+    """
+    Multi-keyword scanner built once from every code's keyword list.
+
+    The keyword trie is emitted as a single regex, so the goto transitions run
+    inside the C regex engine and always take the longest keyword at a position.
+    After each hit the scan resumes at the keyword's failure offset (the start of
+    its longest proper suffix that is also a keyword prefix); every keyword that
+    starts before that offset lies inside the hit and is covered by its
+    precomputed substring closure. The result matches `keyword in text` for
+    every keyword while reading the note once.
+    """
+
+    def __init__(self, code_keywords: Dict[str, List[str]]):
+        # Keyword -> codes listing it (repeated if a code lists it twice)
+        self.owners: Dict[str, List[str]] = {}
+        for code, keywords in code_keywords.items():
+            for keyword in keywords:
+                self.owners.setdefault(keyword.lower(), []).append(code)
+
+        keywords = sorted(keyword for keyword in self.owners if keyword)
+        self._regex = re.compile(_trie_regex(keywords)) if keywords else None
+        self.longest = max(map(len, keywords), default=0)
+
+        # Keywords contained in each keyword, and where to resume after a hit
+        keyword_set = set(keywords)
+        proper_prefixes = {keyword[:end] for keyword in keywords for end in range(1, len(keyword))}
+        self._closure: Dict[str, Tuple[str, ...]] = {
+            keyword: tuple(keyword_set.intersection(
+                keyword[start:end] for start in range(len(keyword)) for end in range(start + 1, len(keyword) + 1)
+            ))
+            for keyword in keywords
+        }
+        self._resume: Dict[str, int] = {
+            keyword: next((offset for offset in range(1, len(keyword)) if keyword[offset:] in proper_prefixes), len(keyword))
+            for keyword in keywords
+        }
+
+    def find_keywords(self, text: str) -> Set[str]:
+        """Return every keyword that occurs in text, scanning it once"""
+        # The empty keyword is a substring of every note
+        found = {''} if '' in self.owners else set()
+        if self._regex is None:
+            return found
+
+        search = self._regex.search
+        position = 0
+        while True:
+            match = search(text, position)
+            if match is None:
+                break
+            keyword = match.group()
+            found.update(self._closure[keyword])
+            position = match.start() + self._resume[keyword]
+
+        return found
+
+    def scan(self, text: str) -> Dict[str, int]:
+        """Return per-code keyword hit counts for text (codes with no hits omitted)"""
+        return self.tally(self.find_keywords(text))
+
+    def tally(self, keywords: Iterable[str]) -> Dict[str, int]:
+        """Per-code hit counts for a set of keywords found by `find_keywords`"""
+        hits: Dict[str, int] = {}
+        for keyword in keywords:
+            for code in self.owners[keyword]:
+                hits[code] = hits.get(code, 0) + 1
+        return hits
+
+def _literal_prefixes(items) -> Set[str]:
+    """Literal strings one of which every match of the parsed regex items starts with"""
+    prefixes = {''}
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            prefixes = {prefix + chr(av) for prefix in prefixes}
+        elif op is sre_parse.AT and prefixes == {''}:
+            continue  # Leading \b and friends consume nothing
+        elif op is sre_parse.BRANCH:
+            alternatives = set()
+            for branch in av[1]:
+                alternatives |= _literal_prefixes(branch.data)
+            prefixes = {prefix + alternative for prefix in prefixes for alternative in alternatives}
+            break
+        elif op is sre_parse.SUBPATTERN and not av[1] and not av[2]:
+            inner = _literal_prefixes(av[3].data)
+            prefixes = {prefix + alternative for prefix in prefixes for alternative in inner}
+            break
+        else:
+            break
+    return prefixes
+
+def _required_literals(items) -> List[Set[str]]:
+    """
+    Literals the parsed regex items cannot match without, as a list of clauses:
+    every match contains at least one literal from each clause
+    """
+    clauses = []
+    run = ''
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            run += chr(av)
+            continue
+        if run:
+            clauses.append({run})
+            run = ''
+        if op is sre_parse.BRANCH:
+            # One clause per alternative, the most selective one
+            alternatives = set()
+            for branch in av[1]:
+                branch_clauses = _required_literals(branch.data)
+                if not branch_clauses:
+                    alternatives = None
+                    break
+                alternatives |= min(branch_clauses, key=lambda clause: (len(clause), -min(map(len, clause))))
+            if alternatives:
+                clauses.append(alternatives)
+        elif op is sre_parse.SUBPATTERN and not av[1] and not av[2]:
+            clauses.extend(_required_literals(av[3].data))
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] >= 1:
+            clauses.extend(_required_literals(av[2].data))
+    if run:
+        clauses.append({run})
+    return clauses
+
+# The non-ASCII characters `re` matches to an ASCII letter under IGNORECASE
+_ASCII_CASE_FOLDS = str.maketrans({'İ': 'i', 'ı': 'i', 'ſ': 's', 'K': 'k'})
+
+def _fold_case(text: str) -> str:
+    """text lowercased, with every character a `(?i)` ASCII letter matches turned into that letter"""
+    return text.translate(_ASCII_CASE_FOLDS).lower()
+
+def _case_fold_safe(items) -> bool:
+    """True if the parsed regex items match lowercase ASCII text the same with or without IGNORECASE"""
+    def safe_char(code: int) -> bool:
+        return code < 128 and not chr(code).isupper()
+
+    repeats = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, 'POSSESSIVE_REPEAT', None))
+    for op, av in items:
+        if op in (sre_parse.LITERAL, sre_parse.NOT_LITERAL):
+            if not safe_char(av):
+                return False
+        elif op is sre_parse.IN:
+            for item_op, item_av in av:
+                if item_op in (sre_parse.LITERAL, sre_parse.NOT_LITERAL):
+                    if not safe_char(item_av):
+                        return False
+                elif item_op is sre_parse.RANGE:
+                    low, high = item_av
+                    if high >= 128 or (low <= ord('Z') and high >= ord('A')):
+                        return False
+                elif item_op not in (sre_parse.NEGATE, sre_parse.CATEGORY):
+                    return False
+        elif op is sre_parse.SUBPATTERN:
+            if (av[1] | av[2]) & re.IGNORECASE or not _case_fold_safe(av[3].data):
+                return False
+        elif op is sre_parse.BRANCH:
+            if not all(_case_fold_safe(branch.data) for branch in av[1]):
+                return False
+        elif op in repeats:
+            if not _case_fold_safe(av[2].data):
+                return False
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            if not _case_fold_safe(av[1].data):
+                return False
+        elif op not in (sre_parse.ANY, sre_parse.AT, sre_parse.CATEGORY):
+            return False
+    return True
+
+def _clause_local(items) -> bool:
+    """True if the parsed regex items match inside a clause cut out of a note exactly as in place"""
+    repeats = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, 'POSSESSIVE_REPEAT', None))
+    for op, av in items:
+        if op is sre_parse.AT:
+            # A clause's start is not the note's start
+            if av in (sre_parse.AT_BEGINNING, sre_parse.AT_BEGINNING_STRING, sre_parse.AT_BEGINNING_LINE):
+                return False
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            # Lookbehinds can see into the previous clause
+            if av[0] < 0 or not _clause_local(av[1].data):
+                return False
+        elif op is sre_parse.SUBPATTERN:
+            if not _clause_local(av[3].data):
+                return False
+        elif op is sre_parse.BRANCH:
+            if not all(_clause_local(branch.data) for branch in av[1]):
+                return False
+        elif op in repeats:
+            if not _clause_local(av[2].data):
+                return False
+        elif op is getattr(sre_parse, 'ATOMIC_GROUP', None):
+            if not _clause_local(av.data):
+                return False
+        elif op is sre_parse.GROUPREF_EXISTS:
+            if not all(_clause_local(branch.data) for branch in av[1:] if branch is not None):
+                return False
+    return True
+
+def _bound_gaps(pattern: str, window: int) -> str:
+    """Rewrite unbounded `.*` / `.+` gaps in a regex source to span at most window characters"""
+    bounded = []
+    position = 0
+    in_class = False
+    while position < len(pattern):
+        char = pattern[position]
+        if char == '\\':
+            token = pattern[position:position + 2]
+        elif in_class:
+            token = char
+            in_class = char != ']'
+        elif char == '[':
+            # A ']' right after '[' or '[^' is a literal member of the class
+            token = re.match(r'\[\^?\]?', pattern[position:]).group()
+            in_class = True
+        elif char == '.' and pattern[position + 1:position + 2] in ('*', '+'):
+            minimum = 0 if pattern[position + 1] == '*' else 1
+            bounded.append(f'.{{{minimum},{window}}}')
+            position += 2
+            continue
+        else:
+            token = char
+        bounded.append(token)
+        position += len(token)
+    return ''.join(bounded)
+
+@lru_cache(maxsize=4096)
+def _caseless_item(op, av, flags: int):
+    """A single-character regex item compiled by `re` with flags, av as a tuple"""
+    state = sre_parse.State()
+    state.flags = flags
+    return sre_compile.compile(sre_parse.SubPattern(state, [(op, av)]), flags)
+
+def _matches_char(op, av, char: str, flags: int = 0) -> bool:
+    """True if a single-character regex item matches char; with IGNORECASE in flags, folding case exactly like `re`"""
+    if flags & re.IGNORECASE:
+        # Case folding is not plain lowercasing ('ſ' matches `(?i)s`), so `re` decides
+        return _caseless_item(op, tuple(av) if isinstance(av, list) else av,
+                              flags & (re.IGNORECASE | re.UNICODE)).match(char) is not None
+    code = ord(char)
+    if op is sre_parse.ANY:
+        return char != '\n'
+    if op is sre_parse.LITERAL:
+        return av == code
+    if op is sre_parse.NOT_LITERAL:
+        return av != code
+    if op is sre_parse.CATEGORY:
+        name = str(av)
+        if 'DIGIT' in name:
+            found = char.isdecimal()
+        elif 'SPACE' in name:
+            found = char.isspace()
+        elif 'WORD' in name:
+            found = char.isalnum() or char == '_'
+        else:
+            found = char == '\n'
+        return found != ('NOT_' in name)
+    if op is sre_parse.IN:
+        negate = False
+        found = False
+        for item_op, item_av in av:
+            if item_op is sre_parse.NEGATE:
+                negate = True
+            elif item_op is sre_parse.RANGE:
+                found = found or item_av[0] <= code <= item_av[1]
+            else:
+                found = found or _matches_char(item_op, item_av, char)
+        return found != negate
+    return False
+
+def _broad_gap(op, av) -> bool:
+    """True for an unbounded repeat of one character class spanning both words and spaces, like `.*`"""
+    if op not in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) or av[1] != sre_parse.MAXREPEAT or len(av[2].data) != 1:
+        return False
+    item_op, item_av = av[2].data[0]
+    return _matches_char(item_op, item_av, 'a') and _matches_char(item_op, item_av, ' ')
+
+def _backtracking_risks(items, issues: Set[str], in_repeat: bool = False) -> int:
+    """
+    Most broad unbounded gaps chained on one path through the parsed regex
+    items; constructs with exponential worst cases are added to issues
+    """
+    repeats = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, 'POSSESSIVE_REPEAT', None))
+    gaps = 0
+    for op, av in items:
+        if op in repeats:
+            unbounded = av[1] == sre_parse.MAXREPEAT
+            if unbounded and in_repeat:
+                issues.add('nested_quantifier')
+            inner = _backtracking_risks(av[2].data, issues, in_repeat or unbounded)
+            gaps += 1 if _broad_gap(op, av) else inner
+        elif op is sre_parse.SUBPATTERN:
+            gaps += _backtracking_risks(av[3].data, issues, in_repeat)
+        elif op is sre_parse.BRANCH:
+            if in_repeat:
+                # Alternatives that can start alike make each repetition try several splits
+                starts = [_literal_prefixes(branch.data) for branch in av[1]]
+                firsts = [{prefix[:1] for prefix in prefixes} for prefixes in starts]
+                if any('' in first for first in firsts) or sum(map(len, firsts)) > len(set().union(*firsts)):
+                    issues.add('ambiguous_alternation')
+            gaps += max(_backtracking_risks(branch.data, issues, in_repeat) for branch in av[1])
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            gaps += _backtracking_risks(av[1].data, issues, in_repeat)
+        elif op is getattr(sre_parse, 'ATOMIC_GROUP', None):
+            gaps += _backtracking_risks(av.data, issues, in_repeat)
+    return gaps
+
+def _gap_pieces(items, minimal: bool = False) -> List[str]:
+    """
+    Sample text matching the parsed regex items, split where broad unbounded
+    gaps are; optional parts are included unless minimal
+    """
+    repeats = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, 'POSSESSIVE_REPEAT', None))
+    pieces = ['']
+    
+    def extend(inner: List[str]):
+        pieces[-1] += inner[0]
+        pieces.extend(inner[1:])
+    
+    for op, av in items:
+        if op in repeats:
+            if _broad_gap(op, av):
+                pieces.append('')
+            else:
+                inner = _gap_pieces(av[2].data, minimal)
+                for _ in range(av[0] if minimal else max(av[0], 1)):
+                    extend(inner)
+        elif op is sre_parse.SUBPATTERN:
+            extend(_gap_pieces(av[3].data, minimal))
+        elif op is sre_parse.BRANCH:
+            # The alternative with the most gaps backtracks the most
+            extend(max((_gap_pieces(branch.data, minimal) for branch in av[1]), key=len))
+        elif op is getattr(sre_parse, 'ATOMIC_GROUP', None):
+            extend(_gap_pieces(av.data, minimal))
+        elif op is sre_parse.LITERAL:
+            pieces[-1] += chr(av)
+        elif op in (sre_parse.NOT_LITERAL, sre_parse.IN, sre_parse.CATEGORY, sre_parse.ANY):
+            pieces[-1] += next((char for char in 'ae1 x' if _matches_char(op, av, char)), '')
+    return pieces
+
+def _nested_repeat(items):
+    """Parsed body of the first unbounded repeat holding another repeat or alternatives, or None"""
+    repeats = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, 'POSSESSIVE_REPEAT', None))
+    for op, av in items:
+        children = []
+        if op in repeats:
+            body = av[2].data
+            if av[1] == sre_parse.MAXREPEAT and any(
+                    item_op in repeats or item_op is sre_parse.BRANCH or item_op is sre_parse.SUBPATTERN
+                    for item_op, _ in body):
+                return body
+            children = [body]
+        elif op is sre_parse.SUBPATTERN:
+            children = [av[3].data]
+        elif op is sre_parse.BRANCH:
+            children = [branch.data for branch in av[1]]
+        for child in children:
+            found = _nested_repeat(child)
+            if found is not None:
+                return found
+    return None
+
+@dataclass(frozen=True)
+class PatternRisk:
+    """Worst-case backtracking analysis of one catalog pattern"""
+    pattern: str
+    codes: Tuple[str, ...]
+    gaps: int  # Most `.*`-like gaps chained on one path through the pattern
+    degree: int  # Searching takes up to (text length) ** degree steps; None when exponential
+    issues: Tuple[str, ...]  # 'chained_gaps', 'nested_quantifier', 'ambiguous_alternation'
+    exponent: float = None  # Measured growth of search time with text length, when fuzzed
+
+    @property
+    def flagged(self) -> bool:
+        return bool(self.issues)
+
+def analyze_pattern(pattern: str, codes: Iterable[str] = (), max_gaps: int = 1) -> PatternRisk:
+    """
+    Statically flag constructs with super-linear worst cases in a regex
+    
+    A search tries every start position and each chained `.*`-like gap can
+    stop at every later one, so k gaps make up to n ** (k + 1) steps on text
+    of length n; patterns with more than max_gaps gaps are flagged
+    'chained_gaps'. Unbounded repeats inside unbounded repeats and
+    ambiguous alternatives inside them can take exponential time.
+    """
+    issues: Set[str] = set()
+    gaps = _backtracking_risks(sre_parse.parse(pattern).data, issues)
+    exponential = bool(issues)
+    if gaps > max_gaps:
+        issues.add('chained_gaps')
+    return PatternRisk(pattern=pattern, codes=tuple(codes), gaps=gaps, degree=None if exponential else gaps + 1,
+                       issues=tuple(sorted(issues)))
+
+def measure_scaling(pattern: str, budget: float = 0.1, start: int = 512, limit: int = 1 << 20) -> float:
+    """
+    Measured exponent of a regex's search time against text length on crafted input
+    
+    For chained gaps the input repeats the pattern's literal text between its
+    gaps, leaving out the part after the last gap, so every start position is
+    tried and each gap scanned to the end without a match; the text doubles
+    in length from start characters. For nested repeats it repeats the
+    shortest text of the repeated part and grows by about an eighth at a time.
+    Growth stops once one search takes longer than budget seconds.
+    
+    Returns:
+        The exponent of the last measurable growth step (1.0 is linear, 2.0
+        quadratic, large values exponential), or None when the pattern yields
+        no crafted input or stays too fast to measure up to limit characters
+    """
+    compiled = re.compile(pattern)
+    parsed = sre_parse.parse(pattern)
+    nested = _nested_repeat(parsed.data)
+    if nested is not None:
+        unit = ''.join(_gap_pieces(nested, minimal=True)).lower()
+        length = len(unit) * 4
+    else:
+        pieces = _gap_pieces(parsed.data)
+        unit = ' '.join(pieces[:-1] if len(pieces) > 1 else pieces).lower() + ' '
+        length = start
+    if not unit.strip():
+        return None
+    
+    lengths, timings = [], []
+    while length <= limit:
+        text = (unit * (length // len(unit) + 1))[:length]
+        best = float('inf')
+        for _ in range(3):
+            started = time.perf_counter()
+            compiled.search(text)
+            best = min(best, time.perf_counter() - started)
+            if best > budget:
+                break
+        lengths.append(length)
+        timings.append(best)
+        if best > budget:
+            break
+        # Exponential growth would overshoot the budget on doubling, so nested
+        # repeats grow by about an eighth
+        length = length + max(len(unit) * 2, length // 8) if nested is not None else length * 2
+    
+    # Below a millisecond timer noise swamps the growth
+    measurable = [(length, seconds) for length, seconds in zip(lengths, timings) if seconds >= 1e-3]
+    if len(measurable) < 2:
+        return None
+    (shorter, before), (longer, after) = measurable[-2:]
+    return round(math.log(after / before) / math.log(longer / shorter), 2)
+
+def analyze_catalog(codes: Mapping[str, Mapping], max_gaps: int = 1, fuzz: bool = False,
+                    budget: float = 0.1) -> List[PatternRisk]:
+    """
+    Analyze every distinct pattern of a catalog
+    
+    Args:
+        codes: Catalog codes (CatalogSource.codes or cpt_mapping)
+        max_gaps: Most chained `.*`-like gaps a pattern may have before it is flagged
+        fuzz: Also measure the scaling exponent of each flagged pattern (see measure_scaling)
+        budget: Longest single search, in seconds, while fuzzing
+        
+    Returns:
+        One PatternRisk per pattern, in catalog order
+    """
+    pattern_codes: Dict[str, List[str]] = {}
+    for cpt_code, code_info in codes.items():
+        for pattern in code_info['patterns']:
+            pattern_codes.setdefault(pattern, []).append(cpt_code)
+    
+    risks = []
+    for pattern, pattern_code_list in pattern_codes.items():
+        risk = analyze_pattern(pattern, pattern_code_list, max_gaps)
+        if fuzz and risk.flagged:
+            risk = replace(risk, exponent=measure_scaling(pattern, budget))
+        risks.append(risk)
+    return risks
+
+def _is_word(char: str) -> bool:
+    """True for a character `\\w` matches in a str pattern"""
+    return char.isalnum() or char == '_'
+
+class _DFAState:
+    """DFA state: its set of NFA nodes, whether the previous character is a word character, and transitions"""
+    __slots__ = ('core', 'prev_word', 'next', 'final', 'accepts_at_end')
+
+    def __init__(self, core: frozenset, prev_word: bool, final: bool = False):
+        self.core = core
+        self.prev_word = prev_word
+        self.next: Dict[str, '_DFAState'] = {}
+        self.final = final
+        self.accepts_at_end: bool = None
+
+# Targets of transitions that end a run: some match was found, or none can be
+_MATCHED = _DFAState(frozenset(), False, final=True)
+_DEAD = _DFAState(frozenset(), False, final=True)
+
+class LazyDFA:
+    """
+    Regex compiled to a DFA built lazily while scanning, for linear-time matching.
+
+    The pattern is parsed into a Thompson NFA (literals, classes, `.`,
+    alternation, groups, greedy and lazy repeats, `\\b` and `\\B`, and the
+    IGNORECASE, DOTALL, MULTILINE and VERBOSE flags, global or scoped). A
+    case-insensitive character item is tested with `re`'s own compiled form
+    of the item, so it folds case exactly like `re`. DFA states are sets of
+    NFA nodes, created the first time a scan reaches them, and each transition
+    is computed once per state and character, so a scan costs at most one
+    step per character of text whatever the pattern. Only whether
+    there is a match is computed: `search` and `match` return True or None, like
+    the truthiness of `re` match objects, without spans or groups. This holds
+    for every pos <= endpos (after clamping to the text); with pos > endpos
+    there is never a match, whereas `re.match` there may still find some
+    zero-width matches (`\b` can, `x?` cannot). Patterns with other constructs
+    (backreferences, lookarounds, `^`/`$`, possessive repeats, ASCII or
+    LOCALE matching) raise ValueError.
+
+    The state cache is flushed once it holds MAX_STATES states, bounding memory
+    on patterns whose DFA would be exponential. Concurrent scans may build the
+    same transition twice, which is harmless.
+    """
+
+    # DFA states kept before the cache is flushed
+    MAX_STATES = 4096
+
+    # Largest NFA compiled; bounded repeats are unrolled
+    MAX_NODES = 50000
+
+    # NFA node kinds
+    _CHAR, _SPLIT, _ASSERT, _ACCEPT = range(4)
+
+    # Flags a DFA honours; the others change what characters match
+    SUPPORTED_FLAGS = re.UNICODE | re.IGNORECASE | re.DOTALL | re.MULTILINE | re.VERBOSE
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        parsed = sre_parse.parse(pattern)
+        if parsed.state.flags & ~self.SUPPORTED_FLAGS:
+            raise ValueError(f"unsupported regex flags in {pattern!r}")
+        self._kinds: List[int] = []
+        self._items: List = []
+        self._outs: List[List[int]] = []
+        self._start = self._build(parsed.data, self._node(self._ACCEPT, None), parsed.state.flags)
+
+        # (core, previous character is a word character, anchored) -> state, and
+        # the start state of each kind of run; anchored runs and searches have
+        # different transitions, so they never share states
+        self._states: Dict[Tuple[frozenset, bool, bool], _DFAState] = {}
+        self._starts: Dict[Tuple[bool, bool], _DFAState] = {}
+
+    def __reduce__(self):
+        return LazyDFA, (self.pattern,)
+
+    def __repr__(self) -> str:
+        return f"LazyDFA({self.pattern!r})"
+
+    def _node(self, kind: int, item, outs: List[int] = ()) -> int:
+        if len(self._kinds) >= self.MAX_NODES:
+            raise ValueError(f"pattern too large for a DFA: {self.pattern!r}")
+        self._kinds.append(kind)
+        self._items.append(item)
+        self._outs.append(list(outs))
+        return len(self._kinds) - 1
+
+    def _build(self, items, following: int, flags: int) -> int:
+        """First NFA node of a parsed sequence, under regex flags, whose matches continue at node following"""
+        for op, av in reversed(list(items)):
+            following = self._build_item(op, av, following, flags)
+        return following
+
+    def _build_item(self, op, av, following: int, flags: int) -> int:
+        if op is sre_parse.ANY and flags & re.DOTALL:
+            return self._node(self._CHAR, None, [following])
+        if op is sre_parse.ANY:
+            return self._node(self._CHAR, (op, av, 0), [following])
+        if op in (sre_parse.LITERAL, sre_parse.NOT_LITERAL, sre_parse.IN):
+            return self._node(self._CHAR, (op, av, flags & (re.IGNORECASE | re.UNICODE)), [following])
+        if op is sre_parse.SUBPATTERN:
+            added, removed = av[1], av[2]
+            if (added | removed) & ~self.SUPPORTED_FLAGS:
+                raise ValueError(f"unsupported scoped regex flags in {self.pattern!r}")
+            return self._build(av[3].data, following, (flags | added) & ~removed)
+        if op is sre_parse.BRANCH:
+            return self._node(self._SPLIT, None, [self._build(branch.data, following, flags) for branch in av[1]])
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            # Which of the matches is preferred makes no difference to whether there is one
+            low, high, body = av
+            if high == sre_parse.MAXREPEAT:
+                loop = self._node(self._SPLIT, None)
+                self._outs[loop] = [self._build(body.data, loop, flags), following]
+                following = loop
+            else:
+                # x{0,k} unrolls to (x(x(x)?)?)?
+                exit_node = following
+                for _ in range(high - low):
+                    following = self._node(self._SPLIT, None, [self._build(body.data, following, flags), exit_node])
+            for _ in range(low):
+                following = self._build(body.data, following, flags)
+            return following
+        if op is sre_parse.AT and av in (sre_parse.AT_BOUNDARY, sre_parse.AT_NON_BOUNDARY):
+            return self._node(self._ASSERT, av is sre_parse.AT_BOUNDARY, [following])
+        raise ValueError(f"regex construct {op} is not supported by the DFA: {self.pattern!r}")
+
+    def search(self, text: str, pos: int = 0, endpos: int = None):
+        """True if the pattern matches anywhere in text[pos:endpos], else None"""
+        return self._run(text, pos, endpos, anchored=False)
+
+    def match(self, text: str, pos: int = 0, endpos: int = None):
+        """True if the pattern matches text[pos:endpos] starting at pos, else None"""
+        return self._run(text, pos, endpos, anchored=True)
+
+    def _run(self, text: str, pos: int, endpos: int, anchored: bool):
+        # Positions are clamped like `re` does; `\b` at pos sees the character before it
+        length = len(text)
+        pos = min(max(pos, 0), length)
+        end = length if endpos is None else min(max(endpos, 0), length)
+        if pos > end:
+            # An empty range never matches (unlike some zero-width `re.match` calls)
+            return None
+        prev_word = pos > 0 and _is_word(text[pos - 1])
+        state = self._starts.get((anchored, prev_word))
+        if state is None:
+            state = self._starts[anchored, prev_word] = self._state(frozenset((self._start,)), prev_word, anchored)
+
+        for index in range(pos, end):
+            char = text[index]
+            following = state.next.get(char)
+            if following is None:
+                following = self._step(state, char, anchored)
+            if following.final:
+                return True if following is _MATCHED else None
+            state = following
+
+        if end == 0:
+            # Like `re`, neither `\b` nor `\B` holds in empty text
+            return True if self._closure(state.core, False, False, empty=True)[1] else None
+        if state.accepts_at_end is None:
+            state.accepts_at_end = self._closure(state.core, state.prev_word, False)[1]
+        return True if state.accepts_at_end else None
+
+    def _state(self, core: frozenset, prev_word: bool, anchored: bool) -> _DFAState:
+        state = self._states.get((core, prev_word, anchored))
+        if state is None:
+            if len(self._states) >= self.MAX_STATES:
+                self._states = {}
+                self._starts = {}
+            state = self._states[core, prev_word, anchored] = _DFAState(core, prev_word)
+        return state
+
+    def _closure(self, core: frozenset, prev_word: bool, next_word: bool,
+                 empty: bool = False) -> Tuple[List[int], bool]:
+        """Character nodes reachable from core without consuming input, and whether the accept node is"""
+        kinds, items, outs = self._kinds, self._items, self._outs
+        stack = list(core)
+        seen = set(core)
+        chars = []
+        while stack:
+            node = stack.pop()
+            kind = kinds[node]
+            if kind == self._CHAR:
+                chars.append(node)
+                continue
+            if kind == self._ACCEPT:
+                return chars, True
+            if kind == self._ASSERT and (empty or items[node] != (prev_word != next_word)):
+                continue
+            for out in outs[node]:
+                if out not in seen:
+                    seen.add(out)
+                    stack.append(out)
+        return chars, False
+
+    def _step(self, state: _DFAState, char: str, anchored: bool) -> _DFAState:
+        """Compute and cache the transition of state on char"""
+        next_word = _is_word(char)
+        chars, accepted = self._closure(state.core, state.prev_word, next_word)
+        if accepted:
+            following = _MATCHED
+        else:
+            core = set()
+            for node in chars:
+                item = self._items[node]
+                if item is None or _matches_char(item[0], item[1], char, item[2]):
+                    core.add(self._outs[node][0])
+            if not anchored:
+                # A search may also start a match at the next position
+                core.add(self._start)
+            following = self._state(frozenset(core), next_word, anchored) if core else _DEAD
+        state.next[char] = following
+        return following
+
+def compile_dfa(pattern: str) -> LazyDFA:
+    """
+    LazyDFA for pattern; ValueError if a DFA cannot express it, rather than
+    falling back to `re` and losing the linear-time guarantee
+    """
+    return LazyDFA(pattern)
+
+# Compilers of the regex backends a PatternMatcher can run patterns with: each
+# returns an object with `search(text, pos, endpos)` and `match(text, pos, endpos)`
+# whose results are truthy exactly when `re` finds a match
+MATCHER_BACKENDS: Dict[str, Callable[[str], object]] = {'re': re.compile, 'dfa': compile_dfa}
+
+def _backend_compiler(backend: str) -> Callable[[str], object]:
+    """Compiler of a matcher backend, ValueError for an unknown one"""
+    try:
+        return MATCHER_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"unknown matcher backend {backend!r}; expected one of {sorted(MATCHER_BACKENDS)}") from None
+
+@lru_cache(maxsize=4096)
+def compile_pattern(pattern: str, backend: str = 're'):
+    """pattern compiled by a matcher backend, memoized (see MATCHER_BACKENDS)"""
+    return _backend_compiler(backend)(pattern)
+
+class PatternMatcher:
+    """
+    Merged matcher reporting which of many regex patterns match a text.
+
+    Each pattern is analysed once for the literal strings its matches must start
+    with. All of these anchors go into one trie regex, so a single traversal of
+    the note finds every position where some pattern could begin, and a pattern
+    is only tried (anchored, with `match`) at its own anchor positions until it
+    first succeeds. Patterns without a usable anchor fall back to a plain
+    `search`.
+
+    Before a pattern is run at all, its required literals (e.g. "thoracentesis"
+    or "splint") are checked against the note through an inverted literal ->
+    pattern index. Presence is tested lazily and memoized per note, and a
+    missing literal prunes every pattern that needs it, so regexes whose
+    vocabulary is absent never run - in particular `.*` patterns that would
+    otherwise scan to the end of the note from every anchor occurrence.
+
+    On lowercase ASCII text (what `_clean_text` produces) anchors are matched
+    case-sensitively, and `(?i)` patterns whose literals are all lowercase
+    ASCII run as case-sensitive twins, which lets the regex engine use its fast
+    literal scans after `.*`. Any other text is scanned for anchors and
+    literals in its `_fold_case` form, where a `(?i)` pattern's literals are
+    found wherever it can match, and the candidates that pass run as the
+    original patterns on the text itself.
+
+    With a window the matcher runs in bounded mode: the note is split into
+    clauses once (at '.' or ';' followed by whitespace), every match must lie
+    inside a single clause and each `.*` gap spans at most window characters,
+    so no pattern can backtrack across a whole long note.
+
+    The patterns themselves run on a backend from MATCHER_BACKENDS: `re` by
+    default, or 'dfa' for LazyDFA scans. Other backends compile every pattern
+    up front, so one they cannot run fails the matcher's construction. A DFA
+    pattern is searched once from its first anchor in a clause (or the note)
+    instead of matched at each anchor, so matching stays linear in the note
+    length. The anchor scan always uses `re`: a trie of literals does not
+    backtrack.
+    """
+
+    # Anchors shorter than this hit almost every word and are cheaper to search for
+    MIN_ANCHOR_LENGTH = 3
+    
+    # Shorter required literals are present in nearly every note and prune nothing
+    MIN_LITERAL_LENGTH = 3
+    
+    # Sentence/clause boundaries for bounded mode; decimal points are not followed by whitespace
+    CLAUSE_BOUNDARY = re.compile(r'[.;](?=\s|$)')
+
+    def __init__(self, patterns: List[str], window: int = None, backend: str = 're'):
+        _backend_compiler(backend)
+        self.patterns = list(dict.fromkeys(patterns))
+        self.ids: Dict[str, int] = {pattern: pattern_id for pattern_id, pattern in enumerate(self.patterns)}
+        self.window = window
+        self.backend = backend
+        
+        # The patterns a `restricted` matcher finds (None: all of them)
+        self.scope: frozenset = None
+        
+        # Regex sources actually run - the originals and their case-folded twins,
+        # gap-bounded in bounded mode - compiled on first use
+        self._plain_sources: List[str] = []
+        self._folded_sources: List[str] = []
+        self._plain: List = [None] * len(self.patterns)
+        self._folded: List = [None] * len(self.patterns)
+
+        # Anchor literal -> ids of patterns that may start with it, and the
+        # required literal clauses of each pattern
+        anchored: Dict[str, List[int]] = {}
+        self.fallback_ids: List[int] = []
+        self.required: List[Tuple[Tuple[str, ...], ...]] = []
+
+        # Case-sensitive patterns with anchors or literals that `_fold_case` changes,
+        # which the folded scan of text other than lowercase ASCII cannot screen
+        unfoldable: List[int] = []
+        
+        # Whether, in bounded mode, matching each clause on its own finds exactly
+        # the matches of the whole note
+        self.clause_local = window is not None
+        for pattern_id, pattern in enumerate(self.patterns):
+            parsed = sre_parse.parse(pattern)
+            self.clause_local = self.clause_local and _clause_local(parsed.data)
+            folded = self._fold(pattern, parsed)
+            self._plain_sources.append(pattern if window is None else _bound_gaps(pattern, window))
+            self._folded_sources.append(self._plain_sources[-1] if folded is None else
+                                        folded if window is None else _bound_gaps(folded, window))
+            self.required.append(() if folded is None else self._required(parsed))
             
-            # Skin Procedures (17000-17999)
-            "17000": {
-                "description": "Destruction of premalignant lesions; first lesion",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["destruction", "premalignant", "lesion", "cryotherapy"],
-                "patterns": [r"(?i)destruction.*lesion", r"(?i)premalignant.*destruction", r"(?i)cryotherapy.*lesion"]
-            },
-            "17003": {
-                "description": "Destruction of premalignant lesions; second through 14th lesion",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["destruction", "multiple lesions", "additional lesions"],
-                "patterns": [r"(?i)destruction.*multiple.*lesions", r"(?i)additional.*lesion.*destruction"]
-            },
-            "17110": {
-                "description": "Destruction of benign lesions other than skin tags or cutaneous vascular lesions; up to 14 lesions",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["benign lesions", "destruction", "wart", "keratosis"],
-                "patterns": [r"(?i)benign.*lesion.*destruction", r"(?i)wart.*(?:destruction|removal)", r"(?i)keratosis.*destruction"]
-            },
-            "17250": {
-                "description": "Chemical cauterization of granulation tissue",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["chemical cauterization", "granulation tissue", "cautery"],
-                "patterns": [r"(?i)chemical\s+cauteriz", r"(?i)granulation.*cauteriz", r"(?i)cauteriz.*granulation"]
-            },
+            anchors = self._anchors(parsed)
+            literals = [literal for clause in self.required[-1] for literal in clause] + list(anchors or ())
+            if not parsed.state.flags & re.IGNORECASE and any(_fold_case(literal) != literal for literal in literals):
+                unfoldable.append(pattern_id)
+            if anchors is None:
+                self.fallback_ids.append(pattern_id)
+                continue
+            for anchor in anchors:
+                anchored.setdefault(anchor, []).append(pattern_id)
+
+        # The trie reports the longest anchor at a position; shorter anchors
+        # that also start there are its prefixes
+        anchors = sorted(anchored)
+        self._candidates: Dict[str, Tuple[int, ...]] = {
+            anchor: tuple(dict.fromkeys(
+                pattern_id for prefix in anchors if anchor.startswith(prefix) for pattern_id in anchored[prefix]
+            ))
+            for anchor in anchors
+        }
+        self._scanner = re.compile('(?=(' + _trie_regex(anchors) + '))') if anchors else None
+        self.unfoldable_ids = frozenset(unfoldable)
+        
+        if backend != 're':
+            for pattern_id in range(len(self.patterns)):
+                self.plain(pattern_id)
+                self.folded(pattern_id)
+
+        # Inverted index of literals that are the only option in some pattern's clause
+        self.literal_index: Dict[str, List[int]] = {}
+        for pattern_id, clauses in enumerate(self.required):
+            for clause in clauses:
+                if len(clause) == 1:
+                    self.literal_index.setdefault(clause[0], []).append(pattern_id)
+
+    def restricted(self, pattern_ids: Iterable[int]) -> 'PatternMatcher':
+        """
+        Matcher that only finds the given patterns, under the same ids
+        
+        Its anchor scan only looks for the anchors of those patterns; compiled
+        regexes are shared with this matcher.
+        """
+        pattern_ids = frozenset(pattern_ids)
+        view = copy.copy(self)
+        view.scope = pattern_ids if self.scope is None else self.scope & pattern_ids
+        view._candidates = {}
+        for anchor, candidates in self._candidates.items():
+            candidates = tuple(pattern_id for pattern_id in candidates if pattern_id in pattern_ids)
+            if candidates:
+                view._candidates[anchor] = candidates
+        view._scanner = re.compile('(?=(' + _trie_regex(sorted(view._candidates)) + '))') if view._candidates else None
+        view.fallback_ids = [pattern_id for pattern_id in self.fallback_ids if pattern_id in pattern_ids]
+        return view
+
+    @property
+    def dfa_native(self) -> int:
+        """Number of patterns whose every compiled form is a LazyDFA"""
+        return sum(type(self.plain(pattern_id)) is LazyDFA and type(self.folded(pattern_id)) is LazyDFA
+                   for pattern_id in range(len(self.patterns)))
+
+    def clause_ends(self, text: str) -> List[int]:
+        """End offsets of the clauses of text, the last one always len(text)"""
+        clause_ends = [boundary.end() for boundary in self.CLAUSE_BOUNDARY.finditer(text)]
+        if not clause_ends or clause_ends[-1] != len(text):
+            clause_ends.append(len(text))
+        return clause_ends
+
+    def plain(self, pattern_id: int):
+        """Compiled pattern as run on arbitrary text (gap-bounded in bounded mode)"""
+        compiled = self._plain[pattern_id]
+        if compiled is None:
+            compiled = self._plain[pattern_id] = compile_pattern(self._plain_sources[pattern_id], self.backend)
+        return compiled
+
+    def folded(self, pattern_id: int):
+        """Compiled pattern as run on lowercase ASCII text"""
+        compiled = self._folded[pattern_id]
+        if compiled is None:
+            compiled = self._folded[pattern_id] = compile_pattern(self._folded_sources[pattern_id], self.backend)
+        return compiled
+
+    @staticmethod
+    def _fold(pattern: str, parsed) -> str:
+        """Case-sensitive source equivalent to a pattern on lowercase ASCII text, or None if there is none"""
+        if not parsed.state.flags & re.IGNORECASE:
+            return pattern
+        flags = re.match(r'\(\?([aiLmsux]+)\)', pattern)
+        if flags is None or 'i' not in flags.group(1) or not _case_fold_safe(parsed.data):
+            return None
+        remaining = flags.group(1).replace('i', '')
+        folded = (f'(?{remaining})' if remaining else '') + pattern[flags.end():]
+        try:
+            if sre_parse.parse(folded).state.flags & re.IGNORECASE:
+                return None
+        except re.error:
+            return None
+        return folded
+
+    def _required(self, parsed) -> Tuple[Tuple[str, ...], ...]:
+        """Required literal clauses of a pattern that has a case-sensitive form"""
+        return tuple(
+            tuple(sorted(clause)) for clause in _required_literals(parsed.data)
+            if min(map(len, clause)) >= self.MIN_LITERAL_LENGTH
+        )
+
+    def _anchors(self, parsed) -> Set[str]:
+        """Lowercase anchor literals for a parsed pattern, or None if it has none"""
+        prefixes = _literal_prefixes(parsed.data)
+        if parsed.state.flags & re.IGNORECASE:
+            if not all(prefix.isascii() for prefix in prefixes):
+                return None
+            prefixes = {prefix.lower() for prefix in prefixes}
+        if any(len(prefix) < self.MIN_ANCHOR_LENGTH for prefix in prefixes):
+            return None
+        return prefixes
+
+    def match_ids(self, text: str, stats: Dict[str, int] = None, only: Set[int] = None,
+                  profiler: 'Profiler' = None) -> Set[int]:
+        """
+        Return the ids of every pattern that matches somewhere in text
+        
+        Args:
+            text: Text to match, normally the output of `_clean_text`
+            stats: Optional dict that receives per-call counters: 'patterns' in the
+                matcher, 'searched' (patterns a regex was actually run for) and
+                'pruned' (patterns skipped by the anchor scan, literal prefilter or `only`)
+            only: Restrict matching to these pattern ids (default: all patterns)
+            profiler: Optional Profiler that receives the calls, time and matches of each regex run
+        """
+        if self.scope is not None:
+            only = self.scope if only is None else self.scope.intersection(only)
+        # Clause end offsets, so bounded matches never leave their clause
+        clause_ends = None if self.window is None else self.clause_ends(text)
+        
+        # Per-pattern [calls, seconds, matches] of this call, handed to the profiler at the end
+        timings: Dict[int, List] = None if profiler is None else {}
+
+        def timed(pattern_id: int, run) -> bool:
+            started = time.perf_counter()
+            hit = bool(run())
+            timing = timings.setdefault(pattern_id, [0, 0.0, 0])
+            timing[0] += 1
+            timing[1] += time.perf_counter() - started
+            timing[2] += hit
+            return hit
+
+        def search(compiled) -> bool:
+            if clause_ends is None:
+                return compiled.search(text) is not None
+            start = 0
+            for end in clause_ends:
+                if compiled.search(text, start, end):
+                    return True
+                start = end
+            return False
+
+        # Lowercase ASCII text runs the case-sensitive twins; any other text is
+        # screened in its folded form and runs the original patterns. Text without
+        # cased letters (e.g. a clause like " 12.") is as lowercase as it gets
+        if text.isascii() and (text.islower() or text.lower() == text):
+            scan, compiled_cache, compile_ = text, self._folded, self.folded
+            unscreened = frozenset()
+        else:
+            scan, compiled_cache, compile_ = _fold_case(text), self._plain, self.plain
+            unscreened = self.unfoldable_ids
+        # Anchor offsets in the folded scan are offsets in text unless some character lowercased to several
+        aligned = len(scan) == len(text)
+
+        matched = set()
+        searched = set()
+        excluded = set() if only is None else set(range(len(self.patterns))).difference(only)
+        pruned = set(excluded)
+        present: Dict[str, bool] = {}
+        
+        # End offset each DFA pattern has already been searched up to without a match
+        scanned: Dict[int, int] = {}
+
+        def worth_running(pattern_id: int) -> bool:
+            for clause in self.required[pattern_id]:
+                for literal in clause:
+                    found = present.get(literal)
+                    if found is None:
+                        found = present[literal] = literal in scan
+                        if not found:
+                            pruned.update(self.literal_index.get(literal, ()))
+                    if found:
+                        break
+                else:
+                    pruned.add(pattern_id)
+                    return False
+            return True
+
+        candidates = self._candidates
+        for anchor in self._scanner.finditer(scan) if self._scanner is not None else ():
+            position = anchor.start()
+            for pattern_id in candidates[anchor.group(1)]:
+                if pattern_id in matched or pattern_id in pruned or pattern_id in unscreened:
+                    continue
+                if pattern_id in searched or worth_running(pattern_id):
+                    searched.add(pattern_id)
+                    if not aligned:
+                        # Searched whole below, once every anchor is known
+                        continue
+                    end = len(text) if clause_ends is None else clause_ends[bisect_right(clause_ends, position)]
+                    if scanned.get(pattern_id) == end:
+                        continue
+                    compiled = compiled_cache[pattern_id] or compile_(pattern_id)
+                    if type(compiled) is LazyDFA:
+                        # Every match starts at an anchor, so one linear scan from the first
+                        # anchor of the clause covers all the later ones
+                        scanned[pattern_id] = end
+                        run = compiled.search
+                    else:
+                        run = compiled.match
+                    if timings is None:
+                        hit = run(text, position, end)
+                    else:
+                        hit = timed(pattern_id, lambda: run(text, position, end))
+                    if hit:
+                        matched.add(pattern_id)
+
+        remaining = [pattern_id for pattern_id in self.fallback_ids
+                     if pattern_id not in pruned and pattern_id not in unscreened and worth_running(pattern_id)]
+        if not aligned:
+            remaining.extend(pattern_id for pattern_id in searched if pattern_id not in pruned)
+        remaining.extend(pattern_id for pattern_id in unscreened if pattern_id not in excluded)
+        for pattern_id in remaining:
+            searched.add(pattern_id)
+            compiled = compile_(pattern_id)
+            if search(compiled) if timings is None else timed(pattern_id, lambda: search(compiled)):
+                matched.add(pattern_id)
+
+        if timings is not None:
+            profiler.add_patterns(self.patterns, timings)
+        if stats is not None:
+            stats.update(patterns=len(self.patterns), searched=len(searched),
+                         pruned=len(self.patterns) - len(searched))
+        return matched
+
+# Bundled catalog: CPT codes in ranges [10000-69999] and [99100-99199]
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cpt_catalog.json')
+
+# Catalog file layout understood by load_catalog
+CATALOG_SCHEMA = 1
+
+@dataclass(frozen=True)
+class CatalogSource:
+    path: str
+    version: str
+    digest: str
+    codes: Mapping[str, Mapping]
+    rules: Mapping[str, tuple] = None
+
+# Business rules of catalogs without a "rules" section: one E&M code per
+# encounter, one code per category and 3-digit code prefix, and procedures
+# only matched in the procedure sections of notes that have section headers
+DEFAULT_RULES = {'conflict_prefix': 3, 'single_per_category': ['EVALUATION'],
+                 'section_policy': {'PROCEDURES': ['PROCEDURE', 'PROCEDURES', 'PROCEDURE NOTE']}}
+
+def _parse_rules(rules: Dict, codes: Dict[str, Dict]) -> Mapping[str, tuple]:
+    """Validated, read-only business rules of a catalog file"""
+    def known(cpt_code) -> str:
+        if str(cpt_code) not in codes:
+            raise ValueError(f"rule refers to unknown code {cpt_code}")
+        return str(cpt_code)
+    
+    def section_names(sections) -> Tuple[str, ...]:
+        if isinstance(sections, str):
+            raise TypeError(f"expected a list of section names, got {sections!r}")
+        return tuple(' '.join(section.upper().split()) for section in sections)
+    
+    def repair_type(repair) -> str:
+        if str(repair) not in WoundMeasurer.REPAIR_ORDER:
+            raise ValueError(f"size band has unknown repair type {repair!r}; expected one of {WoundMeasurer.REPAIR_ORDER}")
+        return str(repair)
+    
+    def site_groups(sites) -> Tuple[str, ...]:
+        if isinstance(sites, str):
+            raise TypeError(f"expected a list of site groups, got {sites!r}")
+        for site_group in sites:
+            if site_group not in WoundMeasurer.SITE_GROUPS:
+                raise ValueError(f"size band has unknown site group {site_group!r}; "
+                                 f"expected one of {tuple(WoundMeasurer.SITE_GROUPS)}")
+        return tuple(sites)
+    
+    try:
+        return MappingProxyType({
+            'conflict_prefix': int(rules.get('conflict_prefix') or 0),
+            'single_per_category': tuple(ProcedureCategory[name] for name in rules.get('single_per_category', ())),
+            'conflict_groups': tuple(
+                tuple(known(cpt_code) for cpt_code in group['codes']) for group in rules.get('conflict_groups', ())
+            ),
+            'bundles': tuple(
+                (known(bundle['major']), tuple(known(cpt_code) for cpt_code in bundle['minor']))
+                for bundle in rules.get('bundles', ())
+            ),
+            'size_bands': tuple(
+                (repair_type(family['repair']), site_groups(family['sites']),
+                 tuple(sorted((float(limit), known(cpt_code)) for limit, cpt_code in family['bands'])))
+                for family in rules.get('size_bands', ())
+            ),
+            'section_policy': tuple(
+                (ProcedureCategory[name], section_names(sections))
+                for name, sections in rules.get('section_policy', {}).items()
+            )
+        })
+    except (KeyError, TypeError, AttributeError) as error:
+        raise ValueError(f"invalid rules: {error!r}") from error
+
+def _freeze_catalog(catalog: Dict[str, Dict]) -> Mapping[str, Mapping]:
+    """Read-only view of a catalog, with keyword and pattern lists as tuples"""
+    return MappingProxyType({
+        cpt_code: MappingProxyType({
+            **code_info,
+            'keywords': tuple(code_info['keywords']),
+            'patterns': tuple(code_info['patterns'])
+        })
+        for cpt_code, code_info in catalog.items()
+    })
+
+# Gap bound the 'bound' pattern policy gives to patterns with chained `.*` gaps
+PATTERN_GAP_BOUND = 200
+
+def _gate_patterns(codes: Dict[str, Dict], policy: str):
+    """
+    Apply a load-time pattern policy to parsed catalog codes, in place
+    
+    'reject' refuses any pattern `analyze_pattern` flags; 'bound' rewrites the
+    `.*` gaps of flagged patterns to span at most PATTERN_GAP_BOUND characters
+    and refuses those that are still flagged (nested or ambiguous repeats).
+    """
+    if policy not in ('reject', 'bound'):
+        raise ValueError(f"unknown pattern policy {policy!r}")
+    replacements = {}
+    rejected = []
+    for risk in analyze_catalog(codes):
+        if not risk.flagged:
+            continue
+        if policy == 'bound':
+            bounded = _bound_gaps(risk.pattern, PATTERN_GAP_BOUND)
+            if not analyze_pattern(bounded).flagged:
+                replacements[risk.pattern] = bounded
+                continue
+        rejected.append(risk)
+    if rejected:
+        raise ValueError("patterns with super-linear worst cases: " + '; '.join(
+            f"{' '.join(risk.codes)} {risk.pattern!r} ({', '.join(risk.issues)})" for risk in rejected))
+    for code_info in codes.values():
+        code_info['patterns'] = [replacements.get(pattern, pattern) for pattern in code_info['patterns']]
+
+# Loaded catalogs by path and pattern policy, with the (mtime, size) they were read at
+_catalog_sources: Dict[Tuple[str, str], Tuple[Tuple[int, int], CatalogSource]] = {}
+
+def load_catalog(path: str = None, pattern_policy: str = None) -> CatalogSource:
+    """
+    Load a versioned code catalog from a JSON (or, with PyYAML, YAML) file
+    
+    Args:
+        path: Catalog file; defaults to the bundled cpt_catalog.json
+        pattern_policy: Guard against patterns with super-linear worst cases:
+            'reject' fails the load, 'bound' limits their `.*` gaps (see
+            `_gate_patterns`); None (default) loads patterns as written
+        
+    Returns:
+        The frozen catalog with its version and content digest. Unchanged files
+        are not re-read.
+    """
+    path = os.path.abspath(path or DEFAULT_CATALOG_PATH)
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _catalog_sources.get((path, pattern_policy))
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    
+    with open(path, 'rb') as catalog_file:
+        content = catalog_file.read()
+    if path.endswith(('.yaml', '.yml')):
+        # PyYAML is optional and slow to import, so only YAML catalogs load it
+        try:
+            import yaml
+        except ImportError as error:
+            raise ValueError(f"{path}: reading YAML catalogs requires PyYAML") from error
+        document = yaml.safe_load(content)
+    else:
+        document = json.loads(content)
+    
+    if not isinstance(document, dict) or document.get('schema') != CATALOG_SCHEMA:
+        raise ValueError(f"{path}: expected a catalog with schema {CATALOG_SCHEMA}")
+    if not document.get('version') or not isinstance(document.get('codes'), dict):
+        raise ValueError(f"{path}: catalog needs a version and a codes mapping")
+    
+    codes = {}
+    for cpt_code, code_info in document['codes'].items():
+        try:
+            codes[str(cpt_code)] = {
+                'description': code_info['description'],
+                'category': ProcedureCategory[code_info['category']],
+                'keywords': [str(keyword) for keyword in code_info['keywords']],
+                'patterns': [str(pattern) for pattern in code_info['patterns']]
+            }
+        except (KeyError, TypeError) as error:
+            raise ValueError(f"{path}: invalid entry for {cpt_code}: {error!r}") from error
+    
+    try:
+        rules = _parse_rules(document.get('rules', DEFAULT_RULES), codes)
+        if pattern_policy is not None:
+            _gate_patterns(codes, pattern_policy)
+            # Rewritten patterns must not share compiled or cached state with the file's own
+            content += f"\0{pattern_policy}".encode()
+    except ValueError as error:
+        raise ValueError(f"{path}: {error}") from error
+    
+    source = CatalogSource(path=path, version=str(document['version']),
+                           digest=hashlib.sha256(content).hexdigest(), codes=_freeze_catalog(codes), rules=rules)
+    _catalog_sources[(path, pattern_policy)] = (signature, source)
+    return source
+
+class RuleTable:
+    """
+    A catalog's business rules compiled to bitsets over its code indices.
+
+    bundled_by[i] holds the codes whose presence removes code i (a major
+    procedure bundling a minor one); conflicts[i] holds the codes mutually
+    exclusive with code i (same-prefix families, one E&M per encounter,
+    the size bands of a repair family, explicit groups), of which only the
+    most confident is kept. Applying the
+    table to k found codes is O(k^2) integer operations.
+    """
+
+    def __init__(self, catalog: Mapping[str, Mapping], rules: Mapping[str, tuple]):
+        self.index: Dict[str, int] = {cpt_code: index for index, cpt_code in enumerate(catalog)}
+        self.conflicts: List[int] = [0] * len(self.index)
+        self.bundled_by: List[int] = [0] * len(self.index)
+        
+        # The size bands of a repair family are one code per encounter; they are
+        # exempt from prefix families, which would merge e.g. face and hand repairs
+        banded = {cpt_code for _, _, bands in rules.get('size_bands', ()) for _, cpt_code in bands}
+        groups: Dict[object, int] = {}
+        prefix = rules['conflict_prefix']
+        for cpt_code, code_info in catalog.items():
+            bit = 1 << self.index[cpt_code]
+            if prefix and cpt_code not in banded:
+                key = (code_info['category'], cpt_code[:prefix])
+                groups[key] = groups.get(key, 0) | bit
+            if code_info['category'] in rules['single_per_category']:
+                groups[code_info['category']] = groups.get(code_info['category'], 0) | bit
+        group_masks = list(groups.values())
+        group_masks.extend(sum(1 << self.index[cpt_code] for cpt_code in set(group)) for group in rules['conflict_groups'])
+        group_masks.extend(sum(1 << self.index[cpt_code] for cpt_code in {cpt_code for _, cpt_code in bands})
+                           for _, _, bands in rules.get('size_bands', ()))
+        for mask in group_masks:
+            for index in range(len(self.index)):
+                if mask >> index & 1:
+                    self.conflicts[index] |= mask & ~(1 << index)
+        
+        for major, minors in rules['bundles']:
+            for minor in minors:
+                self.bundled_by[self.index[minor]] |= 1 << self.index[major]
+
+    def apply(self, codes: List[CPTCode]) -> List[CPTCode]:
+        """
+        Resolve bundles and conflicts among found codes
+        
+        Args:
+            codes: Codes that cleared their thresholds
             
-            # Emergency Procedures (Additional)
-            "43752": {
-                "description": "Naso- or oro-gastric tube placement, requiring physician's skill",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["ng tube", "nasogastric", "orogastric", "gastric tube"],
-                "patterns": [r"(?i)ng\s+tube", r"(?i)nasogastric.*tube", r"(?i)orogastric.*tube", r"(?i)gastric\s+tube.*plac"]
-            },
-            "43753": {
-                "description": "Gastric intubation and aspiration, therapeutic, necessitating physician's skill",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["gastric lavage", "stomach pump", "gastric aspiration"],
-                "patterns": [r"(?i)gastric\s+lavage", r"(?i)stomach\s+pump", r"(?i)gastric.*aspiration", r"(?i)lavage.*gastric"]
-            },
-            "31720": {
-                "description": "Aspiration of trachea, nasotracheal",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["tracheal aspiration", "nasotracheal", "suctioning"],
-                "patterns": [r"(?i)tracheal\s+aspiration", r"(?i)nasotracheal.*aspiration", r"(?i)suction.*trachea"]
-            },
-            "32554": {
-                "description": "Thoracentesis, needle or catheter, aspiration of the pleural space",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["thoracentesis", "pleural tap", "chest tap", "pleural aspiration"],
-                "patterns": [r"(?i)thoracentesis", r"(?i)pleural\s+tap", r"(?i)chest\s+tap", r"(?i)pleural.*aspiration"]
-            },
-            "32555": {
-                "description": "Thoracentesis, needle or catheter, aspiration of the pleural space; with imaging guidance",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["thoracentesis", "imaging guidance", "ultrasound guided"],
-                "patterns": [r"(?i)thoracentesis.*(?:imaging|ultrasound|guided)", r"(?i)(?:ultrasound|imaging).*thoracentesis"]
-            },
-            "36430": {
-                "description": "Transfusion, blood or blood components",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["transfusion", "blood transfusion", "prbc", "packed red blood cells"],
-                "patterns": [r"(?i)transfusion", r"(?i)blood.*transfusion", r"(?i)prbc.*transfusion", r"(?i)packed.*red.*blood"]
-            },
-            "49084": {
-                "description": "Peritoneal lavage",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["peritoneal lavage", "dpl", "diagnostic peritoneal lavage"],
-                "patterns": [r"(?i)peritoneal\s+lavage", r"(?i)\bdpl\b", r"(?i)diagnostic.*peritoneal.*lavage"]
-            },
-            "54150": {
-                "description": "Circumcision, using clamp or other device; newborn",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["circumcision", "newborn", "clamp"],
-                "patterns": [r"(?i)circumcision.*newborn", r"(?i)newborn.*circumcision", r"(?i)circumcision.*clamp"]
-            },
-            "57452": {
-                "description": "Colposcopy of the cervix including upper/adjacent vagina",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["colposcopy", "cervix", "vaginal examination"],
-                "patterns": [r"(?i)colposcopy", r"(?i)cervix.*colposcopy", r"(?i)colposcopy.*cervix"]
-            },
-            "59400": {
-                "description": "Routine obstetric care including antepartum care, vaginal delivery and postpartum care",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["delivery", "vaginal delivery", "obstetric care", "childbirth"],
-                "patterns": [r"(?i)vaginal\s+delivery", r"(?i)delivery.*vaginal", r"(?i)obstetric.*care.*delivery", r"(?i)childbirth"]
-            },
-            "59409": {
-                "description": "Vaginal delivery only",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["vaginal delivery", "delivery only", "birth"],
-                "patterns": [r"(?i)vaginal\s+delivery\s+only", r"(?i)delivery.*only.*vaginal", r"(?i)birth.*vaginal"]
-            },
-            "59514": {
-                "description": "Cesarean delivery only",
-                "category": ProcedureCategory.PROCEDURES,
-                "keywords": ["cesarean", "c-section", "cesarean delivery", "surgical delivery"],
-                "patterns": [r"(?i)cesarean", r"(?i)c.section", r"(?i)surgical\s+delivery", r"(?i)cesarean.*delivery"]
+        Returns:
+            Surviving codes, most confident first; ties keep their input order
+        """
+        index = self.index
+        present = 0
+        for code in codes:
+            present |= 1 << index[code.code]
+        
+        kept = []
+        kept_mask = 0
+        for code in sorted(codes, key=lambda x: x.confidence, reverse=True):
+            position = index[code.code]
+            if self.bundled_by[position] & present or self.conflicts[position] & kept_mask:
+                continue
+            kept.append(code)
+            kept_mask |= 1 << position
+        return kept
+
+class WoundMeasurer:
+    """
+    Single-pass extractor of repaired wound lengths for size-banded repair codes.
+
+    The cleaned note is tokenized once into section headers, lengths,
+    anatomic sites, repair types, wound words, closure words and sentence
+    ends. Only lengths of a wound are measured: a wound word ("laceration",
+    "wound", "repair") must follow the length within a few words, or precede
+    it in its sentence without belonging to an earlier length, so "180 cm
+    tall" or "3 cm abscess" are ignored; lengths listed with "and" share
+    their wound word. Each length belongs to the nearest site in its
+    sentence (or in the note, if its sentence names none). Within a section
+    every length counts; a wound restated in several sections (history,
+    exam, procedure) is counted once: per site group, the lengths of the
+    note are the multiset union of each section's lengths. Lengths are then
+    summed per repair code family - repair type plus the sites that family
+    covers - as the same-location combination rule requires, and each total
+    is mapped to its size band by bisecting the family's sorted band limits.
+
+    The repair type of a wound is the most complex type named right before
+    a closure word ("simple repair", "intermediate layered closure") in a
+    sentence naming its site, or anywhere in the note; without one, a note
+    that mentions closure at all is taken as a simple repair.
+    """
+
+    # Anatomic site words and the site group (as used by the repair code families) they belong to
+    SITE_GROUPS = {
+        'face': ('face', 'facial', 'forehead', 'cheek', 'chin', 'lip', 'nose', 'nasal', 'ear', 'eyelid',
+                 'eyebrow', 'brow', 'mouth', 'mucosa'),
+        'neck_hands_feet': ('neck', 'hand', 'palm', 'finger', 'thumb', 'foot', 'feet', 'toe', 'heel', 'genitalia'),
+        'scalp_trunk_extremities': ('scalp', 'trunk', 'chest', 'abdomen', 'flank', 'axilla', 'shoulder', 'arm',
+                                    'forearm', 'elbow', 'wrist', 'leg', 'thigh', 'knee', 'shin', 'calf', 'ankle',
+                                    'buttock', 'extremity')
+    }
+
+    # Repair types, least to most complex, and the words naming them
+    REPAIR_TYPES = {'simple': 'simple', 'superficial': 'simple', 'intermediate': 'intermediate',
+                    'layered': 'intermediate', 'complex': 'complex'}
+    REPAIR_ORDER = ('simple', 'intermediate', 'complex')
+
+    # Closure words; notes without any are not measured at all
+    CLOSURE_WORDS = ('repair', 'sutur', 'staple', 'closure', 'dermabond', 'steri')
+
+    # Words naming a wound; closure words starting with a WOUND_CLOSURES prefix name one too
+    WOUND_WORDS = ('laceration', 'lac', 'wound', 'avulsion')
+    WOUND_CLOSURES = ('repair', 'closure')
+
+    # Most words between a length and the wound word after it ("2 cm linear
+    # superficial laceration") or before it ("laceration of the left forearm measuring 3 cm")
+    WORDS_BEFORE_WOUND = 3
+    WORDS_AFTER_WOUND = 6
+
+    TOKENS = re.compile(
+        r'(?P<length>\d+(?:\.\d+)?)\s*(?P<unit>cm|mm|centimeters?|millimeters?)\b'
+        r'|\b(?:(?P<repair>' + _trie_regex(sorted(REPAIR_TYPES)) + r')\b'
+        r'|(?P<site>' + _trie_regex(sorted(site for sites in SITE_GROUPS.values() for site in sites)) + r')(?:e?s)?\b'
+        r'|(?P<wound>' + _trie_regex(sorted(WOUND_WORDS)) + r')s?\b'
+        r'|(?P<closure>' + _trie_regex(sorted(CLOSURE_WORDS)) + r')\w*)'
+        r'|(?P<end>[.;:](?=\s|$))'
+    )
+
+    def __init__(self, size_bands: Tuple[Tuple[str, Tuple[str, ...], Tuple[Tuple[float, str], ...]], ...],
+                 sections: Iterable[str] = None):
+        """
+        Args:
+            size_bands: (repair type, site groups, ((upper limit in cm, code), ...)) per repair code family
+            sections: Section header names that separate restatements of a wound (default: NOTE_SECTIONS)
+        """
+        # Headers as they appear in cleaned notes ("physical exam:"), longest first
+        names = sorted({' '.join(name.lower().split()) for name in (NOTE_SECTIONS if sections is None else sections)},
+                       key=len, reverse=True)
+        headers = '|'.join(re.escape(name) for name in names)
+        self.tokens = re.compile(rf'\b(?P<header>{headers})\s*:|{self.TOKENS.pattern}' if names else self.TOKENS.pattern)
+        
+        # (repair type, site group) -> family index, and each family's band limits and codes
+        self.families: Dict[Tuple[str, str], int] = {}
+        self.limits: List[List[float]] = []
+        self.band_codes: List[List[str]] = []
+        for family, (repair, sites, bands) in enumerate(size_bands):
+            for site_group in sites:
+                self.families[(repair, site_group)] = family
+            self.limits.append([limit for limit, _ in bands])
+            self.band_codes.append([cpt_code for _, cpt_code in bands])
+        self.codes = frozenset(cpt_code for codes in self.band_codes for cpt_code in codes)
+        self.site_group = {site: group for group, sites in self.SITE_GROUPS.items() for site in sites}
+
+    def measure(self, text: str) -> List[Tuple[str, float, bool]]:
+        """
+        Size-banded repair codes for a cleaned note
+        
+        Returns:
+            (code, total length in cm, repair type stated explicitly) per repaired code
+            family with measured wounds - the code is None when the catalog has no
+            band for the family or total - or an empty list if no measured wound
+            was repaired
+        """
+        if not ('cm' in text or 'mm' in text) or not any(word in text for word in self.CLOSURE_WORDS):
+            return []
+        
+        # Sentences as (section, lengths with start/end offsets, wound word offsets,
+        # sites with positions, explicit repair types)
+        sentences = []
+        section = 0
+        lengths, mentions, sites, repairs, pending = [], [], [], set(), []
+        closure = False
+        for token in self.tokens.finditer(text):
+            kind = token.lastgroup
+            if kind == 'unit':
+                value = float(token.group('length'))
+                lengths.append((token.start(), token.end(), value / 10 if token.group('unit').startswith('m') else value))
+            elif kind == 'site':
+                sites.append((token.start(), self.site_group[token.group('site')]))
+            elif kind == 'wound':
+                mentions.append((token.start(), token.end()))
+            elif kind == 'repair':
+                pending.append(self.REPAIR_TYPES[token.group('repair')])
+                continue
+            elif kind == 'closure':
+                closure = True
+                repairs.update(pending)
+                if token.group().startswith(self.WOUND_CLOSURES):
+                    mentions.append((token.start(), token.end()))
+            else:
+                sentences.append((section, lengths, mentions, sites, repairs))
+                lengths, mentions, sites, repairs = [], [], [], set()
+                section += kind == 'header'
+            pending = []
+        sentences.append((section, lengths, mentions, sites, repairs))
+        if not closure:
+            return []
+        
+        # Lengths per site group: summed within a section, multiset union over sections
+        all_sites = [site for *_, sentence_sites, _ in sentences for site in sentence_sites]
+        section_counts: Dict[int, Dict[Tuple[str, float], int]] = {}
+        for sentence_section, sentence_lengths, sentence_mentions, sentence_sites, _ in sentences:
+            counts = section_counts.setdefault(sentence_section, {})
+            of_wound = self._of_wound(text, sentence_lengths, sentence_mentions)
+            for index, (position, _, value) in enumerate(sentence_lengths):
+                if not of_wound[index]:
+                    continue
+                # "3 cm laceration to the hand": the first site before the next length,
+                # else the nearest site in the sentence or, failing that, the note
+                limit = sentence_lengths[index + 1][0] if index + 1 < len(sentence_lengths) else len(text)
+                following = [site for site in sentence_sites if position < site[0] < limit]
+                candidates = following[:1] or sentence_sites or all_sites
+                if not candidates:
+                    continue
+                group = min(candidates, key=lambda site: abs(site[0] - position))[1]
+                counts[(group, value)] = counts.get((group, value), 0) + 1
+        wounds: Dict[str, Dict[float, int]] = {}
+        for counts in section_counts.values():
+            for (group, value), count in counts.items():
+                group_wounds = wounds.setdefault(group, {})
+                group_wounds[value] = max(group_wounds.get(value, 0), count)
+        
+        # Most complex explicit repair per site group, falling back to the note's
+        note_repairs = set().union(*(sentence_repairs for *_, sentence_repairs in sentences))
+        group_repairs: Dict[str, Set[str]] = {}
+        for *_, sentence_sites, sentence_repairs in sentences:
+            if sentence_repairs:
+                for _, group in sentence_sites:
+                    group_repairs.setdefault(group, set()).update(sentence_repairs)
+        
+        # Families are keyed by index, or by (repair, site group) when the catalog has none
+        totals: Dict[object, List] = {}
+        for group, group_wounds in wounds.items():
+            stated = group_repairs.get(group) or note_repairs
+            repair = max(stated, key=self.REPAIR_ORDER.index) if stated else 'simple'
+            family = self.families.get((repair, group), (repair, group))
+            total = totals.setdefault(family, [0.0, True])
+            total[0] += sum(value * count for value, count in group_wounds.items())
+            total[1] = total[1] and bool(stated)
+        
+        measured = []
+        for family, (length, explicit) in totals.items():
+            cpt_code = None
+            if isinstance(family, int) and length > 0:
+                band = bisect_left(self.limits[family], round(length, 2))
+                if band < len(self.limits[family]):
+                    cpt_code = self.band_codes[family][band]
+            measured.append((cpt_code, length, explicit))
+        return measured
+
+    def _of_wound(self, text: str, lengths: List[Tuple[int, int, float]], mentions: List[Tuple[int, int]]) -> List[bool]:
+        """Whether each length of a sentence measures a wound named by one of its wound words"""
+        of_wound = []
+        claimed = -1
+        for index, (start, end, _) in enumerate(lengths):
+            following = lengths[index + 1][0] if index + 1 < len(lengths) else len(text)
+            previous = lengths[index - 1][1] if index else 0
+            after = next((mention for mention in mentions if end <= mention[0] < following), None)
+            if after is not None and len(text[end:after[0]].split()) <= self.WORDS_BEFORE_WOUND:
+                of_wound.append(True)
+                claimed = after[1]
+                continue
+            # A wound word between two lengths that names the earlier one is not this one's
+            before = [mention for mention in mentions if max(previous, claimed) <= mention[0] and mention[1] <= start]
+            of_wound.append(bool(before) and len(text[before[-1][1]:start].split()) <= self.WORDS_AFTER_WOUND)
+        
+        # "2 cm and 3 cm lacerations", "lacerations of 2 cm and 3 cm": a list shares its wound word
+        first = 0
+        for index in range(1, len(lengths) + 1):
+            if index < len(lengths) and text[lengths[index - 1][1]:lengths[index][0]].replace(',', ' ').split() in ([], ['and']):
+                continue
+            if any(of_wound[first:index]):
+                of_wound[first:index] = [True] * (index - first)
+            first = index
+        return of_wound
+
+# Section headers recognized in notes, besides those named by a catalog's section policy
+NOTE_SECTIONS = (
+    'CHIEF COMPLAINT', 'HISTORY', 'HISTORY OF PRESENT ILLNESS', 'HPI', 'PAST MEDICAL HISTORY',
+    'REVIEW OF SYSTEMS', 'ROS', 'MEDICATIONS', 'ALLERGIES', 'PHYSICAL EXAM', 'PHYSICAL EXAMINATION',
+    'ED COURSE', 'MEDICAL DECISION MAKING', 'MDM', 'ASSESSMENT', 'PLAN', 'ASSESSMENT AND PLAN',
+    'IMPRESSION', 'DIAGNOSIS', 'PROCEDURE', 'PROCEDURES', 'PROCEDURE NOTE', 'DISPOSITION'
+)
+
+class SectionSplitter:
+    """
+    Splits a raw note into its header-labelled sections in one regex pass.
+
+    A header is a known section name at the start of a line followed by a
+    colon ("PROCEDURES:", "Physical Exam:"). Unknown labels such as "EKG:"
+    stay part of the section they appear in, and text before the first
+    header belongs to no section.
+    """
+
+    def __init__(self, names: Iterable[str]):
+        # Longer names first, so "HISTORY OF PRESENT ILLNESS" is not cut short at "HISTORY"
+        names = sorted({' '.join(name.upper().split()) for name in names}, key=len, reverse=True)
+        alternatives = '|'.join(r'[ \t]+'.join(re.escape(word) for word in name.split()) for name in names)
+        self.header = re.compile(rf'^[ \t]*({alternatives})[ \t]*:', re.MULTILINE | re.IGNORECASE)
+
+    def split(self, text: str) -> List[Tuple[str, str]]:
+        """
+        Returns:
+            (section name, body) of each section in note order, names upper-cased
+            with single spaces; empty when the note has no section headers
+        """
+        sections = []
+        name = None
+        start = 0
+        for header in self.header.finditer(text):
+            if name is not None:
+                sections.append((name, text[start:header.start()]))
+            name = ' '.join(header.group(1).upper().split())
+            start = header.end()
+        if name is not None:
+            sections.append((name, text[start:]))
+        return sections
+
+class CompiledCatalog:
+    """
+    Matcher state for a catalog: the merged pattern matcher, the keyword
+    automaton and each code's pattern ids.
+
+    Nothing is built until the first extraction (or an explicit `compile()`),
+    and individual regexes are only compiled when a note first needs them.
+    One instance per catalog content, match window and matcher backend is
+    shared by every extractor in the process through `shared()`.
+
+    With a cache_dir the built state is also pickled there, keyed by the
+    catalog digest, so later processes load it instead of recompiling. Only
+    point cache_dir at a directory you trust: the cache is loaded with pickle.
+    """
+
+    # Bump whenever the pickled matcher state changes shape
+    CACHE_FORMAT = 5
+
+    _shared: Dict[Tuple[str, int, str, str], 'CompiledCatalog'] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, source: CatalogSource, match_window: int = None, cache_dir: str = None,
+                 backend: str = 're'):
+        _backend_compiler(backend)
+        self.source = source
+        self.catalog = source.codes
+        self.match_window = match_window
+        self.cache_dir = cache_dir
+        self.backend = backend
+        self.compile_seconds: float = None
+        self.cache_hit = False
+        self._lock = threading.Lock()
+        self._compiled = False
+        self._matrices = None
+        self._rule_table: RuleTable = None
+        self._wound_measurer: WoundMeasurer = None
+        self._scopes: Tuple = None
+
+    @classmethod
+    def shared(cls, source: CatalogSource, match_window: int = None, cache_dir: str = None,
+               backend: str = 're') -> 'CompiledCatalog':
+        """The process-wide compiled state for this catalog content, match_window and backend"""
+        key = (source.digest, match_window, cache_dir, backend)
+        with cls._shared_lock:
+            compiled = cls._shared.get(key)
+            if compiled is None:
+                compiled = cls._shared[key] = cls(source, match_window, cache_dir, backend)
+            return compiled
+
+    @classmethod
+    def discard(cls, compiled: 'CompiledCatalog'):
+        """Stop sharing a superseded catalog; extractors still holding it are unaffected"""
+        with cls._shared_lock:
+            cls._shared.pop((compiled.source.digest, compiled.match_window, compiled.cache_dir, compiled.backend), None)
+
+    @property
+    def cache_path(self) -> str:
+        key = f"{self.source.digest}:{self.match_window}:{self.backend}:{self.CACHE_FORMAT}:{sys.version_info[:2]}"
+        return os.path.join(self.cache_dir, f"catalog-{hashlib.sha256(key.encode()).hexdigest()[:32]}.pickle")
+
+    def compile(self) -> 'CompiledCatalog':
+        """Build (or load from the cache) the matcher state if it is not ready yet"""
+        if self._compiled:
+            return self
+        with self._lock:
+            if not self._compiled:
+                started = time.perf_counter()
+                if not (self.cache_dir and self._load_cache()):
+                    self._build()
+                    if self.cache_dir:
+                        self._store_cache()
+                self.compile_seconds = time.perf_counter() - started
+                self._compiled = True
+        return self
+
+    def _build(self):
+        self.pattern_matcher = PatternMatcher(
+            [pattern for code_info in self.catalog.values() for pattern in code_info['patterns']],
+            window=self.match_window, backend=self.backend
+        )
+        self.pattern_ids: Dict[str, Tuple[int, ...]] = {
+            cpt_code: tuple(self.pattern_matcher.ids[pattern] for pattern in code_info['patterns'])
+            for cpt_code, code_info in self.catalog.items()
+        }
+        self.keyword_automaton = KeywordAutomaton(
+            {cpt_code: code_info['keywords'] for cpt_code, code_info in self.catalog.items()}
+        )
+        
+        # Inverted index from pattern id to the codes using it (once per use), and
+        # each code's catalog position so candidates can be scored in catalog order
+        pattern_codes: Dict[int, List[str]] = {}
+        for cpt_code, pattern_ids in self.pattern_ids.items():
+            for pattern_id in pattern_ids:
+                pattern_codes.setdefault(pattern_id, []).append(cpt_code)
+        self.pattern_codes: Dict[int, Tuple[str, ...]] = {
+            pattern_id: tuple(codes) for pattern_id, codes in pattern_codes.items()
+        }
+        self.code_rank: Dict[str, int] = {cpt_code: rank for rank, cpt_code in enumerate(self.catalog)}
+
+    @property
+    def rule_table(self) -> RuleTable:
+        """The catalog's business rules, compiled on first use"""
+        if self._rule_table is None:
+            self._rule_table = RuleTable(self.catalog, self.source.rules or _parse_rules(DEFAULT_RULES, self.catalog))
+        return self._rule_table
+
+    @property
+    def wound_measurer(self) -> WoundMeasurer:
+        """Measurement extractor for the catalog's size-banded repair codes, built on first use"""
+        if self._wound_measurer is None:
+            policy = dict((self.source.rules or _parse_rules(DEFAULT_RULES, self.catalog))['section_policy'])
+            self._wound_measurer = WoundMeasurer((self.source.rules or {}).get('size_bands', ()),
+                                                 NOTE_SECTIONS + tuple(name for sections in policy.values() for name in sections))
+        return self._wound_measurer
+
+    @property
+    def scopes(self) -> Tuple[Tuple[frozenset, frozenset], ...]:
+        """
+        (section names, codes) of each group of codes matched against the same
+        text, built on first use: first the codes matched against the whole note
+        (section names None), then one group per section set of the catalog's
+        section policy
+        """
+        if self._scopes is None:
+            self._build_scopes()
+        return self._scopes[0]
+
+    @property
+    def code_scope(self) -> Dict[str, int]:
+        """Index into `scopes` of each code's group"""
+        if self._scopes is None:
+            self._build_scopes()
+        return self._scopes[1]
+
+    @property
+    def section_splitter(self) -> SectionSplitter:
+        """Splitter for NOTE_SECTIONS and the sections named by the section policy"""
+        if self._scopes is None:
+            self._build_scopes()
+        return self._scopes[2]
+
+    def scope_matcher(self, scope: int = None) -> PatternMatcher:
+        """Pattern matcher for the codes of a scope (None: the whole catalog)"""
+        if scope is None:
+            return self.pattern_matcher
+        if self._scopes is None:
+            self._build_scopes()
+        return self._scopes[3][scope]
+
+    def _build_scopes(self):
+        self.compile()
+        policy = dict((self.source.rules or _parse_rules(DEFAULT_RULES, self.catalog))['section_policy'])
+        groups: Dict[frozenset, List[str]] = {None: []}
+        for cpt_code, code_info in self.catalog.items():
+            sections = policy.get(code_info['category'])
+            groups.setdefault(None if sections is None else frozenset(sections), []).append(cpt_code)
+        scopes = tuple((sections, frozenset(codes)) for sections, codes in groups.items())
+        code_scope = {cpt_code: scope for scope, (_, codes) in enumerate(scopes) for cpt_code in codes}
+        splitter = SectionSplitter(NOTE_SECTIONS + tuple(name for sections in policy.values() for name in sections))
+        
+        # Each scope's text is only scanned for the pattern anchors of its own codes
+        matchers = tuple(
+            self.pattern_matcher.restricted(pattern_id for cpt_code in codes for pattern_id in self.pattern_ids[cpt_code])
+            for codes in groups.values()
+        ) if len(scopes) > 1 else (self.pattern_matcher,)
+        self._scopes = (scopes, code_scope, splitter, matchers)
+
+    def text_scopes(self, texts: Tuple[str, ...]) -> Dict[str, int]:
+        """Each distinct text of a note's scope texts, with its scope or None if several scopes share it"""
+        if len(texts) == 1:
+            return {texts[0]: None}
+        text_scopes: Dict[str, int] = {}
+        for scope, text in enumerate(texts):
+            text_scopes[text] = scope if text not in text_scopes else None
+        return text_scopes
+
+    def in_scope(self, texts: Tuple[str, ...], hits_of) -> Dict[str, int]:
+        """
+        Per-code hits of a note, each code counted in the text of its own scope
+        
+        Args:
+            texts: The note's text for each of `scopes`
+            hits_of: Called as hits_of(text, scope) for each distinct text (see
+                `text_scopes`); returns per-code hits in that text
+        """
+        if len(texts) == 1:
+            return hits_of(texts[0], None)
+        text_hits = {text: hits_of(text, scope) for text, scope in self.text_scopes(texts).items()}
+        hits: Dict[str, int] = {}
+        for text, (_, codes) in zip(texts, self.scopes):
+            hits.update((cpt_code, count) for cpt_code, count in text_hits[text].items() if cpt_code in codes)
+        return hits
+
+    def pattern_tally(self, pattern_ids: Iterable[int]) -> Dict[str, int]:
+        """Per-code matched pattern counts for a set of pattern ids found by the matcher"""
+        hits: Dict[str, int] = {}
+        for pattern_id in pattern_ids:
+            for cpt_code in self.pattern_codes[pattern_id]:
+                hits[cpt_code] = hits.get(cpt_code, 0) + 1
+        return hits
+
+    def weight_matrices(self) -> Tuple:
+        """
+        Arrays for vectorized scoring, built on first use (requires NumPy)
+        
+        Returns:
+            (keyword -> column index, keyword x code and pattern x code occurrence
+            counts, and each code's keyword and pattern list lengths); codes are
+            columns in catalog order
+        """
+        if self._matrices is None:
+            import numpy as np
+            keyword_index = {keyword: column for column, keyword in enumerate(sorted(self.keyword_automaton.owners))}
+            keyword_codes = np.zeros((len(keyword_index), len(self.catalog)), dtype=np.int64)
+            for keyword, owners in self.keyword_automaton.owners.items():
+                for cpt_code in owners:
+                    keyword_codes[keyword_index[keyword], self.code_rank[cpt_code]] += 1
+            pattern_codes = np.zeros((len(self.pattern_matcher.patterns), len(self.catalog)), dtype=np.int64)
+            for cpt_code, pattern_ids in self.pattern_ids.items():
+                for pattern_id in pattern_ids:
+                    pattern_codes[pattern_id, self.code_rank[cpt_code]] += 1
+            keyword_lengths = np.array([len(code_info['keywords']) for code_info in self.catalog.values()])
+            pattern_lengths = np.array([len(code_info['patterns']) for code_info in self.catalog.values()])
+            self._matrices = (keyword_index, keyword_codes, pattern_codes, keyword_lengths, pattern_lengths)
+        return self._matrices
+
+    def candidates(self, keyword_hits: Dict[str, int], pattern_hits: Dict[str, int]) -> List[str]:
+        """Codes with at least one keyword or pattern hit, in catalog order"""
+        return sorted(set(keyword_hits).union(pattern_hits), key=self.code_rank.__getitem__)
+
+    def _load_cache(self) -> bool:
+        try:
+            with open(self.cache_path, 'rb') as cache_file:
+                (self.pattern_matcher, self.pattern_ids, self.keyword_automaton,
+                 self.pattern_codes, self.code_rank) = pickle.load(cache_file)
+        except Exception:
+            # Missing, stale or corrupt cache entries are simply rebuilt
+            return False
+        self.cache_hit = True
+        return True
+
+    def _store_cache(self):
+        # Write to a temporary file and rename it over the entry, so concurrent
+        # processes never read a partial cache
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            descriptor, temporary_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(descriptor, 'wb') as cache_file:
+                pickle.dump((self.pattern_matcher, self.pattern_ids, self.keyword_automaton,
+                             self.pattern_codes, self.code_rank), cache_file,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_path, self.cache_path)
+        except OSError:
+            pass
+
+class ResultCache:
+    """
+    Memoized extraction results keyed by a fingerprint of the cleaned note.
+
+    An in-process LRU tier holds up to max_entries results. Each result
+    expires ttl seconds after it was computed, or never if ttl is None.
+    With a path the results are also stored in a sqlite database. Every
+    process opening the same path shares it: batch workers, reruns and
+    other services. The database keeps at most max_disk_entries results:
+    when a process opens it, and after every PURGE_INTERVAL results it
+    stores, expired rows and then the oldest-stored rows over the cap are
+    deleted. Counters report hits, misses and the extraction time the hits
+    saved.
+    """
+
+    # Results a process stores in the database between purges
+    PURGE_INTERVAL = 256
+
+    def __init__(self, max_entries: int = 4096, ttl: float = None, path: str = None,
+                 max_disk_entries: int = 1 << 20):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.max_disk_entries = max_disk_entries
+        self._setup()
+
+    def _setup(self):
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self.saved_seconds = 0.0
+        self._stored = 0
+        self._entries: 'OrderedDict[str, Tuple[float, float, tuple]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = None
+        self._connection_pid = None
+
+    # Locks, connections and entries stay in their process; workers start empty
+    def __getstate__(self) -> Dict:
+        return {'max_entries': self.max_entries, 'ttl': self.ttl, 'path': self.path,
+                'max_disk_entries': self.max_disk_entries}
+
+    def __setstate__(self, state: Dict):
+        self.__dict__.update(state)
+        self._setup()
+
+    def _database(self):
+        # sqlite connections must not cross a fork, so each process opens its own
+        if self._connection is None or self._connection_pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS results '
+                               '(key TEXT PRIMARY KEY, stored_at REAL, seconds REAL, value TEXT)')
+            connection.execute('CREATE INDEX IF NOT EXISTS results_stored_at ON results (stored_at)')
+            self._purge(connection)
+            self._connection, self._connection_pid = connection, os.getpid()
+        return self._connection
+
+    def _purge(self, connection):
+        """Delete expired rows, then the oldest rows over max_disk_entries"""
+        if self.ttl is not None:
+            self.disk_evictions += connection.execute(
+                'DELETE FROM results WHERE stored_at < ?', (time.time() - self.ttl,)).rowcount
+        self.disk_evictions += connection.execute(
+            'DELETE FROM results WHERE key IN '
+            '(SELECT key FROM results ORDER BY stored_at DESC LIMIT -1 OFFSET ?)', (self.max_disk_entries,)).rowcount
+        connection.commit()
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl is not None and time.time() - stored_at > self.ttl
+
+    def get(self, key: str):
+        """The cached value for key, or None (counted as a miss)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[0]):
+                del self._entries[key]
+                entry = None
+            if entry is None and self.path:
+                row = self._database().execute(
+                    'SELECT stored_at, seconds, value FROM results WHERE key = ?', (key,)).fetchone()
+                if row is not None and not self._expired(row[0]):
+                    entry = (row[0], row[1], json.loads(row[2]))
+                    self._remember(key, entry)
+                    self.disk_hits += 1
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry[1]
+            return entry[2]
+
+    def put(self, key: str, value, seconds: float = 0.0):
+        """
+        Store a JSON-serializable value for key
+        
+        Args:
+            key: Result fingerprint
+            value: Result to cache
+            seconds: Time it took to compute value, credited to saved_seconds on hits
+        """
+        entry = (time.time(), seconds, value)
+        with self._lock:
+            self._remember(key, entry)
+            if self.path:
+                connection = self._database()
+                connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                                   (key, entry[0], seconds, json.dumps(value)))
+                connection.commit()
+                self._stored += 1
+                if self._stored % self.PURGE_INTERVAL == 0:
+                    self._purge(connection)
+
+    def _remember(self, key: str, entry: Tuple[float, float, object]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters; hit_rate is over all lookups"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'disk_evictions': self.disk_evictions,
+            'entries': len(self._entries),
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'saved_seconds': round(self.saved_seconds, 6)
+        }
+
+class Profiler:
+    """
+    Opt-in timings of the extraction stages and of every catalog regex.
+
+    An extractor given a profiler records the time of each stage of
+    `extract_cpt_codes` (cleaning, keyword scan, bound, pattern matching,
+    confidence scoring, measurements, business rules, and the whole call as
+    'extract') and of `extract_with_details` ('normalize', 'details'), and the pattern
+    matcher reports the calls, time and matches of each regex it runs.
+    Without a profiler none of this is measured. Counts cover extractions in
+    this process (not extract_batch workers or the vectorized, incremental
+    and streaming paths) and are safe to update from several threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget everything recorded so far"""
+        with self._lock:
+            self.stages: Dict[str, List] = {}  # stage -> [calls, seconds]
+            self.patterns: Dict[str, List] = {}  # pattern -> [calls, seconds, matches]
+            self.pattern_codes: Dict[str, Set[str]] = {}
+            self._labelled = None
+
+    def lap(self, stage: str, since: float) -> float:
+        """Record the time from since (a perf_counter reading) to now against stage; returns now"""
+        now = time.perf_counter()
+        with self._lock:
+            timing = self.stages.setdefault(stage, [0, 0.0])
+            timing[0] += 1
+            timing[1] += now - since
+        return now
+
+    def add_patterns(self, patterns: List[str], timings: Mapping[int, List]):
+        """Add a matcher call's [calls, seconds, matches] per pattern id"""
+        with self._lock:
+            for pattern_id, (calls, seconds, matches) in timings.items():
+                timing = self.patterns.setdefault(patterns[pattern_id], [0, 0.0, 0])
+                timing[0] += calls
+                timing[1] += seconds
+                timing[2] += matches
+
+    def label_patterns(self, catalog: CompiledCatalog):
+        """Label patterns with the codes that use them in catalog"""
+        if catalog is self._labelled:
+            return
+        with self._lock:
+            for cpt_code, code_info in catalog.catalog.items():
+                for pattern in code_info['patterns']:
+                    self.pattern_codes.setdefault(pattern, set()).add(cpt_code)
+            self._labelled = catalog
+
+    def snapshot(self) -> Dict:
+        """Copy of the counters: notes, per-stage calls/seconds, per-pattern calls/seconds/matches/codes"""
+        with self._lock:
+            return {
+                'notes': self.stages.get('extract', [0])[0],
+                'stages': {stage: {'calls': calls, 'seconds': seconds} for stage, (calls, seconds) in self.stages.items()},
+                'patterns': {
+                    pattern: {'calls': calls, 'seconds': seconds, 'matches': matches,
+                              'codes': sorted(self.pattern_codes.get(pattern, ()))}
+                    for pattern, (calls, seconds, matches) in self.patterns.items()
+                }
             }
+
+    def slowest_patterns(self, count: int = 10) -> List[Dict]:
+        """The count patterns with the most cumulative time, slowest first, with their mean time per call"""
+        patterns = self.snapshot()['patterns']
+        slowest = heapq.nlargest(count, patterns.items(), key=lambda item: item[1]['seconds'])
+        return [
+            {'pattern': pattern, **timing, 'mean_us': round(timing['seconds'] / timing['calls'] * 1e6, 3)}
+            for pattern, timing in slowest
+        ]
+
+    def openmetrics(self, prefix: str = 'ed_cpt') -> str:
+        """The counters in the OpenMetrics text format (also readable by Prometheus)"""
+        snapshot = self.snapshot()
+        
+        def label(value: str) -> str:
+            return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        
+        lines = [f"# TYPE {prefix}_notes counter", f"# HELP {prefix}_notes Notes extracted while profiling",
+                 f"{prefix}_notes_total {snapshot['notes']}"]
+        families = (
+            ('stage_calls', 'Times each extraction stage ran', 'stages', 'calls'),
+            ('stage_seconds', 'Time spent in each extraction stage', 'stages', 'seconds'),
+            ('pattern_calls', 'Regex runs of each catalog pattern', 'patterns', 'calls'),
+            ('pattern_seconds', 'Time spent running each catalog pattern', 'patterns', 'seconds'),
+            ('pattern_matches', 'Regex runs of each catalog pattern that matched', 'patterns', 'matches')
+        )
+        for name, description, group, field in families:
+            lines += [f"# TYPE {prefix}_{name} counter", f"# HELP {prefix}_{name} {description}"]
+            for key, timing in snapshot[group].items():
+                labels = (f'stage="{label(key)}"' if group == 'stages' else
+                          f'pattern="{label(key)}",codes="{" ".join(timing["codes"])}"')
+                lines.append(f"{prefix}_{name}_total{{{labels}}} {timing[field]}")
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+class SegmentedNote:
+    """
+    A cleaned note split into clauses, with the keyword and pattern hits of each clause.
+
+    In bounded mode no pattern match can leave its clause (for catalogs whose
+    patterns are `clause_local`), so the pattern hits of the note are exactly
+    the union of its clauses' hits. Keywords are plain substrings: those that
+    straddle a clause boundary are found in a window around the boundary just
+    wide enough to hold the longest keyword. Clauses and windows already
+    scanned in a previous note are looked up instead of rescanned.
+    """
+
+    def __init__(self, catalog: CompiledCatalog, text: str, previous: 'SegmentedNote' = None):
+        self.catalog = catalog
+        self.text = text
+        self.rescanned = 0
+        
+        # Clause or boundary window text -> keywords found in it, and clause text -> pattern ids
+        self.keyword_hits: Dict[str, frozenset] = {}
+        self.pattern_hits: Dict[str, frozenset] = {}
+        known_keywords = previous.keyword_hits if previous is not None and previous.catalog is catalog else {}
+        known_patterns = previous.pattern_hits if previous is not None and previous.catalog is catalog else {}
+        
+        automaton = catalog.keyword_automaton
+        reach = automaton.longest - 1
+        keywords: Set[str] = set()
+        patterns: Set[int] = set()
+        start = 0
+        for end in catalog.pattern_matcher.clause_ends(text):
+            clause = text[start:end]
+            spans = [clause]
+            if reach > 0 and end < len(text):
+                spans.append(text[max(end - reach, 0):end + reach])
+            for span in spans:
+                found = self.keyword_hits.get(span)
+                if found is None:
+                    found = known_keywords.get(span)
+                    if found is None:
+                        found = frozenset(automaton.find_keywords(span))
+                    self.keyword_hits[span] = found
+                keywords.update(found)
+            
+            matched = self.pattern_hits.get(clause)
+            if matched is None:
+                matched = known_patterns.get(clause)
+                if matched is None:
+                    matched = frozenset(catalog.pattern_matcher.match_ids(clause))
+                    self.rescanned += 1
+                self.pattern_hits[clause] = matched
+            patterns.update(matched)
+            start = end
+        
+        self.keywords = frozenset(keywords)
+        self.patterns = frozenset(patterns)
+
+class NearDuplicateIndex:
+    """
+    MinHash index of recently extracted notes for finding copy-forward near-duplicates.
+
+    Each cleaned note is reduced to word shingles, sketched with one-permutation
+    MinHash (one hash per shingle, minimum kept per bin) and indexed by
+    locality-sensitive bands of the sketch. A lookup returns the stored value
+    of the most similar recent note whose estimated Jaccard similarity is at
+    least threshold. At most max_notes notes are kept, least recently used
+    first out.
+    """
+
+    # Most-voted candidates whose sketches are compared on a lookup
+    CANDIDATES = 8
+
+    def __init__(self, threshold: float = 0.8, bins: int = 64, bands: int = 16, shingle_words: int = 4,
+                 max_notes: int = 1024):
+        if bins % bands:
+            raise ValueError("bins must be a multiple of bands")
+        self.threshold = threshold
+        self.bins = bins
+        self.bands = bands
+        self.shingle_words = shingle_words
+        self.max_notes = max_notes
+        self.hits = 0
+        self.misses = 0
+        self._notes: 'OrderedDict[int, Tuple[Tuple[int, ...], object]]' = OrderedDict()
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], Set[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def signature(self, text: str) -> Tuple[int, ...]:
+        """One-permutation MinHash sketch of text's word shingles (-1 marks an empty bin)"""
+        words = text.split()
+        width = min(self.shingle_words, len(words)) or 1
+        bins = self.bins
+        sketch = [-1] * bins
+        for start in range(max(len(words) - width + 1, 1)):
+            value = hash(tuple(words[start:start + width])) & 0xFFFFFFFFFFFFFFFF
+            slot, value = value % bins, value // bins
+            if sketch[slot] < 0 or value < sketch[slot]:
+                sketch[slot] = value
+        return tuple(sketch)
+
+    def _bands(self, signature: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+        rows = self.bins // self.bands
+        return [(band, signature[band * rows:(band + 1) * rows]) for band in range(self.bands)]
+
+    def similarity(self, first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+        """Estimated Jaccard similarity of two sketches"""
+        return sum(map(operator.eq, first, second)) / self.bins
+
+    def find(self, signature: Tuple[int, ...]):
+        """Value stored for the most similar indexed note above threshold, or None"""
+        with self._lock:
+            # Notes sharing the most bands are the most similar; only the best few are compared
+            votes: Dict[int, int] = {}
+            for band in self._bands(signature):
+                for note_id in self._buckets.get(band, ()):
+                    votes[note_id] = votes.get(note_id, 0) + 1
+            best, best_similarity = None, self.threshold
+            for note_id in heapq.nlargest(self.CANDIDATES, votes, key=votes.__getitem__):
+                similarity = self.similarity(signature, self._notes[note_id][0])
+                if similarity >= best_similarity:
+                    best, best_similarity = note_id, similarity
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._notes.move_to_end(best)
+            return self._notes[best][1]
+
+    def add(self, signature: Tuple[int, ...], value):
+        """Index a note's sketch with the value to hand back for its near-duplicates"""
+        with self._lock:
+            note_id = self._next_id
+            self._next_id += 1
+            self._notes[note_id] = (signature, value)
+            for band in self._bands(signature):
+                self._buckets.setdefault(band, set()).add(note_id)
+            while len(self._notes) > self.max_notes:
+                old_id, (old_signature, _) = self._notes.popitem(last=False)
+                for band in self._bands(old_signature):
+                    bucket = self._buckets[band]
+                    bucket.discard(old_id)
+                    if not bucket:
+                        del self._buckets[band]
+
+    def stats(self) -> Dict[str, float]:
+        """Lookup counters"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'notes': len(self._notes),
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
         }
+
+class ClauseCounts:
+    """
+    The clauses of a cleaned text with their keyword and pattern hits, kept current across edits.
+
+    Besides the clauses it holds the keyword hits of a window around every
+    clause boundary (see SegmentedNote), and counts of how many of these spans
+    contain each keyword and pattern. `update` keeps the clauses of the
+    unchanged prefix and suffix and only rescans the clauses in between and
+    the boundary windows that reach into them.
+    """
+
+    def __init__(self, catalog: CompiledCatalog):
+        self.catalog = catalog
+        self.clauses: List[str] = []
+        self.ends: List[int] = []
+        self.clause_hits: List[Tuple[frozenset, frozenset]] = []
+        self.window_hits: List[Tuple[str, frozenset]] = []
+        self.keyword_counts: Dict[str, int] = {}
+        self.pattern_counts: Dict[int, int] = {}
+
+    @staticmethod
+    def _count(counts: Dict, items: Iterable, step: int):
+        for item in items:
+            count = counts.get(item, 0) + step
+            if count:
+                counts[item] = count
+            else:
+                del counts[item]
+
+    def update(self, cleaned_text: str) -> int:
+        """Bring the counts up to date with a new version of the text; returns the clauses rescanned"""
+        catalog = self.catalog
+        matcher = catalog.pattern_matcher
+        automaton = catalog.keyword_automaton
+        reach = automaton.longest - 1
+        
+        ends = matcher.clause_ends(cleaned_text)
+        clauses = [cleaned_text[start:end] for start, end in zip([0] + ends[:-1], ends)]
+        old_clauses, old_ends = self.clauses, self.ends
+        
+        # Unchanged leading and trailing clauses
+        limit = min(len(old_clauses), len(clauses))
+        prefix = 0
+        while prefix < limit and old_clauses[prefix] == clauses[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < limit - prefix and old_clauses[-1 - suffix] == clauses[-1 - suffix]:
+            suffix += 1
+        old_stop, stop = len(old_clauses) - suffix, len(clauses) - suffix
+        
+        # Swap the changed clauses, reusing hits of clauses that only moved
+        rescanned = 0
+        known = dict(zip(old_clauses[prefix:old_stop], self.clause_hits[prefix:old_stop]))
+        for keywords, patterns in self.clause_hits[prefix:old_stop]:
+            self._count(self.keyword_counts, keywords, -1)
+            self._count(self.pattern_counts, patterns, -1)
+        added = []
+        for clause in clauses[prefix:stop]:
+            hits = known.get(clause)
+            if hits is None:
+                hits = (frozenset(automaton.find_keywords(clause)), frozenset(matcher.match_ids(clause)))
+                rescanned += 1
+            self._count(self.keyword_counts, hits[0], 1)
+            self._count(self.pattern_counts, hits[1], 1)
+            added.append(hits)
+        self.clause_hits[prefix:old_stop] = added
+        
+        # Boundary windows reaching into the changed span [changed_start, end - suffix length)
+        if reach > 0:
+            changed_start = ends[prefix - 1] if prefix else 0
+            suffix_length = len(cleaned_text) - (ends[stop - 1] if stop else 0)
+            boundaries, old_boundaries = ends[:-1], old_ends[:-1]
+            first = bisect_right(boundaries, changed_start - reach)
+            stop_window = bisect_left(boundaries, len(cleaned_text) - suffix_length + reach)
+            old_stop_window = bisect_left(old_boundaries, (old_ends[-1] if old_ends else 0) - suffix_length + reach)
+            known_windows = dict(self.window_hits[first:old_stop_window])
+            for _, keywords in self.window_hits[first:old_stop_window]:
+                self._count(self.keyword_counts, keywords, -1)
+            windows = []
+            for end in boundaries[first:stop_window]:
+                window = cleaned_text[max(end - reach, 0):end + reach]
+                keywords = known_windows.get(window)
+                if keywords is None:
+                    keywords = frozenset(automaton.find_keywords(window))
+                self._count(self.keyword_counts, keywords, 1)
+                windows.append((window, keywords))
+            self.window_hits[first:old_stop_window] = windows
+        
+        self.clauses, self.ends = clauses, ends
+        return rescanned
+
+class IncrementalNote:
+    """
+    A note being edited live (charting, addenda) whose codes are kept current incrementally.
+
+    The note is held as the ClauseCounts of its cleaned text for each section
+    scope. An edit re-cleans and re-splits the text (both in the regex
+    engine) and only rescans the clauses it changed. Codes are rescored from
+    the counts and the business rules rerun, so an update costs roughly the
+    size of the edit.
+
+    This requires bounded mode with clause-local patterns; otherwise every
+    edit falls back to a full `extract_cpt_codes`.
+    """
+
+    def __init__(self, extractor: 'EDCPTExtractor', text: str = ''):
+        self.extractor = extractor
+        self.text = ''
+        self.codes: List[CPTCode] = []
+        self.rescanned = 0
+        self._catalog: CompiledCatalog = None
+        self.replace(text)
+
+    def append(self, text: str, separator: str = '\n') -> List[CPTCode]:
+        """Append text (e.g. an addendum) to the note and return the updated codes"""
+        return self.replace(self.text + separator + text if self.text else text)
+
+    def edit(self, start: int, end: int, replacement: str) -> List[CPTCode]:
+        """Replace text[start:end] of the raw note and return the updated codes"""
+        return self.replace(self.text[:start] + replacement + self.text[end:])
+
+    def replace(self, text: str) -> List[CPTCode]:
+        """Set the whole note text and return the updated codes"""
+        extractor = self.extractor
+        catalog = extractor._catalog.compile()
+        self.text = text
+        if not catalog.pattern_matcher.clause_local:
+            self.codes = extractor.extract_cpt_codes(text)
+            return self.codes
+        
+        if catalog is not self._catalog:
+            # New note or reloaded catalog: nothing can be reused
+            self._catalog = catalog
+            self._counts = [ClauseCounts(catalog) for _ in catalog.scopes]
+        
+        # Scopes sharing a text (e.g. in notes without sections) share the counts of the first
+        texts = extractor._clean_note(extractor.normalize(text), catalog)
+        current: Dict[str, ClauseCounts] = {}
+        self.rescanned = 0
+        for cleaned_text, counts in zip(texts, self._counts):
+            if cleaned_text not in current:
+                self.rescanned += counts.update(cleaned_text)
+                current[cleaned_text] = counts
+        keyword_hits = catalog.in_scope(texts, lambda text, _: catalog.keyword_automaton.tally(current[text].keyword_counts))
+        pattern_hits = catalog.in_scope(texts, lambda text, _: catalog.pattern_tally(current[text].pattern_counts))
+        self.codes = extractor._score_codes(texts, catalog, keyword_hits, pattern_hits)
+        return self.codes
+
+class ClauseStream:
+    """
+    Keyword and pattern hits of a cleaned text that arrives piece by piece.
+
+    The text is cut into clauses exactly where SegmentedNote cuts a whole note
+    (a boundary counts once the character after it has arrived). Each
+    complete clause is matched on its own and dropped, and boundary-straddling
+    keywords are found in a window of the longest keyword's reach on either
+    side, so in bounded mode the hits equal those of the whole text. Only the
+    open clause and the last window are held, plus a small cache of recent
+    clauses (documents that copy text forward repeat them). A clause longer
+    than max_clause characters is cut there; that is the one case where hits
+    can differ from matching the whole text.
+
+    With a measurer, wound measurements are taken per segment of whole
+    clauses of about segment characters.
+    """
+
+    # Recent clauses whose hits are remembered
+    CACHED_CLAUSES = 4096
+
+    def __init__(self, catalog: CompiledCatalog, matcher: PatternMatcher, max_clause: int = 1 << 16,
+                 measurer: WoundMeasurer = None, segment: int = 1 << 14):
+        self.automaton = catalog.keyword_automaton
+        self.matcher = matcher
+        self.max_clause = max_clause
+        self.measurer = measurer
+        self.segment = segment
+        self.keywords: Set[str] = set()
+        self.patterns: Set[int] = set()
+        self.measured: List[Tuple[str, float, bool]] = []
+        self.length = 0
+        self.clauses = 0
+        self.peak_held = 0
+        self._reach = self.automaton.longest - 1
+        
+        # Held text starts at absolute offset _base; the open clause starts at
+        # _start, and boundaries in _windows still wait for their right context
+        self._text = ''
+        self._base = 0
+        self._start = 0
+        self._scanned = 0
+        self._windows: deque = deque()
+        self._seen: OrderedDict = OrderedDict()
+        self._pending: List[str] = []
+        self._pending_length = 0
+
+    def feed(self, text: str):
+        """Append cleaned text"""
+        self._text += text
+        self.length += len(text)
+        boundaries = [
+            self._base + boundary.end()
+            for boundary in PatternMatcher.CLAUSE_BOUNDARY.finditer(self._text, max(self._scanned, self._start) - self._base)
+            # A boundary at the very end still needs the next character
+            if boundary.end() < len(self._text)
+        ]
+        for end in boundaries:
+            self._close_clause(end)
+        if self.length - self._start > self.max_clause:
+            self._close_clause(self.length)
+        self._scanned = max(self.length - 1, 0)
+        self._find_windows(self.length)
+        self.peak_held = max(self.peak_held, len(self._text))
+        
+        # Drop text no clause or window needs any more
+        keep = max(min(self._start, self._windows[0] if self._windows else self._start) - self._reach, 0)
+        if keep - self._base > len(self._text) // 2:
+            self._text = self._text[keep - self._base:]
+            self._base = keep
+
+    def close(self):
+        """Match the last clause and the remaining windows; the hits are final afterwards"""
+        self._close_clause(self.length, last=True)
+        self._find_windows(None)
+        if self.measurer is not None and self._pending:
+            self.measured.extend(self.measurer.measure(''.join(self._pending)))
+            self._pending = []
+
+    def _close_clause(self, end: int, last: bool = False):
+        clause = self._text[self._start - self._base:end - self._base]
+        if clause or last:
+            hits = self._seen.get(clause)
+            if hits is None:
+                hits = self._seen[clause] = (frozenset(self.automaton.find_keywords(clause)),
+                                             frozenset(self.matcher.match_ids(clause)))
+                if len(self._seen) > self.CACHED_CLAUSES:
+                    self._seen.popitem(last=False)
+            self.keywords.update(hits[0])
+            self.patterns.update(hits[1])
+            self.clauses += 1
+        if not last and self._reach > 0:
+            self._windows.append(end)
+        self._start = end
+        
+        if self.measurer is not None:
+            self._pending.append(clause)
+            self._pending_length += len(clause)
+            if self._pending_length >= self.segment and not last:
+                self.measured.extend(self.measurer.measure(''.join(self._pending)))
+                self._pending = []
+                self._pending_length = 0
+
+    def _find_windows(self, available: int):
+        """Scan the windows whose right context has arrived (all of them when available is None)"""
+        while self._windows and (available is None or self._windows[0] + self._reach <= available):
+            end = self._windows.popleft()
+            window = self._text[max(end - self._reach, 0) - self._base:end + self._reach - self._base]
+            self.keywords.update(self.automaton.find_keywords(window))
+
+class CleanedStream:
+    """
+    Cleans raw text arriving in pieces that end at whitespace, exactly as
+    NormalizedNote cleans it in one piece, and feeds it to a ClauseStream.
+
+    Spaces are held back until more text follows, so the cleaned text is
+    stripped at both ends; `restart` begins a new, separately stripped text.
+    """
+
+    def __init__(self, clauses: ClauseStream):
+        self.clauses = clauses
+        self.restart()
+
+    def restart(self):
+        self._words = False
+        self._emitted = False
+        self._held = 0
+
+    def feed(self, raw: str):
+        words = raw.lower().split()
+        if not words:
+            return
+        piece = _spaced(' '.join(words))
+        if self._words:
+            piece = ' ' + piece
+        self._words = True
+        body = piece.rstrip(' ')
+        if not body:
+            self._held += len(piece)
+            return
+        body = ' ' * self._held + body if self._emitted else body.lstrip(' ')
+        self._held = len(piece) - len(piece.rstrip(' '))
+        self._emitted = True
+        self.clauses.feed(body)
+
+def _text_pieces(chunks: Iterable[str], limit: int) -> Iterator[Tuple[str, bool]]:
+    """
+    Re-cut text chunks into lines, yielded as (piece, starts a line)
+    
+    Lines longer than limit are split at their last whitespace before it
+    (anywhere, if they have none), so no piece holds more than limit characters
+    beyond the chunk being read.
+    """
+    buffer = ''
+    line_start = True
+    for chunk in chunks:
+        buffer += chunk
+        position = 0
+        while True:
+            newline = buffer.find('\n', position)
+            if newline >= 0:
+                yield buffer[position:newline + 1], line_start
+                position = newline + 1
+                line_start = True
+                continue
+            if len(buffer) - position > limit:
+                cut = next((index + 1 for index in range(position + limit - 1, position, -1) if buffer[index].isspace()),
+                           position + limit)
+                yield buffer[position:cut], line_start
+                position = cut
+                line_start = False
+                continue
+            break
+        buffer = buffer[position:]
+    if buffer:
+        yield buffer, line_start
+
+class EDCPTExtractor:
+    # Serializes catalog reloads; extractions never wait on it
+    _reload_lock = threading.Lock()
+    
+    # Confidence weights of the keyword and pattern scores
+    KEYWORD_WEIGHT = 0.6
+    PATTERN_WEIGHT = 0.4
+    
+    # Confidence a code must exceed to be extracted, and that non-E&M codes
+    # must exceed to survive the business rules
+    INCLUSION_THRESHOLD = 0.3
+    PROCEDURE_THRESHOLD = 0.5
+    
+    # Confidence of size-banded repair codes picked from measured wound lengths,
+    # with the repair type stated in the note or assumed to be simple
+    MEASURED_CONFIDENCE = 0.9
+    ASSUMED_REPAIR_CONFIDENCE = 0.7
+    
+    # Gap bound of the clause-local matching used to stream documents without a match_window
+    STREAM_WINDOW = 200
+    
+    def __init__(self, match_window: int = None, catalog_path: str = None, cache_dir: str = None,
+                 result_cache: ResultCache = None, near_duplicates: NearDuplicateIndex = None,
+                 profiler: Profiler = None, pattern_policy: str = 'bound', matcher_backend: str = 're'):
+        """
+        Args:
+            match_window: Enables bounded matching: patterns only match inside a single
+                sentence/clause and each `.*` gap spans at most this many characters.
+                Default (None) matches across the whole note.
+            catalog_path: Versioned catalog file (JSON/YAML); defaults to the bundled cpt_catalog.json
+            cache_dir: Directory for the on-disk compiled catalog cache (disabled by default)
+            result_cache: Memoizes extracted codes per cleaned note and catalog (disabled by default)
+            near_duplicates: Reuses the clause hits of similar recent notes; only takes
+                effect in bounded mode (match_window), where matches cannot leave a clause
+            profiler: Records per-stage and per-pattern timings (disabled by default)
+            pattern_policy: Guard against catalog patterns with super-linear worst
+                cases when the catalog is loaded (see `load_catalog`): 'bound'
+                (default) limits their `.*` gaps, 'reject' refuses the catalog and
+                None runs them as written
+            matcher_backend: Regex backend the catalog patterns run on: 're' (default),
+                or 'dfa' for linear-time scans (see MATCHER_BACKENDS)
+        """
+        self.match_window = match_window
+        self.catalog_path = catalog_path
+        self.cache_dir = cache_dir
+        self.result_cache = result_cache
+        self.near_duplicates = near_duplicates
+        self.profiler = profiler
+        self.pattern_policy = pattern_policy
+        self.matcher_backend = matcher_backend
+        
+        # Shared read-only catalog; its matcher state is compiled lazily, once per process
+        self._catalog = CompiledCatalog.shared(load_catalog(catalog_path, pattern_policy), match_window, cache_dir,
+                                               matcher_backend)
+        
+        # Catalog codes that are live for branch-and-bound pruning without any keyword hit
+        self._unkeyed_live: Tuple[CompiledCatalog, frozenset] = None
+        
+    @property
+    def cpt_mapping(self) -> Mapping[str, Mapping]:
+        return self._catalog.catalog
+    
+    @property
+    def catalog_version(self) -> str:
+        return self._catalog.source.version
+    
+    def _compile_patterns(self) -> CompiledCatalog:
+        """Compile the shared matcher state now rather than on the first extraction"""
+        return self._catalog.compile()
+    
+    def open_note(self, text: str = '') -> IncrementalNote:
+        """
+        Start incremental extraction for a note that will be edited or appended to
+        
+        Returns:
+            IncrementalNote whose `codes` always match `extract_cpt_codes` on its current text
+        """
+        return IncrementalNote(self, text)
+    
+    def reload_catalog(self) -> bool:
+        """
+        Reload the catalog file if its content changed
         
-        # Compile regex patterns for efficiency
-        self._compile_patterns()
+        The new catalog is fully compiled before it replaces the current one in
+        a single assignment, so extractions already running finish on the
+        catalog they started with and later ones see the new one.
         
-    def _compile_patterns(self):
-        """Compile regex patterns for better performance"""
-        for code_info in self.cpt_mapping.values():
-            code_info['compiled_patterns'] = [re.compile(pattern) for pattern in code_info['patterns']]
+        Returns:
+            True if a new catalog was swapped in
+        """
+        with self._reload_lock:
+            source = load_catalog(self.catalog_path, self.pattern_policy)
+            current = self._catalog
+            if source.digest == current.source.digest:
+                return False
+            self._catalog = CompiledCatalog.shared(source, self.match_window, self.cache_dir,
+                                                   self.matcher_backend).compile()
+            CompiledCatalog.discard(current)
+            return True
     
-    def extract_cpt_codes(self, medical_note: str) -> List[CPTCode]:
+    def extract_cpt_codes(self, medical_note: Union[str, NormalizedNote], stats: Dict[str, int] = None,
+                          prune: bool = True) -> List[CPTCode]:
         """
         Extract CPT codes from medical note text
         
         Args:
-            medical_note: Raw medical note text
+            medical_note: Raw medical note text, or the note already normalized by `normalize`
+            stats: Optional dict that receives the pattern matcher's counters for this note,
+                plus 'codes_pruned' (keyword-hit codes dropped by the confidence bound),
+                'bound_pruned' (patterns skipped because none of their codes can be reported),
+                with a result cache 'cache_hit' (1 when the codes came from the cache), and
+                for near-duplicate reuse 'near_duplicate' and 'clauses_rescanned'
+            prune: Skip patterns of codes whose keyword score proves they cannot be
+                reported; the result is identical either way
             
         Returns:
             List of CPTCode objects with confidence scores
         """
-        # Clean and normalize the text
-        cleaned_note = self._clean_text(medical_note)
+        catalog = self._catalog.compile()
+        profiler = self.profiler
+        if profiler is not None:
+            started = time.perf_counter()
+            profiler.label_patterns(catalog)
+        
+        # Clean and normalize the text, once per section scope
+        texts = self._clean_note(self.normalize(medical_note), catalog)
+        
+        if profiler is not None:
+            profiler.lap('clean', started)
+            try:
+                return self._extract_with_cache(texts, catalog, stats, prune)
+            finally:
+                profiler.lap('extract', started)
+        return self._extract_with_cache(texts, catalog, stats, prune)
+    
+    def _extract_with_cache(self, texts: Tuple[str, ...], catalog: CompiledCatalog, stats: Dict[str, int] = None,
+                            prune: bool = True) -> List[CPTCode]:
+        """Extract codes, from the result cache when the cleaned note is in it"""
+        if self.result_cache is None:
+            return self._extract_with_reuse(texts, catalog, stats, prune)
+        
+        # Identical cleaned notes get identical codes from the same catalog and window
+        key = hashlib.sha256(
+            f"{catalog.source.digest}:{self.match_window}:{chr(0).join(texts)}".encode('utf-8', 'surrogatepass')
+        ).hexdigest()
+        cached = self.result_cache.get(key)
+        if stats is not None:
+            stats['cache_hit'] = int(cached is not None)
+        if cached is not None:
+            return [CPTCode(*fields) for fields in cached]
+        
+        started = time.perf_counter()
+        codes = self._extract_with_reuse(texts, catalog, stats, prune)
+        self.result_cache.put(key, [astuple(code) for code in codes], time.perf_counter() - started)
+        return codes
+    
+    def _extract_with_reuse(self, texts: Tuple[str, ...], catalog: CompiledCatalog, stats: Dict[str, int] = None,
+                            prune: bool = True) -> List[CPTCode]:
+        """Extract codes, reusing the clause hits of a near-duplicate note when there is one"""
+        if self.near_duplicates is None or not catalog.pattern_matcher.clause_local:
+            return self._extract_codes(texts, catalog, stats, prune)
+        
+        # Index entries are [catalog, scope texts, {text: SegmentedNote} or None]; notes
+        # are only segmented once a near-duplicate of them turns up
+        signature = self.near_duplicates.signature(texts[0])
+        entry = self.near_duplicates.find(signature)
+        if entry is None or entry[0] is not catalog:
+            self.near_duplicates.add(signature, [catalog, texts, None])
+            return self._extract_codes(texts, catalog, stats, prune)
+        
+        if entry[2] is None:
+            entry[2] = {text: SegmentedNote(catalog, text) for text in entry[1]}
+        segments: Dict[str, SegmentedNote] = {}
+        for scope, text in enumerate(texts):
+            if text not in segments:
+                segments[text] = SegmentedNote(catalog, text, previous=entry[2][entry[1][scope]])
+        self.near_duplicates.add(signature, [catalog, texts, segments])
+        if stats is not None:
+            stats.update(near_duplicate=1, clauses_rescanned=sum(segmented.rescanned for segmented in segments.values()))
+        keyword_hits = catalog.in_scope(texts, lambda text, _: catalog.keyword_automaton.tally(segments[text].keywords))
+        pattern_hits = catalog.in_scope(texts, lambda text, _: catalog.pattern_tally(segments[text].patterns))
+        return self._score_codes(texts, catalog, keyword_hits, pattern_hits)
+    
+    def _extract_codes(self, texts: Tuple[str, ...], catalog: CompiledCatalog, stats: Dict[str, int] = None,
+                       prune: bool = True) -> List[CPTCode]:
+        """Score the catalog against an already cleaned note, given as its text per section scope"""
+        profiler = self.profiler
+        if profiler is not None:
+            mark = time.perf_counter()
+        
+        # Count keyword hits for every code in a single pass over each scope's text
+        keyword_hits = catalog.in_scope(texts, lambda text, _: catalog.keyword_automaton.scan(text))
+        if profiler is not None:
+            mark = profiler.lap('keywords', mark)
+        
+        # Branch and bound: keyword scores are known now, so codes that could not
+        # clear their reporting threshold even with every pattern matching are
+        # dropped, and only the patterns of the remaining codes are evaluated
+        live_codes = live_patterns = None
+        if prune:
+            live_codes, live_patterns = self._bound_candidates(catalog, keyword_hits)
+            if stats is not None:
+                stats['codes_pruned'] = sum(1 for cpt_code in keyword_hits if cpt_code not in live_codes)
+                stats['bound_pruned'] = len(catalog.pattern_matcher.patterns) - len(live_patterns)
+            if profiler is not None:
+                mark = profiler.lap('bound', mark)
+        
+        # Find every matching catalog pattern in one merged scan per scope text,
+        # skipping patterns whose required literals are absent
+        searched = []
+        
+        def match(text: str, scope: int) -> Dict[str, int]:
+            counters = {}
+            matched_patterns = catalog.scope_matcher(scope).match_ids(text, counters, live_patterns, profiler)
+            searched.append(counters['searched'])
+            return catalog.pattern_tally(matched_patterns)
+        
+        pattern_hits = catalog.in_scope(texts, match)
+        if profiler is not None:
+            profiler.lap('patterns', mark)
+        if stats is not None:
+            patterns = len(catalog.pattern_matcher.patterns)
+            stats.update(patterns=patterns, searched=sum(searched), pruned=max(patterns - sum(searched), 0))
         
-        # Extract procedures
+        return self._score_codes(texts, catalog, keyword_hits, pattern_hits, live_codes)
+    
+    def _score_codes(self, texts: Tuple[str, ...], catalog: CompiledCatalog, keyword_hits: Dict[str, int],
+                     pattern_hits: Dict[str, int], live_codes: Set[str] = None,
+                     measured: List[Tuple[str, float, bool]] = None) -> List[CPTCode]:
+        """Score codes from a note's per-code keyword and pattern hits and apply the business rules"""
+        profiler = self.profiler
+        if profiler is not None:
+            mark = time.perf_counter()
+        
+        # Extract procedures. Only codes hit by a keyword or pattern can score
+        # above zero, so only those candidates are scored
         found_codes = []
         
-        for cpt_code, code_info in self.cpt_mapping.items():
-            confidence = self._calculate_confidence(cleaned_note, code_info)
+        for cpt_code in catalog.candidates(keyword_hits, pattern_hits):
+            if live_codes is not None and cpt_code not in live_codes:
+                continue
+            code_info = catalog.catalog[cpt_code]
+            confidence = self._calculate_confidence(texts[0], code_info, keyword_hits.get(cpt_code, 0),
+                                                    pattern_hits.get(cpt_code, 0))
             
-            if confidence > 0.3:  # Threshold for inclusion
+            if confidence > self.INCLUSION_THRESHOLD:  # Threshold for inclusion
                 found_codes.append(CPTCode(
                     code=cpt_code,
                     description=code_info['description'],
@@ -535,95 +2881,375 @@ class EDCPTExtractor:
                     confidence=confidence
                 ))
         
+        if profiler is not None:
+            mark = profiler.lap('confidence', mark)
+        
+        found_codes = self._apply_measurements(found_codes, texts, catalog, measured)
+        if profiler is not None:
+            mark = profiler.lap('measurements', mark)
+        
         # Sort by confidence score (highest first)
         found_codes.sort(key=lambda x: x.confidence, reverse=True)
         
         # Apply business rules to refine results
-        refined_codes = self._apply_business_rules(found_codes, cleaned_note)
+        refined_codes = self._apply_business_rules(found_codes, texts[0], catalog)
+        if profiler is not None:
+            profiler.lap('business_rules', mark)
         
         return refined_codes
     
-    def _clean_text(self, text: str) -> str:
-        """Clean and normalize medical note text"""
-        # Convert to lowercase for matching
-        text = text.lower()
+    def extract_stream(self, chunks: Union[TextIO, Iterable[str]], stats: Dict[str, int] = None,
+                       chunk_size: int = 1 << 20) -> List[CPTCode]:
+        """
+        Extract CPT codes from one document too large to hold, such as many
+        concatenated encounter notes, read as a stream of text chunks
+        
+        The document is cleaned and cut into clauses as it arrives, split into
+        its section scopes by line, and every complete clause is matched and
+        dropped; keywords that straddle a clause boundary are found in a window
+        of the longest keyword on both sides of it. Memory is bounded by the
+        chunk size and the longest clause, not the document. Matching is always
+        bounded (clause-local), with match_window or STREAM_WINDOW, and the
+        codes equal `extract_cpt_codes` on the whole document in that mode,
+        except that wounds are measured per segment of about 16K characters and
+        lines or clauses over 64K characters are cut.
+        
+        Args:
+            chunks: Open text file, read chunk_size characters at a time, or an iterable of text chunks
+            stats: Optional dict that receives 'characters' (cleaned characters matched),
+                'clauses' (clauses matched) and 'peak_held' (most cleaned characters held at once)
+            chunk_size: Characters read from a file per chunk
+            
+        Returns:
+            List of CPTCode objects with confidence scores
+        """
+        if self.match_window is not None:
+            catalog = self._catalog.compile()
+        else:
+            catalog = CompiledCatalog.shared(self._catalog.source, self.STREAM_WINDOW, self.cache_dir,
+                                             self.matcher_backend).compile()
+        if not catalog.pattern_matcher.clause_local:
+            raise ValueError("Catalog patterns cannot be matched clause by clause, so the document cannot be streamed")
+        if hasattr(chunks, 'read'):
+            read = chunks.read
+            chunks = iter(lambda: read(chunk_size), '')
+        
+        scopes = catalog.scopes
+        measurer = catalog.wound_measurer if catalog.wound_measurer.codes else None
+        measured_scope = catalog.code_scope[min(measurer.codes)] if measurer is not None and len(scopes) > 1 else 0
+        
+        # Scope 0 sees the whole document and matches every pattern until a section
+        # header shows up, so a document without headers needs no other scope
+        streams = [ClauseStream(catalog, catalog.pattern_matcher, measurer=measurer)] + [
+            ClauseStream(catalog, catalog.scope_matcher(scope), measurer=measurer if scope == measured_scope else None)
+            for scope in range(1, len(scopes))
+        ]
+        cleaners = [CleanedStream(stream) for stream in streams]
+        sectioned = False
+        sections = [0] * len(scopes)
+        active: Set[int] = set()
+        
+        for piece, line_start in _text_pieces(chunks, streams[0].max_clause):
+            cleaners[0].feed(piece)
+            header = catalog.section_splitter.header.match(piece) if line_start and len(scopes) > 1 else None
+            if header is not None:
+                if not sectioned:
+                    sectioned = True
+                    streams[0].matcher = catalog.scope_matcher(0)
+                name = ' '.join(header.group(1).upper().split())
+                active.clear()
+                for scope in range(1, len(scopes)):
+                    if name in scopes[scope][0]:
+                        # Sections of one scope are cleaned separately and joined by line
+                        if sections[scope]:
+                            streams[scope].feed('\n')
+                        sections[scope] += 1
+                        cleaners[scope].restart()
+                        active.add(scope)
+                piece = piece[header.end():]
+            for scope in active:
+                cleaners[scope].feed(piece)
+        
+        for stream in streams:
+            stream.close()
+        if not sectioned:
+            streams = [streams[0]] * len(scopes)
+        
+        keyword_hits: Dict[str, int] = {}
+        pattern_hits: Dict[str, int] = {}
+        for (_, codes), stream in zip(scopes, streams):
+            keyword_hits.update((cpt_code, count) for cpt_code, count in
+                                catalog.keyword_automaton.tally(stream.keywords).items() if cpt_code in codes)
+            pattern_hits.update((cpt_code, count) for cpt_code, count in
+                                catalog.pattern_tally(stream.patterns).items() if cpt_code in codes)
+        
+        if stats is not None:
+            distinct = {id(stream): stream for stream in streams}.values()
+            stats.update(characters=sum(stream.length for stream in distinct),
+                         clauses=sum(stream.clauses for stream in distinct),
+                         peak_held=max(stream.peak_held for stream in distinct))
+        
+        # Hit counts and measurements are complete, so scoring needs no note text
+        return self._score_codes(('',), catalog, keyword_hits, pattern_hits,
+                                 measured=streams[measured_scope].measured if measurer is not None else None)
+    
+    def extract_codes_vectorized(self, notes: Iterable[str], block_size: int = 1024) -> Iterator[List[CPTCode]]:
+        """
+        Extract codes for many notes, scoring each block of notes with array operations
+        
+        Keyword and pattern hits of a block go into note x keyword and note x
+        pattern matrices; multiplying them by the catalog's occurrence matrices
+        gives every code's hit counts, from which confidences, the confidence
+        bound and the reporting thresholds are all computed for the whole block
+        at once. Results are identical to `extract_cpt_codes`. Without NumPy
+        the notes are extracted one by one.
+        
+        Args:
+            notes: Raw medical notes; consumed lazily, one block at a time
+            block_size: Notes scored per matrix operation
+            
+        Returns:
+            Iterator over each note's CPTCode list, in input order
+        """
+        try:
+            import numpy as np
+        except ImportError:
+            yield from (self.extract_cpt_codes(note) for note in notes)
+            return
+        
+        catalog = self._catalog.compile()
+        keyword_index, keyword_codes, pattern_codes, keyword_lengths, pattern_lengths = catalog.weight_matrices()
+        codes = list(catalog.catalog.items())
+        thresholds = np.array([self._report_threshold(code_info) for _, code_info in codes])
+        
+        # Code columns of each section scope; a scope's hit matrix only counts towards its own codes
+        scope_columns = np.array([[cpt_code in scope_codes for cpt_code, _ in codes] for _, scope_codes in catalog.scopes])
+        
+        def fractions(counts, lengths):
+            return np.divide(counts, lengths, out=np.zeros(counts.shape), where=lengths > 0)
         
-        # Remove extra whitespace
-        text = re.sub(r'\s+', ' ', text)
+        notes = iter(notes)
+        for block in iter(lambda: list(islice(notes, block_size)), []):
+            note_texts = [self._clean_note(self.normalize(note), catalog) for note in block]
+            
+            keyword_hits = np.zeros((len(scope_columns), len(block), len(keyword_index)), dtype=np.int64)
+            for row, texts in enumerate(note_texts):
+                found = {
+                    text: [keyword_index[keyword] for keyword in catalog.keyword_automaton.find_keywords(text)]
+                    for text in catalog.text_scopes(texts)
+                }
+                for scope, text in enumerate(texts):
+                    keyword_hits[scope, row, found[text]] = 1
+            keyword_score = fractions(((keyword_hits @ keyword_codes) * scope_columns[:, None, :]).sum(axis=0), keyword_lengths)
+            
+            # Branch and bound over the whole block: patterns are only matched for
+            # codes that could still clear their threshold
+            bound = np.minimum(keyword_score * self.KEYWORD_WEIGHT + np.where(pattern_lengths > 0, self.PATTERN_WEIGHT, 0.0), 1.0)
+            live_patterns = ((bound > thresholds) & scope_columns[:, None, :]).astype(np.int64) @ pattern_codes.T > 0
+            
+            pattern_hits = np.zeros((len(scope_columns), len(block), len(pattern_codes)), dtype=np.int64)
+            for row, texts in enumerate(note_texts):
+                only: Dict[str, Set[int]] = {}
+                for scope, text in enumerate(texts):
+                    only.setdefault(text, set()).update(np.flatnonzero(live_patterns[scope, row]).tolist())
+                matched = {
+                    text: list(catalog.scope_matcher(scope).match_ids(text, only=only[text]))
+                    for text, scope in catalog.text_scopes(texts).items()
+                }
+                for scope, text in enumerate(texts):
+                    pattern_hits[scope, row, matched[text]] = 1
+            pattern_counts = ((pattern_hits @ pattern_codes) * scope_columns[:, None, :]).sum(axis=0)
+            pattern_score = np.minimum(fractions(pattern_counts, pattern_lengths), 1.0)
+            
+            # Same operations, in the same order, as _calculate_confidence
+            confidence = np.minimum(keyword_score * self.KEYWORD_WEIGHT + pattern_score * self.PATTERN_WEIGHT, 1.0)
+            reported = confidence > thresholds
+            
+            for row, texts in enumerate(note_texts):
+                found_codes = [
+                    CPTCode(
+                        code=codes[column][0],
+                        description=codes[column][1]['description'],
+                        category=codes[column][1]['category'].value,
+                        confidence=float(confidence[row, column])
+                    )
+                    for column in np.flatnonzero(reported[row]).tolist()
+                ]
+                found_codes = self._apply_measurements(found_codes, texts, catalog)
+                found_codes.sort(key=lambda x: x.confidence, reverse=True)
+                yield self._apply_business_rules(found_codes, texts[0], catalog)
+    
+    def _apply_measurements(self, found_codes: List[CPTCode], texts: Tuple[str, ...], catalog: CompiledCatalog,
+                            measured: List[Tuple[str, float, bool]] = None) -> List[CPTCode]:
+        """Replace scored size-banded repair codes by the codes of the measured wound lengths"""
+        measurer = catalog.wound_measurer
+        if not measurer.codes:
+            return found_codes
+        # Wounds are measured in the text the repair codes are matched against
+        if measured is None:
+            measured = measurer.measure(texts[catalog.code_scope[min(measurer.codes)]] if len(texts) > 1 else texts[0])
+        if not measured:
+            return found_codes
         
-        # Remove special characters that might interfere with matching
-        text = re.sub(r'[^\w\s\-\.\,\:\;\(\)\/]', ' ', text)
+        # Measured wounds decide the size-banded codes, even when their band is not in the catalog;
+        # a code measured more than once keeps its best confidence
+        confidences: Dict[str, float] = {}
+        for cpt_code, _, explicit in measured:
+            if cpt_code is not None:
+                confidence = self.MEASURED_CONFIDENCE if explicit else self.ASSUMED_REPAIR_CONFIDENCE
+                confidences[cpt_code] = max(confidences.get(cpt_code, 0.0), confidence)
+        
+        found_codes = [code for code in found_codes if code.code not in measurer.codes]
+        for cpt_code, confidence in confidences.items():
+            code_info = catalog.catalog[cpt_code]
+            found_codes.append(CPTCode(
+                code=cpt_code,
+                description=code_info['description'],
+                category=code_info['category'].value,
+                confidence=confidence
+            ))
+        return found_codes
+    
+    def _report_threshold(self, code_info: Mapping) -> float:
+        """Confidence a code must exceed to survive extraction and the business rules"""
+        if code_info['category'] == ProcedureCategory.EVALUATION:
+            return self.INCLUSION_THRESHOLD
+        return max(self.INCLUSION_THRESHOLD, self.PROCEDURE_THRESHOLD)
+    
+    def _confidence_bound(self, code_info: Mapping, keyword_matches: int) -> float:
+        """Highest confidence a code can reach with keyword_matches, if every pattern matched"""
+        bound = self.KEYWORD_WEIGHT * keyword_matches / len(code_info['keywords']) if code_info['keywords'] else 0.0
+        if code_info['patterns']:
+            bound += self.PATTERN_WEIGHT
+        return min(bound, 1.0)
+    
+    def _bound_candidates(self, catalog: CompiledCatalog, keyword_hits: Dict[str, int]) -> Tuple[Set[str], Set[int]]:
+        """
+        Codes that can still be reported given their keyword hits, and the pattern ids they need
+        
+        Codes without keyword hits are only live if patterns alone could carry
+        them over their threshold; that set depends on the catalog only and is
+        computed once per catalog.
+        """
+        if self._unkeyed_live is None or self._unkeyed_live[0] is not catalog:
+            self._unkeyed_live = (catalog, frozenset(
+                cpt_code for cpt_code, code_info in catalog.catalog.items()
+                if self._confidence_bound(code_info, 0) > self._report_threshold(code_info)
+            ))
+        live_codes = set(self._unkeyed_live[1])
+        for cpt_code, keyword_matches in keyword_hits.items():
+            code_info = catalog.catalog[cpt_code]
+            if self._confidence_bound(code_info, keyword_matches) > self._report_threshold(code_info):
+                live_codes.add(cpt_code)
+        live_patterns = {pattern_id for cpt_code in live_codes for pattern_id in catalog.pattern_ids[cpt_code]}
+        return live_codes, live_patterns
+    
+    def normalize(self, medical_note: Union[str, NormalizedNote]) -> NormalizedNote:
+        """The note normalized once for every stage of `extract_with_details`; normalized notes pass through"""
+        if isinstance(medical_note, NormalizedNote):
+            return medical_note
+        return NormalizedNote.of(medical_note)
+    
+    def _clean_note(self, note: NormalizedNote, catalog: CompiledCatalog) -> Tuple[str, ...]:
+        """
+        Cleaned text of a note for each of the catalog's section scopes
         
-        return text.strip()
+        Codes outside the section policy see the whole note. The others see only
+        their sections, cleaned one by one and joined by newlines so that keywords
+        never span two sections. Notes without any section header are matched
+        whole by every code.
+        """
+        if len(catalog.scopes) == 1:
+            return (note.text,)
+        sections = catalog.section_splitter.split(note.raw)
+        if not sections:
+            return (note.text,) * len(catalog.scopes)
+        return (note.text,) + tuple(
+            '\n'.join(self._clean_text(body) for name, body in sections if name in names)
+            for names, _ in catalog.scopes[1:]
+        )
+    
+    def _clean_text(self, text: str) -> str:
+        """Clean and normalize medical note text (see NormalizedNote)"""
+        return NormalizedNote.of(text).text
     
-    def _calculate_confidence(self, text: str, code_info: Dict) -> float:
-        """Calculate confidence score for a CPT code match"""
+    def _calculate_confidence(self, text: str, code_info: Dict, keyword_matches: int = None,
+                              pattern_matches: int = None) -> float:
+        """
+        Calculate confidence score for a CPT code match
+        
+        Args:
+            text: Cleaned note text
+            code_info: Catalog entry for the code
+            keyword_matches: Precomputed keyword hit count from the keyword automaton;
+                counted directly against text when omitted
+            pattern_matches: Precomputed pattern hit count from the merged pattern matcher;
+                searched directly in text when omitted
+        """
         confidence = 0.0
         
         # Check keyword matches
-        keyword_matches = 0
-        for keyword in code_info['keywords']:
-            if keyword.lower() in text:
-                keyword_matches += 1
+        if keyword_matches is None:
+            keyword_matches = 0
+            for keyword in code_info['keywords']:
+                if keyword.lower() in text:
+                    keyword_matches += 1
         
         if code_info['keywords']:
             keyword_score = keyword_matches / len(code_info['keywords'])
-            confidence += keyword_score * 0.6  # 60% weight for keywords
+            confidence += keyword_score * self.KEYWORD_WEIGHT  # 60% weight for keywords
         
         # Check pattern matches
-        pattern_matches = 0
-        for pattern in code_info.get('compiled_patterns', []):
-            if pattern.search(text):
-                pattern_matches += 1
+        if pattern_matches is None:
+            pattern_matches = 0
+            for pattern in code_info['patterns']:
+                if compile_pattern(pattern, self.matcher_backend).search(text):
+                    pattern_matches += 1
         
-        if code_info.get('compiled_patterns'):
-            pattern_score = min(pattern_matches / len(code_info['compiled_patterns']), 1.0)
-            confidence += pattern_score * 0.4  # 40% weight for patterns
+        if code_info['patterns']:
+            pattern_score = min(pattern_matches / len(code_info['patterns']), 1.0)
+            confidence += pattern_score * self.PATTERN_WEIGHT  # 40% weight for patterns
         
         return min(confidence, 1.0)
     
-    def _apply_business_rules(self, codes: List[CPTCode], text: str) -> List[CPTCode]:
+    def _apply_business_rules(self, codes: List[CPTCode], text: str, catalog: CompiledCatalog = None) -> List[CPTCode]:
         """Apply medical coding business rules to refine results"""
-        refined_codes = []
-        
-        # Rule 1: Only one E&M code per encounter
-        em_codes = [code for code in codes if code.category == ProcedureCategory.EVALUATION.value]
-        if em_codes:
-            # Keep the highest level E&M code
-            highest_em = max(em_codes, key=lambda x: x.confidence)
-            refined_codes.append(highest_em)
+        # Rule 1: E&M codes compete for one slot per encounter (a conflict in the rule table)
+        refined_codes = [code for code in codes if code.category == ProcedureCategory.EVALUATION.value]
         
         # Rule 2: Include all procedure codes above threshold
-        procedure_codes = [code for code in codes if code.category != ProcedureCategory.EVALUATION.value]
-        refined_codes.extend([code for code in procedure_codes if code.confidence > 0.5])
-        
-        # Rule 3: Remove duplicate categories with lower confidence
-        seen_categories = {}
-        final_codes = []
-        
-        for code in refined_codes:
-            category_key = f"{code.category}_{code.code[:3]}"  # Group similar codes
-            if category_key not in seen_categories or code.confidence > seen_categories[category_key].confidence:
-                seen_categories[category_key] = code
+        refined_codes.extend([code for code in codes
+                              if code.category != ProcedureCategory.EVALUATION.value and code.confidence > self.PROCEDURE_THRESHOLD])
         
-        final_codes = list(seen_categories.values())
-        final_codes.sort(key=lambda x: x.confidence, reverse=True)
-        
-        return final_codes
+        # Rule 3: Major procedures bundle their minor ones, and of conflicting
+        # codes (same family, same location) only the most confident is kept
+        return (catalog or self._catalog.compile()).rule_table.apply(refined_codes)
     
-    def extract_with_details(self, medical_note: str) -> Dict:
+    def extract_with_details(self, medical_note: Union[str, NormalizedNote]) -> Dict:
         """
         Extract CPT codes with additional analysis details
         
         Returns:
             Dictionary with codes, analysis details, and recommendations
         """
-        codes = self.extract_cpt_codes(medical_note)
+        profiler = self.profiler
+        if profiler is not None:
+            started = time.perf_counter()
+        
+        # Every stage shares the one normalized note
+        note = self.normalize(medical_note)
+        if profiler is not None:
+            profiler.lap('normalize', started)
+        
+        pattern_stats = {}
+        codes = self.extract_cpt_codes(note, pattern_stats)
+        if profiler is not None:
+            started = time.perf_counter()
         
         # Analyze note characteristics
-        note_analysis = self._analyze_note_complexity(medical_note)
+        note_analysis = self._analyze_note_complexity(note)
         
-        return {
+        details = {
             'cpt_codes': [
                 {
                     'code': code.code,
@@ -636,12 +3262,16 @@ class EDCPTExtractor:
             'note_analysis': note_analysis,
             'total_codes_found': len(codes),
             'highest_confidence': max([code.confidence for code in codes]) if codes else 0,
-            'recommendations': self._generate_recommendations(codes, note_analysis)
+            'recommendations': self._generate_recommendations(codes, note_analysis),
+            'pattern_stats': pattern_stats
         }
+        if profiler is not None:
+            profiler.lap('details', started)
+        return details
     
-    def _analyze_note_complexity(self, text: str) -> Dict:
+    def _analyze_note_complexity(self, note: NormalizedNote) -> Dict:
         """Analyze the complexity and characteristics of the medical note"""
-        word_count = len(text.split())
+        word_count = note.word_count
         
         # Look for complexity indicators
         high_complexity_indicators = [
@@ -649,7 +3279,7 @@ class EDCPTExtractor:
             'comprehensive', 'complex decision making', 'high risk'
         ]
         
-        complexity_score = sum(1 for indicator in high_complexity_indicators if indicator in text.lower())
+        complexity_score = sum(1 for indicator in high_complexity_indicators if indicator in note.text)
         
         return {
             'word_count': word_count,
@@ -674,10 +3304,822 @@ class EDCPTExtractor:
             recommendations.append("Some codes have lower confidence scores. Manual review recommended.")
         
         return recommendations
+    
+    def extract_batch(self, notes: Iterable[str], workers: int = None, chunksize: int = 32) -> Iterator[Dict]:
+        """
+        Run extract_with_details over many notes in a process pool
+        
+        Args:
+            notes: Iterable of raw medical notes; consumed lazily
+            workers: Number of worker processes (defaults to the CPU count); 1 runs in-process
+            chunksize: Notes sent to a worker per task
+            
+        Returns:
+            Iterator over extract_with_details results, in input order
+        
+        Workers reuse this extractor's compiled catalog: with the fork start method
+        they inherit it copy-on-write, otherwise each worker builds one extractor
+        once in its initializer. At most two chunks per worker are in flight, so
+        memory stays bounded however long the input is.
+        """
+        workers = workers or os.cpu_count() or 1
+        notes = iter(notes)
+        chunks = iter(lambda: list(islice(notes, chunksize)), [])
+        if workers == 1:
+            for chunk in chunks:
+                yield from (self.extract_with_details(note) for note in chunk)
+            return
+        
+        pool = self._worker_pool(workers)
+        try:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.apply_async(_extract_chunk, (chunk,)))
+                if len(pending) >= workers * 2:
+                    yield from pending.popleft().get()
+            while pending:
+                yield from pending.popleft().get()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _worker_pool(self, workers: int) -> multiprocessing.pool.Pool:
+        """Process pool whose workers run _extract_chunk with this extractor's catalog and settings"""
+        global _worker_extractor
+        
+        if 'fork' in multiprocessing.get_all_start_methods():
+            # Forked workers inherit the module global set here, already compiled
+            self._compile_patterns()
+            _worker_extractor = self
+            try:
+                return multiprocessing.get_context('fork').Pool(workers)
+            finally:
+                _worker_extractor = None
+        return multiprocessing.Pool(workers, initializer=_init_worker,
+                                    initargs=(self.match_window, self.catalog_path, self.cache_dir, self.result_cache,
+                                              self.pattern_policy, self.matcher_backend))
+
+# Extractor used by batch worker processes
+_worker_extractor = None
+
+def _init_worker(match_window: int = None, catalog_path: str = None, cache_dir: str = None,
+                 result_cache: ResultCache = None, pattern_policy: str = 'bound', matcher_backend: str = 're'):
+    """Build the worker's extractor once, for start methods that do not fork"""
+    global _worker_extractor
+    _worker_extractor = EDCPTExtractor(match_window=match_window, catalog_path=catalog_path, cache_dir=cache_dir,
+                                       result_cache=result_cache, pattern_policy=pattern_policy,
+                                       matcher_backend=matcher_backend)
+    _worker_extractor._compile_patterns()
+
+def _extract_chunk(notes: List[str]) -> List[Dict]:
+    """Extract a chunk of notes with the worker's extractor"""
+    return [_worker_extractor.extract_with_details(note) for note in notes]
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of sorted values (0.0 when empty)"""
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else 0.0
+
+class ServiceOverloaded(RuntimeError):
+    """A request was refused or dropped because it could not be served within the latency target"""
+
+class ExtractionService:
+    """
+    asyncio front end for an extractor, in-process or served over HTTP.
+
+    Concurrent requests are coalesced into micro-batches of up to max_batch
+    notes, or as many as arrive within max_wait seconds of the first. Each
+    batch runs in a worker process, or on a single worker thread when
+    workers is 1, so the event loop never runs regex work. At most one batch
+    per worker is in flight; the rest wait in the queue and later batches
+    fill up under load.
+
+    Admission control holds latency near latency_target instead of letting
+    the queue grow. A request is refused with ServiceOverloaded when
+    max_queue requests are already waiting, or when the notes ahead of it
+    would take longer than latency_target to clear at the measured per-note
+    service time. A request whose target has already passed while it was
+    queued is dropped before dispatch.
+
+    The catalog file is checked for changes before a batch is dispatched, at
+    most once per reload_interval seconds (None disables it). A changed catalog
+    is compiled off the event loop and swapped into the extractor; worker
+    processes are replaced by a pool forked from it. Batches already running
+    finish on the catalog they started with.
+    """
+
+    # Completed requests whose latencies the percentiles are taken over
+    LATENCY_WINDOW = 4096
+    
+    # Largest HTTP request body accepted, in bytes
+    MAX_BODY = 1 << 22
+
+    def __init__(self, extractor: 'EDCPTExtractor', workers: int = 1, max_batch: int = 16, max_wait: float = 0.002,
+                 max_queue: int = 256, latency_target: float = 0.25, reload_interval: float = 1.0):
+        self.extractor = extractor
+        self.workers = workers or os.cpu_count() or 1
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.latency_target = latency_target
+        self.reload_interval = reload_interval
+        
+        self.accepted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.shed = 0
+        self.batches = 0
+        self.reloads = 0
+        self.reload_failures = 0
+        self.note_seconds = 0.0  # Moving average of worker time per note
+        self._latencies: deque = deque(maxlen=self.LATENCY_WINDOW)
+        self._queue: deque = deque()  # (note, future, arrival time)
+        self._in_flight = 0  # Notes dispatched and not yet returned
+        self._pool = None
+        self._batcher: asyncio.Task = None
+        self._running: Set[asyncio.Task] = set()
+        self._next_reload = 0.0  # Loop time of the next catalog check
+        self._retiring: Set[asyncio.Future] = set()  # Joins of pools replaced by a reload
+
+    async def __aenter__(self) -> 'ExtractionService':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def start(self):
+        """Start the workers and the batcher on the running event loop"""
+        if self._batcher is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.workers)
+        if self.workers == 1:
+            self._pool = ThreadPoolExecutor(1, thread_name_prefix='extraction')
+            await self._loop.run_in_executor(self._pool, self.extractor._compile_patterns)
+        else:
+            # Compile off the loop, then fork from the loop's own thread before any
+            # request is served; forking from an executor thread copies a thread
+            # the loop knows nothing about into the workers
+            await self._loop.run_in_executor(None, self.extractor._compile_patterns)
+            self._pool = self.extractor._worker_pool(self.workers)
+        self._batcher = asyncio.ensure_future(self._batch_requests())
+
+    async def close(self):
+        """Refuse queued requests, let dispatched batches finish and stop the workers"""
+        if self._batcher is None:
+            return
+        self._batcher.cancel()
+        await asyncio.gather(self._batcher, return_exceptions=True)
+        self._batcher = None
+        while self._queue:
+            _, future, _ = self._queue.popleft()
+            if not future.done():
+                future.set_exception(ServiceOverloaded("extraction service is shutting down"))
+        await asyncio.gather(*self._running, *self._retiring, return_exceptions=True)
+        if self.workers == 1:
+            self._pool.shutdown()
+        else:
+            self._pool.terminate()
+            await self._loop.run_in_executor(None, self._pool.join)
+        self._pool = None
+
+    async def extract(self, note: str) -> Dict:
+        """
+        extract_with_details for one note, batched with concurrent requests
+        
+        Raises:
+            ServiceOverloaded: The request cannot be served within the latency target
+        """
+        if self._batcher is None:
+            raise RuntimeError("extraction service is not started")
+        waiting = len(self._queue) + self._in_flight
+        if len(self._queue) >= self.max_queue or waiting * self.note_seconds / self.workers > self.latency_target:
+            self.rejected += 1
+            raise ServiceOverloaded(f"{waiting} notes ahead would exceed the {self.latency_target:g}s latency target")
+        
+        future = self._loop.create_future()
+        self._queue.append((note, future, self._loop.time()))
+        self.accepted += 1
+        self._wakeup.set()
+        return await future
+
+    def stats(self) -> Dict[str, float]:
+        """Request counters, batching and latency percentiles (seconds) over recent requests"""
+        latencies = sorted(self._latencies)
+        return {
+            'accepted': self.accepted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'shed': self.shed,
+            'queued': len(self._queue),
+            'in_flight': self._in_flight,
+            'batches': self.batches,
+            'reloads': self.reloads,
+            'reload_failures': self.reload_failures,
+            'mean_batch': round(self.completed / self.batches, 2) if self.batches else 0.0,
+            'note_seconds': round(self.note_seconds, 6),
+            'p50': round(_percentile(latencies, 0.5), 6),
+            'p99': round(_percentile(latencies, 0.99), 6)
+        }
+
+    async def _batch_requests(self):
+        """Gather queued requests into batches and dispatch each once a worker slot is free"""
+        while True:
+            while not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            await self._slots.acquire()
+            await self._check_catalog()
+            
+            # Let the batch fill for up to max_wait after its first request arrived
+            deadline = self._queue[0][2] + self.max_wait
+            while len(self._queue) < self.max_batch and self._loop.time() < deadline:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), deadline - self._loop.time())
+                except asyncio.TimeoutError:
+                    break
+            
+            batch = []
+            now = self._loop.time()
+            while self._queue and len(batch) < self.max_batch:
+                note, future, arrived = self._queue.popleft()
+                if future.done():
+                    continue  # Cancelled by its caller
+                if now - arrived > self.latency_target:
+                    self.shed += 1
+                    future.set_exception(ServiceOverloaded("request waited past the latency target"))
+                    continue
+                batch.append((note, future, arrived))
+            if not batch:
+                self._slots.release()
+                continue
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _check_catalog(self):
+        """Reload the extractor's catalog if its file changed, at most once per reload_interval"""
+        if not self.reload_interval or self._loop.time() < self._next_reload:
+            return
+        self._next_reload = self._loop.time() + self.reload_interval
+        try:
+            reloaded = await self._loop.run_in_executor(None, self.extractor.reload_catalog)
+        except (OSError, ValueError):
+            # A broken or half-written file keeps the current catalog in service
+            self.reload_failures += 1
+            return
+        if not reloaded:
+            return
+        self.reloads += 1
+        if self.workers > 1:
+            # Forked workers hold the catalog they were forked with; the old pool
+            # finishes its dispatched batches and exits
+            retired, self._pool = self._pool, self.extractor._worker_pool(self.workers)
+            retired.close()
+            joined = self._loop.run_in_executor(None, retired.join)
+            self._retiring.add(joined)
+            joined.add_done_callback(self._retiring.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future, float]]):
+        notes = [note for note, _, _ in batch]
+        self._in_flight += len(notes)
+        started = self._loop.time()
+        try:
+            results = await self._dispatch(notes)
+        except Exception as error:
+            self.failed += len(batch)
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        finally:
+            self._in_flight -= len(notes)
+            self._slots.release()
+        
+        finished = self._loop.time()
+        per_note = (finished - started) / len(notes)
+        self.note_seconds = per_note if not self.batches else 0.8 * self.note_seconds + 0.2 * per_note
+        self.batches += 1
+        for (_, future, arrived), result in zip(batch, results):
+            self.completed += 1
+            self._latencies.append(finished - arrived)
+            if not future.done():
+                future.set_result(result)
+
+    def _dispatch(self, notes: List[str]) -> asyncio.Future:
+        if self.workers == 1:
+            return self._loop.run_in_executor(self._pool, lambda: [self.extractor.extract_with_details(note) for note in notes])
+        
+        future = self._loop.create_future()
+        
+        def settle(result=None, error=None):
+            if future.done():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        
+        # Pool callbacks run on the pool's result thread
+        self._pool.apply_async(_extract_chunk, (notes,),
+                               callback=lambda result: self._loop.call_soon_threadsafe(settle, result),
+                               error_callback=lambda error: self._loop.call_soon_threadsafe(settle, None, error))
+        return future
+
+    async def serve_http(self, host: str = '127.0.0.1', port: int = 8080) -> asyncio.AbstractServer:
+        """
+        Serve the service over HTTP/1.1 with keep-alive:
+        
+        POST /extract with {"note": "..."} returns the extract_with_details result
+        (429 with Retry-After when overloaded); GET /stats returns `stats()`,
+        GET /metrics the extractor's profiler in OpenMetrics text when it has one,
+        and GET /health returns {"status": "ok"}.
+        """
+        await self.start()
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                request_line, *header_lines = head.decode('latin-1').split('\r\n')
+                method, target, version = (request_line.split(' ') + ['', '', ''])[:3]
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                
+                try:
+                    length = int(headers.get('content-length', '0') or 0)
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    # Without a valid length the body cannot be told apart from a next request
+                    await self._respond(writer, 400, {'error': 'invalid Content-Length'}, False)
+                    return
+                if length > self.MAX_BODY:
+                    await self._respond(writer, 413, {'error': 'request body too large'}, False)
+                    return
+                body = await reader.readexactly(length) if length else b''
+                status, payload, extra = await self._route(method, target.split('?')[0], body)
+                await self._respond(writer, status, payload, keep_alive, extra)
+                if not keep_alive:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, asyncio.CancelledError):
+                # The connection is done either way; a cancelled handler task
+                # trips up the stream's done callback on some Python versions
+                pass
+
+    async def _route(self, method: str, path: str, body: bytes) -> Tuple[int, Union[Dict, str], Dict[str, str]]:
+        if path == '/health' and method == 'GET':
+            return 200, {'status': 'ok'}, {}
+        if path == '/stats' and method == 'GET':
+            return 200, self.stats(), {}
+        if path == '/metrics' and method == 'GET':
+            if self.extractor.profiler is None:
+                return 404, {'error': 'profiling is not enabled'}, {}
+            # Extraction in worker processes is not seen by this process's profiler
+            return 200, self.extractor.profiler.openmetrics(), {}
+        if path != '/extract':
+            return 404, {'error': 'not found'}, {}
+        if method != 'POST':
+            return 405, {'error': 'use POST'}, {'Allow': 'POST'}
+        try:
+            request = json.loads(body)
+            note = request['note']
+            if not isinstance(note, str):
+                raise TypeError('note must be a string')
+        except (ValueError, KeyError, TypeError) as error:
+            return 400, {'error': f"expected a JSON object with a string 'note': {error}"}, {}
+        try:
+            result = await self.extract(note)
+        except ServiceOverloaded as error:
+            return 429, {'error': str(error)}, {'Retry-After': str(max(1, round(self.latency_target)))}
+        except Exception as error:
+            return 500, {'error': repr(error)}, {}
+        if 'id' in request:
+            result = {'id': request['id'], **result}
+        return 200, result, {}
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, payload: Union[Dict, str], keep_alive: bool,
+                       extra: Dict[str, str] = None):
+        reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                   413: 'Payload Too Large', 429: 'Too Many Requests', 500: 'Internal Server Error'}
+        if isinstance(payload, str):
+            body = payload.encode('utf-8')
+            content_type = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+        else:
+            body = json.dumps(payload).encode('utf-8')
+            content_type = 'application/json'
+        headers = {'Content-Type': content_type, 'Content-Length': str(len(body)),
+                   'Connection': 'keep-alive' if keep_alive else 'close', **(extra or {})}
+        writer.write(f"HTTP/1.1 {status} {reasons[status]}\r\n".encode('latin-1')
+                     + ''.join(f"{name}: {value}\r\n" for name, value in headers.items()).encode('latin-1')
+                     + b'\r\n' + body)
+        await writer.drain()
+
+# Benchmarks
+BENCH_SCHEMA = 'ed-cpt-bench/1'
+
+# Narrative sentences of synthetic notes; they name no procedure
+FILLER_SENTENCES = (
+    "Patient is alert and oriented times three.", "Vital signs are within normal limits.",
+    "Lungs are clear to auscultation bilaterally.", "Heart has a regular rate and rhythm.",
+    "Abdomen is soft and nontender.", "Denies fever, chills, nausea or vomiting.",
+    "Symptoms began two hours prior to arrival.", "No known drug allergies.",
+    "Medications were reviewed with the patient.", "Family is at the bedside.",
+    "Pain is rated six out of ten.", "No prior similar episodes.",
+    "Skin is warm and dry.", "Gait is steady.", "Patient tolerated oral fluids."
+)
+
+COMPLAINTS = ('Laceration', 'Chest pain', 'Fall', 'Shortness of breath', 'Abdominal pain', 'Wrist injury',
+              'Headache', 'Fever', 'Back pain', 'Eye injury')
+
+BODY_SITES = ('left hand', 'right forearm', 'scalp', 'chin', 'left knee', 'right thigh', 'forehead', 'left foot')
+
+def _pattern_words(patterns: Iterable[str]) -> Tuple[Set[str], Set[str]]:
+    """Words that open a `.*` gap in the patterns, and words that close one"""
+    heads, tails = set(), set()
+    for pattern in patterns:
+        parts = re.sub(r'\(\?[a-zA-Z]+\)|\\[a-zA-Z]', ' ', pattern).split('.*')
+        if len(parts) > 1:
+            heads.update(re.findall(r'[a-z]{3,}', parts[0]))
+            for part in parts[1:]:
+                tails.update(re.findall(r'[a-z]{3,}', part))
+    return heads - tails, tails
+
+def generate_notes(catalog: Mapping[str, Mapping], count: int, seed: int = 0, length: int = 3,
+                   procedure_density: float = 1.0, worst_case: float = 0.0) -> List[str]:
+    """
+    Reproducible synthetic ED notes in the section layout of the sample notes
+    
+    Args:
+        catalog: Code catalog (cpt_mapping) whose keywords describe the procedures
+        count: Number of notes
+        seed: Random seed; the same arguments always give the same notes
+        length: Narrative sentences per section
+        procedure_density: Mean number of catalog procedures documented per note
+        worst_case: Fraction of notes that are instead one run-on clause, with no
+            sentence boundary, in a PROCEDURES section so that procedure codes
+            limited to it by the section policy see it: the words that close `.*`
+            gaps in the catalog's patterns come first, so no pattern is skipped for
+            lacking them, then many words that open a gap, each of which is
+            scanned to the end in vain
+        
+    Returns:
+        List of raw note texts
+    """
+    rng = random.Random(seed)
+    procedures = sorted((cpt_code, tuple(info['keywords'])) for cpt_code, info in catalog.items() if info['keywords'])
+    heads, tails = _pattern_words(pattern for info in catalog.values() for pattern in info['patterns'])
+    heads, tails = sorted(heads), sorted(tails)
+    
+    def narrative() -> str:
+        return ' '.join(rng.choice(FILLER_SENTENCES) for _ in range(length))
+    
+    notes = []
+    for _ in range(count):
+        if rng.random() < worst_case:
+            words = [rng.choice(heads) if rng.random() < 0.5 else rng.choice(('the', 'and', 'with', 'noted', 'left'))
+                     for _ in range(length * 60)]
+            notes.append(f"\nPROCEDURES: {' '.join(tails + words)}\n")
+            continue
+        
+        documented = int(procedure_density) + (rng.random() < procedure_density % 1)
+        steps = []
+        for _, keywords in rng.sample(procedures, min(documented, len(procedures))):
+            step = f"{rng.choice(keywords).capitalize()} performed"
+            if len(keywords) > 1 and rng.random() < 0.5:
+                step += f" with {rng.choice(keywords)}"
+            steps.append(step + '.')
+            if rng.random() < 0.2:
+                steps.append(f"{rng.randint(1, 12)} cm laceration to the {rng.choice(BODY_SITES)} repaired with sutures.")
+        
+        notes.append(f"""
+        CHIEF COMPLAINT: {rng.choice(COMPLAINTS)}
+        
+        HISTORY: {rng.randint(2, 95)}-year-old patient presents to the emergency department. {narrative()}
+        
+        PHYSICAL EXAM: {narrative()}
+        
+        PROCEDURES: {' '.join(steps) or 'None.'}
+        
+        ASSESSMENT: {narrative()}
+        
+        DISPOSITION: Discharged home with follow-up instructions.
+        """)
+    return notes
+
+def run_benchmark(extractor: 'EDCPTExtractor', workloads: Mapping[str, List[str]],
+                  modes: Iterable[str] = ('extract_cpt_codes', 'extract_with_details', 'batch', 'vectorized'),
+                  workers: int = None) -> Dict:
+    """
+    Time each extraction mode over each workload
+    
+    extract_cpt_codes and extract_with_details are timed note by note for
+    latency percentiles; batch (extract_batch with workers processes) and
+    vectorized (extract_codes_vectorized) are timed end to end for throughput.
+    The catalog is compiled and every mode warmed up before timing.
+    
+    Returns:
+        Machine-readable results: environment metadata, and per workload and
+        mode the note count, seconds, notes_per_second and, for per-note modes,
+        mean/p50/p95/p99 latency in milliseconds
+    """
+    extractor._compile_patterns()
+    calls = {'extract_cpt_codes': extractor.extract_cpt_codes, 'extract_with_details': extractor.extract_with_details}
+    runs = {
+        'batch': lambda notes: list(extractor.extract_batch(notes, workers=workers)),
+        'vectorized': lambda notes: list(extractor.extract_codes_vectorized(notes))
+    }
+    modes = list(modes)
+    unknown = set(modes) - set(calls) - set(runs)
+    if unknown:
+        raise ValueError(f"unknown benchmark modes: {sorted(unknown)}")
+    
+    results = {}
+    for workload, notes in workloads.items():
+        warmup = notes[:8]
+        results[workload] = {}
+        for mode in modes:
+            if mode in calls:
+                call = calls[mode]
+                for note in warmup:
+                    call(note)
+                latencies = []
+                for note in notes:
+                    started = time.perf_counter()
+                    call(note)
+                    latencies.append(time.perf_counter() - started)
+                seconds = sum(latencies)
+                latencies.sort()
+                timing = {
+                    'mean_ms': round(seconds / len(notes) * 1000, 4),
+                    'p50_ms': round(_percentile(latencies, 0.5) * 1000, 4),
+                    'p95_ms': round(_percentile(latencies, 0.95) * 1000, 4),
+                    'p99_ms': round(_percentile(latencies, 0.99) * 1000, 4)
+                }
+            else:
+                runs[mode](warmup)
+                started = time.perf_counter()
+                runs[mode](notes)
+                seconds = time.perf_counter() - started
+                timing = {}
+            results[workload][mode] = {
+                'notes': len(notes),
+                'seconds': round(seconds, 6),
+                'notes_per_second': round(len(notes) / max(seconds, 1e-9), 2),
+                **timing
+            }
+    
+    return {
+        'schema': BENCH_SCHEMA,
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'catalog_version': extractor.catalog_version,
+            'match_window': extractor.match_window,
+            'matcher_backend': extractor.matcher_backend,
+            'pattern_policy': extractor.pattern_policy,
+            'workers': workers,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z')
+        },
+        'results': results
+    }
+
+def compare_benchmarks(current: Dict, baseline: Dict, tolerance: float = 0.1) -> List[str]:
+    """
+    Regressions of current against baseline results of the same workloads and modes
+    
+    A regression is throughput below, or a latency percentile above, the
+    baseline by more than tolerance (a fraction).
+    
+    Returns:
+        One line per regressed metric; empty if none
+    """
+    regressions = []
+    for workload, modes in current['results'].items():
+        for mode, metrics in modes.items():
+            before = baseline.get('results', {}).get(workload, {}).get(mode)
+            if before is None:
+                continue
+            for metric, value in metrics.items():
+                if metric not in before or metric in ('notes', 'seconds') or not before[metric]:
+                    continue
+                change = value / before[metric] - 1
+                worse = -change if metric == 'notes_per_second' else change
+                if worse > tolerance:
+                    regressions.append(f"{workload}/{mode} {metric}: {before[metric]} -> {value} ({change:+.1%})")
+    return regressions
+
+# Notes every conformance check covers besides its corpus: non-ASCII and
+# mixed-case text (folded scans, characters `re` folds to ASCII letters, and
+# one that lowercases to two) and a long non-ASCII note of chained `.*` gaps
+CONFORMANCE_NOTES = (
+    "PROCEDURES: Tibial shaft fracture, closed reduction with manipulation at the café. "
+    "Simple repair of 2 cm laceration of the hand, 5 µm, 38.5 °C.",
+    "PROCEDURE NOTE: THORACENTESİS performed. Short arm ſplint applied. Corneal foreign body removal with "
+    "slit lamp; Kelvin scale K.",
+    "PROCEDURES: " + "tibia fracture " * 250 + "café",
+)
+
+def check_conformance(notes: Iterable[str], backend: str = 'dfa', reference: str = 're', match_window: int = None,
+                      catalog_path: str = None, pattern_policy: str = 'bound') -> Dict:
+    """
+    Check that a matcher backend finds exactly the matches of a reference backend over a note corpus
+    
+    Each note, and each of CONFORMANCE_NOTES after them, is cleaned per section
+    scope as extraction does. In every distinct cleaned text, every regex the
+    pattern matcher runs (each pattern's original and case-folded forms,
+    gap-bounded with a match_window) is searched with both backends. The
+    merged matcher's `match_ids` of both backends are compared with each other
+    and with every pattern searched on its own, covering the anchored,
+    prefiltered, folded and fallback paths, and so are the codes extracted
+    from the note.
+    
+    Returns:
+        Counts of notes, texts, regexes, searches and reference matches, the
+        regexes backend compiles natively rather than through `re`, each
+        backend's total `match_ids` seconds, and one entry per disagreement
+        with the note index, what was compared and each backend's result
+    """
+    names = (reference, backend)
+    extractors = {name: EDCPTExtractor(match_window=match_window, catalog_path=catalog_path,
+                                       pattern_policy=pattern_policy, matcher_backend=name)
+                  for name in names}
+    catalogs = {name: extractor._compile_patterns() for name, extractor in extractors.items()}
+    matcher = catalogs[reference].pattern_matcher
+    sources = list(dict.fromkeys(
+        source for pattern_id in range(len(matcher.patterns))
+        for source in (matcher._plain_sources[pattern_id], matcher._folded_sources[pattern_id])
+    ))
+    compiled = {name: [compile_pattern(source, name) for source in sources] for name in names}
+    
+    report = {
+        'reference': reference, 'backend': backend, 'match_window': match_window,
+        'notes': 0, 'texts': 0, 'regexes': len(sources), 'searches': 0, 'matches': 0,
+        'native': sum(not isinstance(regex, re.Pattern) for regex in compiled[backend]),
+        'match_seconds': dict.fromkeys(names, 0.0), 'mismatches': []
+    }
+    
+    def compare(index: int, compared: str, results: Dict):
+        if len(set(map(repr, results.values()))) > 1:
+            report['mismatches'].append({'note': index, 'compared': compared, 'results': results})
+    
+    def found_alone(pattern_id: int, text: str) -> bool:
+        compiled = matcher.plain(pattern_id)
+        if matcher.window is None:
+            return bool(compiled.search(text))
+        start = 0
+        for end in matcher.clause_ends(text):
+            if compiled.search(text, start, end):
+                return True
+            start = end
+        return False
+    
+    for index, note in enumerate(chain(notes, CONFORMANCE_NOTES)):
+        report['notes'] += 1
+        normalized = extractors[reference].normalize(note)
+        for text in dict.fromkeys(extractors[reference]._clean_note(normalized, catalogs[reference])):
+            report['texts'] += 1
+            for position, source in enumerate(sources):
+                results = {name: bool(compiled[name][position].search(text)) for name in names}
+                report['searches'] += 1
+                report['matches'] += results[reference]
+                compare(index, f"search {source}", results)
+            
+            results = {}
+            for name in names:
+                started = time.perf_counter()
+                results[name] = sorted(catalogs[name].pattern_matcher.match_ids(text))
+                report['match_seconds'][name] += time.perf_counter() - started
+            results['each pattern'] = [pattern_id for pattern_id in range(len(matcher.patterns))
+                                       if found_alone(pattern_id, text)]
+            compare(index, 'match_ids', results)
+        
+        compare(index, 'codes', {name: [(code.code, round(code.confidence, 6)) for code in extractor.extract_cpt_codes(note)]
+                                 for name, extractor in extractors.items()})
+    
+    report['match_seconds'] = {name: round(seconds, 6) for name, seconds in report['match_seconds'].items()}
+    return report
+
+# Notes with known results: (what is checked, note, expected codes, the codes
+# compared - None for all codes the note yields)
+WOUND_REPAIR_CODES = frozenset(('12001', '12002', '12004', '12011', '12013', '12031', '12032'))
+EXTRACTION_CHECKS = (
+    ("a height is not a wound length",
+     "HISTORY: 45-year-old patient, 180 cm tall, fell onto glass.\n"
+     "PROCEDURES: Simple repair of forearm laceration with sutures.",
+     {'12001'}, WOUND_REPAIR_CODES),
+    ("an abscess is not a wound",
+     "PROCEDURES: Incision and drainage of 3 cm abscess on the arm. "
+     "Simple repair of 2 cm laceration on the hand with sutures.",
+     {'12001'}, WOUND_REPAIR_CODES),
+    ("an area of erythema is not a wound",
+     "PROCEDURES: 4 cm area of erythema on the forearm. Simple repair of 2 cm laceration on the hand with sutures.",
+     {'12001'}, WOUND_REPAIR_CODES),
+    ("same-size wounds in separate sentences are summed",
+     "PROCEDURES: Simple repair of 2 cm laceration to the left forearm with sutures. "
+     "Simple repair of 2 cm laceration to the right forearm with sutures.",
+     {'12002'}, WOUND_REPAIR_CODES),
+    ("a wound restated in history, exam and procedure is counted once",
+     "HISTORY: 3 cm laceration to the hand.\nPHYSICAL EXAM: 3 cm laceration to the dorsal hand.\n"
+     "PROCEDURES: Simple repair of 3 cm laceration to the hand with sutures.",
+     {'12002'}, WOUND_REPAIR_CODES),
+    ("listed lengths share their wound word",
+     "PROCEDURES: Simple repair of 2 cm and 3 cm lacerations of the arm with sutures.",
+     {'12002'}, WOUND_REPAIR_CODES),
+    ("procedures under a PROCEDURE NOTE header are matched",
+     "CHIEF COMPLAINT: Eye and wrist injury\nHISTORY: 30-year-old fell.\n"
+     "PROCEDURE NOTE: Corneal foreign body removal performed with slit lamp. Closed reduction of distal "
+     "radial fracture with manipulation. Short arm splint applied.\nDISPOSITION: Home.",
+     {'25605', '65222'}, None),
+    ("non-ASCII text is matched like ASCII text",
+     "PROCEDURES: Tibial shaft fracture, closed reduction with manipulation at the café. "
+     "Simple repair of 2 cm laceration of the hand, 5 µm, 38.5 °C.",
+     {'12001', '27752'}, None),
+    ("a long non-ASCII note of chained gaps matches nothing",
+     "PROCEDURES: " + "tibia fracture " * 2000 + "café",
+     set(), None),
+)
+
+def _uncovered_sections(policy: Mapping[str, Iterable[str]]) -> List[str]:
+    """
+    Recognized headers a section policy misses: a NOTE_SECTIONS header that
+    extends a header of a policy entry ("PROCEDURE NOTE" of "PROCEDURE") is
+    a section of the same kind, which that entry must list too
+    """
+    uncovered = []
+    for category, sections in dict(policy).items():
+        sections = set(sections)
+        uncovered.extend(f"{getattr(category, 'name', category)}: {header}" for header in NOTE_SECTIONS
+                         if header not in sections and any(header.startswith(name + ' ') for name in sections))
+    return uncovered
+
+def check_extraction(extractor: 'EDCPTExtractor' = None) -> List[str]:
+    """
+    Run the EXTRACTION_CHECKS notes through an extractor
+    
+    Returns:
+        One line per failed check; empty if all pass
+    """
+    extractor = extractor or EDCPTExtractor()
+    failures = [f"default section policy misses {missing}"
+                for missing in _uncovered_sections(DEFAULT_RULES['section_policy'])]
+    if extractor._catalog.source.rules:
+        failures.extend(f"catalog section policy misses {missing}"
+                        for missing in _uncovered_sections(extractor._catalog.source.rules['section_policy']))
+    if extractor.pattern_policy == 'bound':
+        # Both the lowercase ASCII twins and the originals run on other text must be bounded
+        matcher = extractor._compile_patterns().scope_matcher()
+        failures.extend(f"pattern runs with a super-linear worst case: {source!r}"
+                        for source in sorted(set(matcher._plain_sources + matcher._folded_sources))
+                        if analyze_pattern(source).flagged)
+    
+    # The dfa backend runs every pattern as a DFA and matches exactly like `re`, non-ASCII notes included
+    dfa = EDCPTExtractor(match_window=extractor.match_window, catalog_path=extractor.catalog_path,
+                         pattern_policy=extractor.pattern_policy, matcher_backend='dfa')
+    matcher = dfa._compile_patterns().pattern_matcher
+    if matcher.dfa_native != len(matcher.patterns):
+        failures.append(f"dfa backend runs {matcher.dfa_native} of {len(matcher.patterns)} patterns as DFAs")
+    # Every regex searched alone over the long worst-case note would take seconds;
+    # CONFORMANCE_NOTES holds a shorter one
+    report = check_conformance([note for _, note, _, _ in EXTRACTION_CHECKS if len(note) < 4096], 'dfa',
+                               match_window=extractor.match_window, catalog_path=extractor.catalog_path,
+                               pattern_policy=extractor.pattern_policy)
+    failures.extend(f"dfa backend differs from re on note {mismatch['note']}: {mismatch['compared']}"
+                    for mismatch in report['mismatches'])
+    for description, note, expected, compared in EXTRACTION_CHECKS:
+        found = {code.code for code in extractor.extract_cpt_codes(note)}
+        if compared is not None:
+            found &= compared
+        if found != set(expected):
+            failures.append(f"{description}: expected {sorted(expected)}, found {sorted(found)}")
+    return failures
 
 # Example usage and testing
-def test_extractor():
-    """Test the CPT extractor with sample medical notes"""
+def test_extractor() -> int:
+    """
+    Test the CPT extractor with sample medical notes and run the extraction checks
+    
+    Returns:
+        Number of failed checks
+    """
     extractor = EDCPTExtractor()
     
     # Sample medical notes
@@ -774,6 +4216,573 @@ def test_extractor():
                 print(f"  • {rec}")
         
         print("\n" + "="*50 + "\n")
+    
+    failures = check_extraction(extractor)
+    print(f"Extraction checks: {f'{len(failures)} failed' if failures else 'all passed'}")
+    for failure in failures:
+        print(f"  FAILED {failure}")
+    return len(failures)
+
+# Command-line extraction pipeline
+def _open_text(path: str, mode: str):
+    """Open a file for streaming text I/O, with '-' meaning stdin/stdout"""
+    if path == '-':
+        return open((sys.stdin if 'r' in mode else sys.stdout).fileno(), mode, encoding='utf-8', newline='', closefd=False)
+    return open(path, mode, encoding='utf-8', newline='')
+
+def _format_for(path: str, explicit: str = None) -> str:
+    """Pick jsonl or csv from an explicit choice or the file extension"""
+    if explicit:
+        return explicit
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+def read_note_records(path: str, fmt: str = None, text_field: str = 'note', id_field: str = 'id',
+                      skipped: List[int] = None) -> Iterator[Tuple[object, str]]:
+    """
+    Stream (record id, note text) pairs from a JSONL or CSV file
+    
+    JSONL lines may be objects holding text_field or bare JSON strings; records
+    without an id field are numbered from 1. Records without note text are
+    counted in skipped[0] when a counter list is passed, and otherwise ignored.
+    """
+    fmt = _format_for(path, fmt)
+    with _open_text(path, 'r') as handle:
+        if fmt == 'csv':
+            csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+            records = csv.DictReader(handle)
+        else:
+            records = (json.loads(line) for line in handle if line.strip())
+        
+        for number, record in enumerate(records, 1):
+            if isinstance(record, str):
+                yield number, record
+            elif isinstance(record, dict) and isinstance(record.get(text_field), str):
+                yield record.get(id_field, number), record[text_field]
+            elif skipped is not None:
+                skipped[0] += 1
+
+class NoteCorpus:
+    """
+    Random access by record id to the notes of a JSONL or CSV dump.
+
+    The file is memory-mapped and an index of each record's byte offset and
+    length is built on first use, then kept in a sqlite file next to the dump
+    (path + '.idx') and rebuilt whenever the dump's size or modification time
+    changes. Fetching a note reads only its record. Records are numbered and
+    ids taken as in `read_note_records`; ids are matched as strings, and of
+    records sharing an id the last one wins.
+    """
+
+    def __init__(self, path: str, fmt: str = None, text_field: str = 'note', id_field: str = 'id',
+                 index_path: str = None):
+        if path == '-':
+            raise ValueError("A corpus must be a file; stdin cannot be memory-mapped")
+        self.path = path
+        self.fmt = _format_for(path, fmt)
+        self.text_field = text_field
+        self.id_field = id_field
+        self.index_path = index_path or path + '.idx'
+        self._lock = threading.Lock()
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self._header: List[str] = None
+        self._index = self._open_index()
+
+    def __enter__(self) -> 'NoteCorpus':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._index.close()
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._index.execute('SELECT COUNT(*) FROM records').fetchone()[0]
+
+    def __contains__(self, record_id) -> bool:
+        return self._locate(record_id) is not None
+
+    def ids(self) -> Iterator[str]:
+        """Indexed record ids in file order"""
+        with self._lock:
+            rows = self._index.execute('SELECT id FROM records ORDER BY offset').fetchall()
+        return (row[0] for row in rows)
+
+    def note(self, record_id) -> str:
+        """
+        Note text of a record
+        
+        Raises:
+            KeyError: No record has this id
+        """
+        location = self._locate(record_id)
+        if location is None:
+            raise KeyError(record_id)
+        offset, length = location
+        record = self._parse(self._map[offset:offset + length])
+        return record if isinstance(record, str) else record[self.text_field]
+
+    def extract(self, record_id, extractor: 'EDCPTExtractor') -> Dict:
+        """extract_with_details for the note of a record (KeyError if no record has this id)"""
+        return extractor.extract_with_details(self.note(record_id))
+
+    def _locate(self, record_id) -> Tuple[int, int]:
+        with self._lock:
+            return self._index.execute('SELECT offset, length FROM records WHERE id = ?', (str(record_id),)).fetchone()
+
+    def _parse(self, data: bytes):
+        """A JSONL value, or a CSV record as a dict keyed by the header row"""
+        if self.fmt == 'csv':
+            row = next(csv.reader(io.StringIO(data.decode('utf-8'), newline='')), [])
+            if self._header is None:
+                return row
+            # Short rows fill in None, as csv.DictReader does
+            return {name: row[column] if column < len(row) else None for column, name in enumerate(self._header)}
+        return json.loads(data)
+
+    def _signature(self) -> str:
+        status = os.stat(self.path)
+        return json.dumps([status.st_size, status.st_mtime_ns, self.fmt, self.text_field, self.id_field])
+
+    def _open_index(self) -> sqlite3.Connection:
+        signature = self._signature()
+        if os.path.exists(self.index_path):
+            connection = sqlite3.connect(self.index_path, check_same_thread=False)
+            try:
+                row = connection.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+                if row is not None and row[0] == signature:
+                    header = connection.execute("SELECT value FROM meta WHERE key = 'header'").fetchone()
+                    self._header = json.loads(header[0]) if header else None
+                    return connection
+            except sqlite3.DatabaseError:
+                pass
+            connection.close()
+        
+        # Build into a temporary file and swap it in, so readers never see half an index
+        building = f"{self.index_path}.{os.getpid()}.tmp"
+        connection = sqlite3.connect(building)
+        try:
+            connection.execute('CREATE TABLE records (id TEXT PRIMARY KEY, offset INTEGER, length INTEGER)')
+            connection.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+            connection.executemany('INSERT OR REPLACE INTO records VALUES (?, ?, ?)', self._scan())
+            connection.execute("INSERT INTO meta VALUES ('signature', ?)", (signature,))
+            if self._header is not None:
+                connection.execute("INSERT INTO meta VALUES ('header', ?)", (json.dumps(self._header),))
+            connection.commit()
+        finally:
+            connection.close()
+        os.replace(building, self.index_path)
+        return sqlite3.connect(self.index_path, check_same_thread=False)
+
+    def _records(self) -> Iterator[Tuple[int, int]]:
+        """(offset, length) of each non-blank record; CSV records may span lines inside quotes"""
+        data = self._map
+        position = 0
+        start = None
+        quotes = 0
+        while position < len(data):
+            end = data.find(b'\n', position)
+            end = len(data) if end < 0 else end + 1
+            if start is None:
+                start = position
+            if self.fmt == 'csv':
+                quotes += data[position:end].count(b'"')
+            position = end
+            if quotes % 2 == 0:
+                if not self._blank(data[start:end]):
+                    yield start, end - start
+                start = None
+                quotes = 0
+        if start is not None and not self._blank(data[start:]):
+            yield start, len(data) - start
+
+    def _blank(self, record: bytes) -> bool:
+        # Skipped like the lines read_note_records skips: blank JSONL lines, empty CSV rows
+        return not (record.strip(b'\r\n') if self.fmt == 'csv' else record.strip())
+
+    def _scan(self) -> Iterator[Tuple[str, int, int]]:
+        """(record id, offset, length) of every record holding note text"""
+        records = self._records()
+        if self.fmt == 'csv':
+            csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+            first = next(records, None)
+            if first is None:
+                return
+            self._header = self._parse(self._map[first[0]:first[0] + first[1]])
+        
+        for number, (offset, length) in enumerate(records, 1):
+            record = self._parse(self._map[offset:offset + length])
+            if isinstance(record, str):
+                yield str(number), offset, length
+            elif isinstance(record, dict) and isinstance(record.get(self.text_field), str):
+                yield str(record.get(self.id_field, number)), offset, length
+
+def write_result_records(path: str, results: Iterable[Tuple[object, Dict]], fmt: str = None):
+    """Write (record id, extract_with_details result) pairs as JSONL, or one CSV row per code"""
+    fmt = _format_for(path, fmt)
+    with _open_text(path, 'w') as handle:
+        if fmt == 'csv':
+            writer = csv.writer(handle)
+            writer.writerow(['id', 'code', 'description', 'category', 'confidence'])
+            for record_id, result in results:
+                for code in result['cpt_codes']:
+                    writer.writerow([record_id, code['code'], code['description'], code['category'], code['confidence']])
+        else:
+            for record_id, result in results:
+                handle.write(json.dumps({'id': record_id, **result}) + '\n')
+
+def run_extract(args) -> int:
+    """Stream notes from args.input through extract_batch into args.output"""
+    result_cache = None
+    if args.result_cache_size or args.result_cache_db:
+        result_cache = ResultCache(max_entries=args.result_cache_size or 4096, ttl=args.result_cache_ttl,
+                                   path=args.result_cache_db, max_disk_entries=args.result_cache_db_size)
+    profiler = Profiler() if args.profile else None
+    extractor = EDCPTExtractor(match_window=args.match_window, catalog_path=args.catalog, cache_dir=args.cache_dir,
+                               result_cache=result_cache, profiler=profiler, pattern_policy=args.pattern_policy,
+                               matcher_backend=args.matcher_backend)
+    skipped = [0]
+    records = read_note_records(args.input, args.input_format, args.text_field, args.id_field, skipped)
+    
+    # Ids wait here while their notes are in flight; extract_batch keeps order
+    # and only pulls more notes when a worker slot frees up
+    in_flight = deque()
+    processed = 0
+    characters = 0
+    
+    def notes() -> Iterator[str]:
+        nonlocal characters
+        for record_id, note in records:
+            in_flight.append(record_id)
+            characters += len(note)
+            yield note
+    
+    started = last_report = time.perf_counter()
+    
+    def report(final: bool = False):
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        print(f"{'done' if final else 'progress'}: {processed} notes, {skipped[0]} skipped, "
+              f"{processed / elapsed:.1f} notes/s, {characters / elapsed / 1e6:.2f} MB/s, {elapsed:.1f}s",
+              file=sys.stderr)
+    
+    def results() -> Iterator[Tuple[object, Dict]]:
+        nonlocal processed, last_report
+        for result in extractor.extract_batch(notes(), workers=args.workers, chunksize=args.batch_size):
+            processed += 1
+            yield in_flight.popleft(), result
+            if not args.quiet and time.perf_counter() - last_report >= args.progress_interval:
+                last_report = time.perf_counter()
+                report()
+    
+    write_result_records(args.output, results(), args.output_format)
+    if not args.quiet:
+        report(final=True)
+        catalog = extractor._catalog
+        if catalog.compile_seconds is not None:
+            print(f"catalog: version {catalog.source.version}, {len(catalog.catalog)} codes, "
+                  f"{'loaded from cache' if catalog.cache_hit else 'compiled'} in {catalog.compile_seconds * 1000:.1f}ms",
+                  file=sys.stderr)
+        # Counters of in-process extraction; worker processes keep their own
+        if result_cache is not None and result_cache.hits + result_cache.misses:
+            print(f"result cache: {result_cache.stats()}", file=sys.stderr)
+    if profiler is not None:
+        with _open_text(args.profile, 'w') as handle:
+            handle.write(profiler.openmetrics())
+        if not args.quiet:
+            for stage, timing in profiler.snapshot()['stages'].items():
+                print(f"stage {stage}: {timing['seconds'] * 1000:.1f}ms over {timing['calls']} calls", file=sys.stderr)
+            for slow in profiler.slowest_patterns(5):
+                print(f"slow pattern {slow['pattern']} ({' '.join(slow['codes'])}): {slow['seconds'] * 1000:.1f}ms "
+                      f"over {slow['calls']} runs, {slow['mean_us']}us each", file=sys.stderr)
+    return 0
+
+def run_document(args) -> int:
+    """Stream one large text document from args.input through extract_stream into a JSON result"""
+    extractor = EDCPTExtractor(match_window=args.match_window, catalog_path=args.catalog, cache_dir=args.cache_dir,
+                               pattern_policy=args.pattern_policy, matcher_backend=args.matcher_backend)
+    stats: Dict[str, int] = {}
+    started = time.perf_counter()
+    with _open_text(args.input, 'r') as handle:
+        codes = extractor.extract_stream(handle, stats, chunk_size=args.chunk_size)
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    
+    result = {
+        'cpt_codes': [
+            {
+                'code': code.code,
+                'description': code.description,
+                'category': code.category,
+                'confidence': round(code.confidence, 3)
+            }
+            for code in codes
+        ],
+        'total_codes_found': len(codes),
+        'stream_stats': stats
+    }
+    with _open_text(args.output, 'w') as handle:
+        handle.write(json.dumps(result) + '\n')
+    if not args.quiet:
+        print(f"done: {stats['characters']} characters, {stats['clauses']} clauses, "
+              f"{stats['characters'] / elapsed / 1e6:.2f} MB/s, {elapsed:.1f}s", file=sys.stderr)
+    return 0
+
+def run_lookup(args) -> int:
+    """Re-extract the notes of args.id from an indexed corpus into args.output"""
+    extractor = EDCPTExtractor(match_window=args.match_window, catalog_path=args.catalog, cache_dir=args.cache_dir,
+                               pattern_policy=args.pattern_policy, matcher_backend=args.matcher_backend)
+    missing = []
+    with NoteCorpus(args.input, args.input_format, args.text_field, args.id_field, args.index) as corpus:
+        def results() -> Iterator[Tuple[object, Dict]]:
+            for record_id in args.id:
+                try:
+                    yield record_id, corpus.extract(record_id, extractor)
+                except KeyError:
+                    missing.append(record_id)
+        
+        write_result_records(args.output, results(), args.output_format)
+    for record_id in missing:
+        print(f"not found: {record_id}", file=sys.stderr)
+    return 1 if missing else 0
+
+def run_serve(args) -> int:
+    """Serve extraction over HTTP until interrupted"""
+    extractor = EDCPTExtractor(match_window=args.match_window, catalog_path=args.catalog, cache_dir=args.cache_dir,
+                               profiler=Profiler() if args.profile else None, pattern_policy=args.pattern_policy,
+                               matcher_backend=args.matcher_backend)
+    service = ExtractionService(extractor, workers=args.workers, max_batch=args.max_batch,
+                                max_wait=args.max_wait_ms / 1000, max_queue=args.max_queue,
+                                latency_target=args.latency_target_ms / 1000, reload_interval=args.reload_interval)
+    
+    async def serve():
+        async with service:
+            server = await service.serve_http(args.host, args.port)
+            print(f"serving on http://{args.host}:{args.port} with {service.workers} worker(s)", file=sys.stderr)
+            async with server:
+                await server.serve_forever()
+    
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+def run_bench(args) -> int:
+    """Benchmark the extractor on generated workloads, optionally against a stored baseline"""
+    extractor = EDCPTExtractor(match_window=args.match_window, catalog_path=args.catalog, cache_dir=args.cache_dir,
+                               pattern_policy=args.pattern_policy, matcher_backend=args.matcher_backend)
+    catalog = extractor.cpt_mapping
+    workloads = {
+        'typical': generate_notes(catalog, args.notes, args.seed),
+        'long': generate_notes(catalog, args.notes, args.seed, length=24, procedure_density=3.0),
+        'dense': generate_notes(catalog, args.notes, args.seed, procedure_density=8.0),
+        'worst_case': generate_notes(catalog, max(args.notes // 10, 1), args.seed, length=8, worst_case=1.0)
+    }
+    result = run_benchmark(extractor, workloads, args.modes, args.workers)
+    result['meta'].update(notes=args.notes, seed=args.seed)
+    
+    for workload, modes in result['results'].items():
+        for mode, metrics in modes.items():
+            latency = f", p50 {metrics['p50_ms']}ms p95 {metrics['p95_ms']}ms p99 {metrics['p99_ms']}ms" if 'p50_ms' in metrics else ''
+            print(f"{workload:>10} {mode:<20} {metrics['notes_per_second']:>10.1f} notes/s{latency}", file=sys.stderr)
+    if args.output:
+        with _open_text(args.output, 'w') as handle:
+            handle.write(json.dumps(result, indent=2) + '\n')
+    
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as handle:
+            baseline = json.load(handle)
+        regressions = compare_benchmarks(result, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+def run_analyze(args) -> int:
+    """Report catalog patterns with super-linear worst cases; exit 1 if any is flagged"""
+    source = load_catalog(args.catalog)
+    risks = analyze_catalog(source.codes, args.max_gaps, args.fuzz, args.budget)
+    flagged = [risk for risk in risks if risk.flagged]
+    for risk in flagged:
+        measured = f", measured exponent {risk.exponent}" if risk.exponent is not None else ''
+        degree = 'exponential' if risk.degree is None else f"degree {risk.degree}"
+        print(f"{' '.join(risk.codes)}: {risk.pattern} - {', '.join(risk.issues)} ({degree}{measured})", file=sys.stderr)
+    print(f"{len(flagged)} of {len(risks)} patterns flagged in catalog {source.version}", file=sys.stderr)
+    if args.output:
+        with _open_text(args.output, 'w') as handle:
+            report = [asdict(risk) for risk in (risks if args.all else flagged)]
+            handle.write(json.dumps({'catalog_version': source.version, 'patterns': report}, indent=2) + '\n')
+    return 1 if flagged else 0
+
+def run_conformance(args) -> int:
+    """Compare a matcher backend against `re` over a note file or generated notes; exit 1 on any difference"""
+    if args.input:
+        notes = (note for _, note in read_note_records(args.input, args.input_format, args.text_field))
+    else:
+        catalog = load_catalog(args.catalog).codes
+        notes = (generate_notes(catalog, args.notes, args.seed)
+                 + generate_notes(catalog, args.notes, args.seed, length=24, procedure_density=8.0)
+                 + generate_notes(catalog, max(args.notes // 10, 1), args.seed, length=8, worst_case=1.0))
+    report = check_conformance(notes, args.backend, match_window=args.match_window, catalog_path=args.catalog,
+                               pattern_policy=args.pattern_policy)
+    
+    for mismatch in report['mismatches'][:20]:
+        print(f"note {mismatch['note']}: {mismatch['compared']}: {mismatch['results']}", file=sys.stderr)
+    seconds = ', '.join(f"{name} {elapsed:.2f}s" for name, elapsed in report['match_seconds'].items())
+    print(f"{len(report['mismatches'])} mismatches over {report['notes']} notes, {report['texts']} texts and "
+          f"{report['searches']} searches; {report['native']} of {report['regexes']} regexes native to "
+          f"{report['backend']}; match_ids {seconds}", file=sys.stderr)
+    if args.output:
+        with _open_text(args.output, 'w') as handle:
+            handle.write(json.dumps(report, indent=2) + '\n')
+    return 1 if report['mismatches'] else 0
+
+def _add_matching_arguments(parser: argparse.ArgumentParser):
+    """Options of the extracting commands that choose how catalog patterns are loaded and run"""
+    parser.add_argument('--pattern-policy', choices=['bound', 'reject', 'none'], default='bound',
+                        help="Bound the gaps of, reject, or run as written catalog patterns with super-linear "
+                             "worst cases (default: bound)")
+    parser.add_argument('--matcher-backend', choices=sorted(MATCHER_BACKENDS), default='re',
+                        help="Regex backend of the catalog patterns; dfa scans in linear time (default: re)")
+
+def main(argv: List[str] = None) -> int:
+    """Command-line entry point; runs the sample-note demo when no command is given"""
+    parser = argparse.ArgumentParser(description="Extract ED CPT codes from medical notes")
+    commands = parser.add_subparsers(dest='command')
+    
+    commands.add_parser('demo', help="Run the extractor on the built-in sample notes")
+    
+    extract = commands.add_parser('extract', help="Stream notes from a JSONL/CSV file into a results file")
+    extract.add_argument('--input', required=True, help="Input notes file (.jsonl or .csv), '-' for stdin")
+    extract.add_argument('--output', required=True, help="Output file (.jsonl, or .csv for one row per code), '-' for stdout")
+    extract.add_argument('--input-format', choices=['jsonl', 'csv'], help="Override the input format inferred from the extension")
+    extract.add_argument('--output-format', choices=['jsonl', 'csv'], help="Override the output format inferred from the extension")
+    extract.add_argument('--text-field', default='note', help="Field holding the note text (default: note)")
+    extract.add_argument('--id-field', default='id', help="Field holding the record id (default: id)")
+    extract.add_argument('--workers', type=int, default=1, help="Worker processes (default: 1, 0 for one per CPU)")
+    extract.add_argument('--batch-size', type=int, default=32, help="Notes per worker task (default: 32)")
+    extract.add_argument('--catalog', help="Code catalog file (.json, or .yaml with PyYAML; default: bundled cpt_catalog.json)")
+    extract.add_argument('--cache-dir', help="Cache compiled catalog state in this directory across runs")
+    extract.add_argument('--result-cache-size', type=int, help="Memoize results for up to this many distinct notes in memory")
+    extract.add_argument('--result-cache-ttl', type=float, help="Seconds a memoized result stays valid (default: forever)")
+    extract.add_argument('--result-cache-db', help="sqlite file sharing memoized results across processes and runs")
+    extract.add_argument('--result-cache-db-size', type=int, default=1 << 20,
+                         help="Most results kept in the sqlite file, oldest dropped first (default: 1048576)")
+    extract.add_argument('--match-window', type=int, help="Enable bounded clause-scoped matching with this gap window")
+    _add_matching_arguments(extract)
+    extract.add_argument('--progress-interval', type=float, default=5.0, help="Seconds between progress reports (default: 5)")
+    extract.add_argument('--quiet', action='store_true', help="Suppress progress reporting")
+    extract.add_argument('--profile', help="Write per-stage and per-pattern timings in OpenMetrics text to this file "
+                                           "and report the slowest patterns (workers 1 only)")
+    
+    document = commands.add_parser('document', help="Extract codes from one large text document, such as "
+                                                    "concatenated encounter notes, in bounded memory")
+    document.add_argument('--input', required=True, help="Input text file, '-' for stdin")
+    document.add_argument('--output', default='-', help="Output JSON file (default: stdout)")
+    document.add_argument('--chunk-size', type=int, default=1 << 20, help="Characters read per chunk (default: 1048576)")
+    document.add_argument('--catalog', help="Code catalog file (.json, or .yaml with PyYAML; default: bundled cpt_catalog.json)")
+    document.add_argument('--cache-dir', help="Cache compiled catalog state in this directory across runs")
+    document.add_argument('--match-window', type=int,
+                          help=f"Gap window of the clause-scoped matching (default: {EDCPTExtractor.STREAM_WINDOW})")
+    _add_matching_arguments(document)
+    document.add_argument('--quiet', action='store_true', help="Suppress the summary report")
+    
+    lookup = commands.add_parser('lookup', help="Re-extract single notes by record id from a JSONL/CSV file, "
+                                                "through an offset index built on first use")
+    lookup.add_argument('--input', required=True, help="Input notes file (.jsonl or .csv)")
+    lookup.add_argument('--id', required=True, action='append', help="Record id to extract; repeat for several")
+    lookup.add_argument('--output', default='-', help="Output file (.jsonl, or .csv for one row per code; default: stdout)")
+    lookup.add_argument('--input-format', choices=['jsonl', 'csv'], help="Override the input format inferred from the extension")
+    lookup.add_argument('--output-format', choices=['jsonl', 'csv'], help="Override the output format inferred from the extension")
+    lookup.add_argument('--text-field', default='note', help="Field holding the note text (default: note)")
+    lookup.add_argument('--id-field', default='id', help="Field holding the record id (default: id)")
+    lookup.add_argument('--index', help="Offset index file (default: the input path plus .idx)")
+    lookup.add_argument('--catalog', help="Code catalog file (.json, or .yaml with PyYAML; default: bundled cpt_catalog.json)")
+    lookup.add_argument('--cache-dir', help="Cache compiled catalog state in this directory across runs")
+    lookup.add_argument('--match-window', type=int, help="Enable bounded clause-scoped matching with this gap window")
+    _add_matching_arguments(lookup)
+    
+    serve = commands.add_parser('serve', help="Serve extraction over HTTP/JSON with micro-batching and admission control")
+    serve.add_argument('--host', default='127.0.0.1', help="Address to listen on (default: 127.0.0.1)")
+    serve.add_argument('--port', type=int, default=8080, help="Port to listen on (default: 8080)")
+    serve.add_argument('--workers', type=int, default=1, help="Worker processes (default: 1, a worker thread; 0 for one per CPU)")
+    serve.add_argument('--max-batch', type=int, default=16, help="Most notes per micro-batch (default: 16)")
+    serve.add_argument('--max-wait-ms', type=float, default=2.0, help="Longest a batch waits to fill (default: 2)")
+    serve.add_argument('--max-queue', type=int, default=256, help="Most requests waiting for a worker (default: 256)")
+    serve.add_argument('--latency-target-ms', type=float, default=250.0,
+                       help="Refuse requests that could not finish within this latency (default: 250)")
+    serve.add_argument('--catalog', help="Code catalog file (.json, or .yaml with PyYAML; default: bundled cpt_catalog.json)")
+    serve.add_argument('--cache-dir', help="Cache compiled catalog state in this directory across runs")
+    serve.add_argument('--match-window', type=int, help="Enable bounded clause-scoped matching with this gap window")
+    _add_matching_arguments(serve)
+    serve.add_argument('--reload-interval', type=float, default=1.0,
+                       help="Seconds between checks of the catalog file; a changed catalog is reloaded live (default: 1, 0 disables)")
+    serve.add_argument('--profile', action='store_true', help="Profile extraction and serve it on GET /metrics (workers 1 only)")
+    
+    bench = commands.add_parser('bench', help="Benchmark extraction on generated notes and compare against a baseline")
+    bench.add_argument('--notes', type=int, default=300, help="Notes per workload (default: 300)")
+    bench.add_argument('--seed', type=int, default=0, help="Seed of the note generator (default: 0)")
+    bench.add_argument('--modes', nargs='+', default=['extract_cpt_codes', 'extract_with_details', 'batch', 'vectorized'],
+                       choices=['extract_cpt_codes', 'extract_with_details', 'batch', 'vectorized'],
+                       help="Extraction modes to time (default: all)")
+    bench.add_argument('--workers', type=int, help="Worker processes of the batch mode (default: one per CPU)")
+    bench.add_argument('--output', help="Write the results as JSON to this file, '-' for stdout")
+    bench.add_argument('--baseline', help="Results file of an earlier run; exit 1 on any regression")
+    bench.add_argument('--tolerance', type=float, default=0.1, help="Allowed slowdown before a regression (default: 0.1)")
+    bench.add_argument('--catalog', help="Code catalog file (.json, or .yaml with PyYAML; default: bundled cpt_catalog.json)")
+    bench.add_argument('--cache-dir', help="Cache compiled catalog state in this directory across runs")
+    bench.add_argument('--match-window', type=int, help="Enable bounded clause-scoped matching with this gap window")
+    _add_matching_arguments(bench)
+    
+    analyze = commands.add_parser('analyze', help="Flag catalog patterns with super-linear worst cases (exit 1 if any)")
+    analyze.add_argument('--catalog', help="Code catalog file (.json, or .yaml with PyYAML; default: bundled cpt_catalog.json)")
+    analyze.add_argument('--max-gaps', type=int, default=1, help="Chained `.*` gaps allowed per pattern (default: 1)")
+    analyze.add_argument('--fuzz', action='store_true', help="Measure the scaling of flagged patterns on crafted input")
+    analyze.add_argument('--budget', type=float, default=0.1, help="Longest single search while fuzzing, in seconds (default: 0.1)")
+    analyze.add_argument('--output', help="Write the report as JSON to this file, '-' for stdout")
+    analyze.add_argument('--all', action='store_true', help="Report every pattern, not only flagged ones")
+    
+    conformance = commands.add_parser('conformance', help="Check that a matcher backend matches exactly like re "
+                                                          "over a note corpus (exit 1 on any difference)")
+    conformance.add_argument('--backend', choices=sorted(set(MATCHER_BACKENDS) - {'re'}), default='dfa',
+                             help="Backend compared against re (default: dfa)")
+    conformance.add_argument('--input', help="Notes file (.jsonl or .csv), '-' for stdin; default: generated notes")
+    conformance.add_argument('--input-format', choices=['jsonl', 'csv'], help="Override the input format inferred from the extension")
+    conformance.add_argument('--text-field', default='note', help="Field holding the note text (default: note)")
+    conformance.add_argument('--notes', type=int, default=200, help="Generated notes per workload (default: 200)")
+    conformance.add_argument('--seed', type=int, default=0, help="Seed of the note generator (default: 0)")
+    conformance.add_argument('--catalog', help="Code catalog file (.json, or .yaml with PyYAML; default: bundled cpt_catalog.json)")
+    conformance.add_argument('--pattern-policy', choices=['bound', 'reject', 'none'], default='bound',
+                             help="Pattern policy of the compared extractors (default: bound)")
+    conformance.add_argument('--match-window', type=int, help="Enable bounded clause-scoped matching with this gap window")
+    conformance.add_argument('--output', help="Write the report as JSON to this file, '-' for stdout")
+    
+    args = parser.parse_args(argv)
+    if getattr(args, 'pattern_policy', None) == 'none':
+        args.pattern_policy = None
+    if args.command == 'analyze':
+        return run_analyze(args)
+    if args.command == 'conformance':
+        return run_conformance(args)
+    if getattr(args, 'profile', None) and args.workers != 1:
+        parser.error("--profile needs --workers 1: worker processes do not report to the profiler")
+    if args.command == 'bench':
+        return run_bench(args)
+    if args.command == 'serve':
+        return run_serve(args)
+    if args.command == 'lookup':
+        return run_lookup(args)
+    if args.command == 'extract':
+        return run_extract(args)
+    if args.command == 'document':
+        return run_document(args)
+    
+    return 1 if test_extractor() else 0
 
 if __name__ == "__main__":
-    test_extractor()
+    sys.exit(main())